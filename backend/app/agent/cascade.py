@@ -0,0 +1,173 @@
+from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+import time
+
+from app.agent.prompts import CONFIDENCE_INSTRUCTION
+from app.agent.utils import merge_json_safely, parse_extraction
+from app.core.config import settings
+from app.services.groq_client import invoke_llm, ainvoke_llm
+
+# ----------------------------
+# Extraction cascade: fast model first, large model only when the fast answer
+# does not parse, does not match the SYSTEM_PROMPT schema, or reports low confidence.
+# ----------------------------
+
+EXTRACTION_KEYS = {
+    "action", "hcp_name", "interaction_type", "date", "time", "attendees",
+    "topics_discussed", "materials_shared", "samples_distributed", "consent_required",
+    "sentiment", "products_discussed", "summary", "outcomes", "follow_ups",
+    "fields_to_update", "confidence",
+}
+_ACTIONS = {"draft", "log", "edit"}
+_SENTIMENTS = {"positive", "neutral", "negative"}
+_DATE_RE = re.compile(r"^(today|\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01]))$", re.IGNORECASE)
+_TIME_RE = re.compile(r"^([01]?\d|2[0-3]):[0-5]\d$|^(0?[1-9]|1[0-2]):[0-5]\d\s*[ap]m$", re.IGNORECASE)
+
+_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "turns": 0,
+    "escalations": 0,
+    "reasons": {"parse": 0, "invalid": 0, "low_confidence": 0},
+    "stages": {
+        "fast": {"calls": 0, "total_ms": 0.0, "max_ms": 0.0},
+        "large": {"calls": 0, "total_ms": 0.0, "max_ms": 0.0},
+    },
+}
+
+
+def _valid_fields(parsed: Dict[str, Any]) -> bool:
+    for k, v in parsed.items():
+        if k not in EXTRACTION_KEYS:
+            return False
+        if v is None or v == "":
+            continue
+        if k == "date" and not (isinstance(v, str) and _DATE_RE.match(v.strip())):
+            return False
+        if k == "time" and not (isinstance(v, str) and _TIME_RE.match(v.strip())):
+            return False
+        if k == "sentiment" and str(v).lower() not in _SENTIMENTS:
+            return False
+        if k == "consent_required" and not isinstance(v, bool):
+            return False
+    return True
+
+
+def validate_extraction(parsed: Dict[str, Any]) -> bool:
+    """Checks a parsed extraction against the schema in prompts.SYSTEM_PROMPT."""
+    if not isinstance(parsed, dict) or str(parsed.get("action", "")).lower() not in _ACTIONS:
+        return False
+    if not _valid_fields(parsed):
+        return False
+
+    fields_to_update = parsed.get("fields_to_update")
+    if fields_to_update is not None:
+        if not isinstance(fields_to_update, dict):
+            return False
+        if "action" in fields_to_update or "fields_to_update" in fields_to_update:
+            return False
+        if not _valid_fields(fields_to_update):
+            return False
+    return True
+
+
+def escalation_reason(parsed: Dict[str, Any], outcome: str = "strict") -> Optional[str]:
+    # a cut-off reply ("partial") parses, but whatever was cut off is missing
+    if not parsed or outcome in ("partial", "failed"):
+        return "parse"
+    if not validate_extraction(parsed):
+        return "invalid"
+    if parsed.get("confidence") is None:
+        return "low_confidence"  # asked for it and got none: not a reason to trust the reply
+    try:
+        confidence = float(parsed["confidence"])
+    except (TypeError, ValueError):
+        return "invalid"
+    if confidence < settings.EXTRACT_CASCADE_MIN_CONFIDENCE:
+        return "low_confidence"
+    return None
+
+
+def _fast_prompt(prompt: List[Any]) -> List[Any]:
+    from langchain_core.messages import HumanMessage
+
+    return prompt + [HumanMessage(content=CONFIDENCE_INSTRUCTION)]
+
+
+def _record_stage(stage: str, started: float) -> None:
+    ms = (time.perf_counter() - started) * 1000.0
+    with _lock:
+        s = _stats["stages"][stage]
+        s["calls"] += 1
+        s["total_ms"] += ms
+        s["max_ms"] = max(s["max_ms"], ms)
+
+
+def _record_turn(reason: Optional[str]) -> None:
+    with _lock:
+        _stats["turns"] += 1
+        if reason:
+            _stats["escalations"] += 1
+            _stats["reasons"][reason] += 1
+
+
+def _accept(raw: str, parsed: Dict[str, Any], stage: str) -> Tuple[str, Dict[str, Any], str]:
+    parsed.pop("confidence", None)
+    return raw, parsed, stage
+
+
+def cascade_extract(prompt: List[Any], deadline: Optional[float] = None) -> Tuple[str, Dict[str, Any], str]:
+    """Returns (raw, parsed, stage) where stage is "fast" or "large"."""
+    started = time.perf_counter()
+    raw = (invoke_llm("extract_fast", _fast_prompt(prompt), deadline=deadline).content or "").strip()
+    _record_stage("fast", started)
+
+    parsed, outcome = parse_extraction(raw)
+    reason = escalation_reason(parsed, outcome)
+    _record_turn(reason)
+    if reason is None:
+        return _accept(raw, parsed, "fast")
+
+    started = time.perf_counter()
+    raw = (invoke_llm("extract", prompt, deadline=deadline).content or "").strip()
+    _record_stage("large", started)
+    return _accept(raw, merge_json_safely(raw), "large")
+
+
+async def acascade_extract(prompt: List[Any], deadline: Optional[float] = None) -> Tuple[str, Dict[str, Any], str]:
+    started = time.perf_counter()
+    raw = ((await ainvoke_llm("extract_fast", _fast_prompt(prompt), deadline=deadline)).content or "").strip()
+    _record_stage("fast", started)
+
+    parsed, outcome = parse_extraction(raw)
+    reason = escalation_reason(parsed, outcome)
+    _record_turn(reason)
+    if reason is None:
+        return _accept(raw, parsed, "fast")
+
+    started = time.perf_counter()
+    raw = ((await ainvoke_llm("extract", prompt, deadline=deadline)).content or "").strip()
+    _record_stage("large", started)
+    return _accept(raw, merge_json_safely(raw), "large")
+
+
+def cascade_stats() -> Dict[str, Any]:
+    with _lock:
+        turns, escalations = _stats["turns"], _stats["escalations"]
+        stages = {
+            name: {
+                "calls": s["calls"],
+                "avg_ms": round(s["total_ms"] / s["calls"], 2) if s["calls"] else 0.0,
+                "max_ms": round(s["max_ms"], 2),
+            }
+            for name, s in _stats["stages"].items()
+        }
+        reasons = dict(_stats["reasons"])
+    return {
+        "enabled": settings.EXTRACT_CASCADE,
+        "turns": turns,
+        "escalations": escalations,
+        "escalation_rate": (escalations / turns) if turns else 0.0,
+        "reasons": reasons,
+        "stages": stages,
+    }
@@ -0,0 +1,101 @@
+from typing import Any, Dict, Optional
+import re
+import threading
+
+# ----------------------------
+# Rule-based fast path for trivial turns ("log it", "time was 3pm", "sentiment negative")
+# Anything not fully explained by these patterns goes to the LLM extractor.
+# ----------------------------
+
+MAX_FAST_PATH_CHARS = 80
+
+_LOG_RE = re.compile(r"\b(?:log|save|submit)\b", re.IGNORECASE)
+_EDIT_RE = re.compile(r"\b(?:sorry|actually|change|update|correction)\b", re.IGNORECASE)
+
+_TIME_AMPM_RE = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b", re.IGNORECASE)
+_TIME_24H_RE = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+_DATE_RE = re.compile(r"\b(today|\d{4}-\d{2}-\d{2})\b", re.IGNORECASE)
+_SENTIMENT_RE = re.compile(r"\b(positive|neutral|negative)\b", re.IGNORECASE)
+
+# Words that may surround the fields above without changing their meaning
+_FILLER = {
+    "log", "save", "submit", "sorry", "actually", "change", "update", "correction",
+    "it", "this", "that", "the", "a", "now", "please", "ok", "okay", "and", "also",
+    "was", "is", "be", "should", "to", "at", "on", "for", "of", "it's",
+    "time", "date", "sentiment", "meeting", "visit", "interaction",
+}
+
+_lock = threading.Lock()
+_stats = {"turns": 0, "fast_path": 0}
+
+
+def _format_ampm(hour: str, minute: Optional[str], ampm: str) -> Optional[str]:
+    h = int(hour)
+    if not 1 <= h <= 12 or int(minute or 0) > 59:
+        return None
+    h = h % 12 + (12 if ampm.lower() == "pm" else 0)
+    return f"{h:02d}:{minute or '00'}"
+
+
+def classify_fast_path(message: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns a parsed extraction (same shape as the LLM's JSON) when the message is
+    fully covered by the patterns above, else None.
+    """
+    text = (message or "").strip()
+    if not text or len(text) > MAX_FAST_PATH_CHARS:
+        return None
+
+    fields: Dict[str, Any] = {}
+    rest = text
+
+    m = _TIME_AMPM_RE.search(rest)
+    if m:
+        t = _format_ampm(m.group(1), m.group(2), m.group(3))
+        if not t:
+            return None
+        fields["time"] = t
+        rest = rest[:m.start()] + " " + rest[m.end():]
+    else:
+        m = _TIME_24H_RE.search(rest)
+        if m:
+            fields["time"] = f"{int(m.group(1)):02d}:{m.group(2)}"
+            rest = rest[:m.start()] + " " + rest[m.end():]
+
+    m = _DATE_RE.search(rest)
+    if m:
+        fields["date"] = m.group(1).lower()
+        rest = rest[:m.start()] + " " + rest[m.end():]
+
+    m = _SENTIMENT_RE.search(rest)
+    if m:
+        fields["sentiment"] = m.group(1).lower()
+        rest = rest[:m.start()] + " " + rest[m.end():]
+
+    # Everything left must be filler; otherwise there is content only the LLM can read
+    leftover = [w for w in re.findall(r"[a-z0-9']+", rest.lower()) if w not in _FILLER]
+    if leftover:
+        return None
+
+    if _EDIT_RE.search(text):
+        if not fields:
+            return None
+        return {"action": "edit", **fields, "fields_to_update": dict(fields)}
+    if _LOG_RE.search(text):
+        return {"action": "log", **fields}
+    if fields:
+        return {"action": "draft", **fields}
+    return None
+
+
+def record_fast_path(hit: bool) -> None:
+    with _lock:
+        _stats["turns"] += 1
+        if hit:
+            _stats["fast_path"] += 1
+
+
+def fast_path_stats() -> Dict[str, Any]:
+    with _lock:
+        turns, hits = _stats["turns"], _stats["fast_path"]
+    return {"turns": turns, "fast_path": hits, "hit_rate": (hits / turns) if turns else 0.0}
@@ -1,15 +1,26 @@
-from typing import Any, Dict, TypedDict
+from typing import Any, Dict, List, Optional, TypedDict
 
+import asyncio
+import contextvars
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, SystemMessage
-
-from app.services.groq_client import get_llm
-from app.agent.prompts import SYSTEM_PROMPT
+from app.services.groq_client import invoke_llm, ainvoke_llm
+from app.agent.prompt_builder import build_extract_messages, drop_clipped_echoes
 from app.agent.utils import merge_json_safely
-from app.agent.tools import tool_suggestions_and_compliance_llm
+from app.agent.fastpath import classify_fast_path, record_fast_path
+from app.agent.cascade import cascade_extract, acascade_extract
+from app.core.config import settings
+from app.core.metrics import AGENT_STEP_SECONDS, GRAPH_NODE_SECONDS, timed
+from app.agent.tools import (
+    tool_suggestions_and_compliance_cached,
+    atool_suggestions_and_compliance_cached,
+    hcp_context_for_draft,
+    ahcp_context_for_draft,
+    suggestion_fingerprints,
+)
 
 try:
     from zoneinfo import ZoneInfo
@@ -31,9 +42,14 @@ class AgentState(TypedDict):
     tool_used: str
     assistant_message: str
 
+    # Latency budget: time.monotonic() deadline for the whole turn (None = unbounded),
+    # and the nodes that fell back because the budget ran out
+    deadline: Optional[float]
+    degraded: List[str]
 
-# Use extract model for extraction step
-llm = get_llm("extract")
+    # Suggestions/compliance computed on the incoming draft while extraction ran
+    # (SPECULATIVE_SUGGESTIONS); used by the next node if the draft's inputs didn't change
+    speculative: Optional[Dict[str, Any]]
 
 
 # ----------------------------
@@ -97,48 +113,247 @@ def normalize_draft_fields(draft: Dict[str, Any]) -> Dict[str, Any]:
     return draft
 
 
+# ----------------------------
+# Node 0: Fast-path router (patterns, no LLM)
+# ----------------------------
+def route_node(state: AgentState) -> AgentState:
+    parsed = classify_fast_path(state.get("message", ""))
+    record_fast_path(parsed is not None)
+
+    if parsed is not None:
+        state["extracted"] = {"raw": "", "parsed": parsed, "fast_path": True}
+        state["tool_used"] = "FastPath"
+    return state
+
+
+def decide_route(state: AgentState) -> str:
+    if state.get("extracted", {}).get("fast_path"):
+        return decide_node(state)
+    return "extract"
+
+
 # ----------------------------
 # Node 1: Extract (LLM -> JSON)
 # ----------------------------
-def extract_node(state: AgentState) -> AgentState:
-    prompt = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(
-            content=(
-                "User message:\n"
-                f"{state.get('message','')}\n\n"
-                "Current draft JSON:\n"
-                f"{state.get('draft', {})}\n\n"
-                "Return ONLY JSON."
-            )
-        ),
-    ]
-    resp = llm.invoke(prompt)
-    raw = (resp.content or "").strip()
-    parsed = merge_json_safely(raw)
-
-    state["extracted"] = {"raw": raw, "parsed": parsed}
+def _extract_prompt(state: AgentState) -> list:
+    return build_extract_messages(state.get("message", ""), state.get("draft", {}))
+
+
+def _store_extraction(state: AgentState, raw: str, parsed: Dict[str, Any], stage: str = "large") -> AgentState:
+    parsed = drop_clipped_echoes(parsed, state.get("draft") or {})
+    state["extracted"] = {"raw": raw, "parsed": parsed, "stage": stage}
     state["tool_used"] = "Extract"
     state["assistant_message"] = "Noted."
     return state
 
 
+def _mark_degraded(state: AgentState, node: str) -> None:
+    state["degraded"] = [*(state.get("degraded") or []), node]
+
+
+def _extraction_timed_out(state: AgentState) -> AgentState:
+    # Nothing extracted; the draft passes through unchanged
+    _mark_degraded(state, "extract")
+    return _store_extraction(state, "", {}, "timeout")
+
+
+def _extract(state: AgentState) -> AgentState:
+    prompt = _extract_prompt(state)
+    deadline = state.get("deadline")
+    try:
+        if settings.EXTRACT_CASCADE:
+            return _store_extraction(state, *cascade_extract(prompt, deadline))
+        raw = (invoke_llm("extract", prompt, deadline=deadline).content or "").strip()
+    except TimeoutError:
+        return _extraction_timed_out(state)
+    return _store_extraction(state, raw, merge_json_safely(raw))
+
+
+async def _aextract(state: AgentState) -> AgentState:
+    prompt = _extract_prompt(state)
+    deadline = state.get("deadline")
+    try:
+        if settings.EXTRACT_CASCADE:
+            return _store_extraction(state, *(await acascade_extract(prompt, deadline)))
+        raw = ((await ainvoke_llm("extract", prompt, deadline=deadline)).content or "").strip()
+    except TimeoutError:
+        return _extraction_timed_out(state)
+    return _store_extraction(state, raw, merge_json_safely(raw))
+
+
+# ----------------------------
+# Speculative suggestions (SPECULATIVE_SUGGESTIONS)
+# ----------------------------
+# Suggestions/compliance normally wait for extraction. On follow-up turns ("log it",
+# small corrections) the fields they depend on rarely change, so the suggestions call
+# is started on the incoming draft at the same time as extraction. Once extraction is
+# back, the speculative result is kept if the `minimal` projection is unchanged, and
+# dropped (the next node recomputes) otherwise. A turn then costs max(extract,
+# suggestions) instead of their sum.
+
+_spec_lock = threading.Lock()
+_spec_stats: Dict[str, int] = {"started": 0, "hits": 0, "misses": 0, "discarded": 0, "errors": 0}
+_spec_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="speculative")
+
+
+def _count_speculation(name: str) -> None:
+    with _spec_lock:
+        _spec_stats[name] += 1
+
+
+def speculation_stats() -> Dict[str, Any]:
+    with _spec_lock:
+        stats: Dict[str, Any] = dict(_spec_stats)
+    settled = stats["hits"] + stats["misses"] + stats["discarded"] + stats["errors"]
+    stats["hit_rate"] = round(stats["hits"] / settled, 4) if settled else 0.0
+    return stats
+
+
+def _speculation_base(state: AgentState) -> Optional[Dict[str, Any]]:
+    """The incoming draft as the next node would see it if extraction changes nothing."""
+    draft = state.get("draft") or {}
+    # First turns (no HCP yet) are about to gain most of their fields: not worth a call
+    if not settings.SPECULATIVE_SUGGESTIONS or not (draft.get("hcp_id") or draft.get("hcp_name")):
+        return None
+    return normalize_draft_fields(dict(draft))
+
+
+def _detach_callbacks() -> None:
+    # The speculation runs in a copy of the extract node's context (metrics traces still
+    # see it) but must not report to its LangChain callbacks: otherwise its tokens and
+    # output appear in astream_events under "extract", before anyone knows if it's valid.
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    var_child_runnable_config.set(None)
+
+
+def _speculate(base: Dict[str, Any], deadline: Optional[float]) -> Dict[str, Any]:
+    _detach_callbacks()  # own context (copy_context per submit), nothing leaks back
+    return tool_suggestions_and_compliance_cached(base, context=hcp_context_for_draft(base), deadline=deadline)
+
+
+async def _aspeculate(base: Dict[str, Any], deadline: Optional[float]) -> Dict[str, Any]:
+    _detach_callbacks()  # the task runs in its own copy of the context
+    return await atool_suggestions_and_compliance_cached(
+        base, context=await ahcp_context_for_draft(base), deadline=deadline
+    )
+
+
+def _still_valid(state: AgentState, base: Dict[str, Any]) -> bool:
+    # Same merge + normalize the intent nodes do; hcp context is checked there
+    parsed = state.get("extracted", {}).get("parsed", {}) or {}
+    projected = normalize_draft_fields(merge_into_draft(dict(state.get("draft") or {}), parsed))
+    return suggestion_fingerprints(projected)["minimal"] == suggestion_fingerprints(base)["minimal"]
+
+
+def _settle_speculation(state: AgentState, combo: Optional[Dict[str, Any]]) -> AgentState:
+    if combo is None or combo.get("degraded"):
+        _count_speculation("errors")
+        combo = None
+    state["speculative"] = combo
+    return state
+
+
+def _take_speculation(state: AgentState, draft: Dict[str, Any], context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    combo = state.get("speculative")
+    if combo is None:
+        return None
+    state["speculative"] = None
+    fp = combo.get("_suggest_fp") or {}
+    if fp.get("minimal") == suggestion_fingerprints(draft, context)["minimal"]:
+        _count_speculation("hits")
+        return combo
+    _count_speculation("misses")
+    return None
+
+
+def extract_node(state: AgentState) -> AgentState:
+    base = _speculation_base(state)
+    if base is None:
+        return _extract(state)
+
+    _count_speculation("started")
+    future = _spec_pool.submit(contextvars.copy_context().run, _speculate, base, state.get("deadline"))
+    state = _extract(state)
+    if not _still_valid(state, base):
+        future.cancel()  # if already running, its result is just never read
+        _count_speculation("discarded")
+        return state
+    try:
+        combo = future.result()
+    except Exception:
+        combo = None
+    return _settle_speculation(state, combo)
+
+
+async def aextract_node(state: AgentState) -> AgentState:
+    base = _speculation_base(state)
+    if base is None:
+        return await _aextract(state)
+
+    _count_speculation("started")
+    task = asyncio.ensure_future(_aspeculate(base, state.get("deadline")))
+    try:
+        state = await _aextract(state)
+    except BaseException:
+        task.cancel()
+        raise
+    if not _still_valid(state, base):
+        task.cancel()
+        _count_speculation("discarded")
+        return state
+    try:
+        combo = await task
+    except Exception:
+        combo = None
+    return _settle_speculation(state, combo)
+
+
+# ----------------------------
+# Helper: attach suggestions/compliance result to draft
+# ----------------------------
+def _apply_suggestions(state: AgentState, node: str, draft: Dict[str, Any], combo: Dict[str, Any]) -> Dict[str, Any]:
+    if combo.get("degraded"):
+        _mark_degraded(state, node)
+    draft["_ai_suggestions"] = combo["_ai_suggestions"]
+    draft["_compliance"] = combo["_compliance"]
+    # fingerprint of the inputs, so unchanged drafts skip the LLM next turn
+    draft["_suggest_fp"] = combo.get("_suggest_fp")
+    return draft
+
+
+def _suggestions(state: AgentState, draft: Dict[str, Any]) -> Dict[str, Any]:
+    # Suggestions + compliance with the HCP's cached history: the speculative result if it
+    # still matches, else the cached tool (LLM call skipped when inputs are unchanged)
+    context = hcp_context_for_draft(draft)
+    combo = _take_speculation(state, draft, context)
+    if combo is not None:
+        return combo
+    return tool_suggestions_and_compliance_cached(draft, context=context, deadline=state.get("deadline"))
+
+
+async def _asuggestions(state: AgentState, draft: Dict[str, Any]) -> Dict[str, Any]:
+    context = await ahcp_context_for_draft(draft)
+    combo = _take_speculation(state, draft, context)
+    if combo is not None:
+        return combo
+    return await atool_suggestions_and_compliance_cached(draft, context=context, deadline=state.get("deadline"))
+
+
 # ----------------------------
 # Node 2: Draft Update (merge + normalize + suggestions + compliance)
 # ----------------------------
-def draft_update_node(state: AgentState) -> AgentState:
+@timed(AGENT_STEP_SECONDS, "merge_normalize")
+def _prepare_draft_update(state: AgentState) -> Dict[str, Any]:
     parsed = state.get("extracted", {}).get("parsed", {}) or {}
     draft = state.get("draft", {}) or {}
 
     # Merge and normalize
     draft = merge_into_draft(draft, parsed)
-    draft = normalize_draft_fields(draft)
+    return normalize_draft_fields(draft)
 
-    # Suggestions + compliance (LLM tool call, fast single call)
-    combo = tool_suggestions_and_compliance_llm(draft)
-    draft["_ai_suggestions"] = combo["_ai_suggestions"]
-    draft["_compliance"] = combo["_compliance"]
 
+def _finish_draft_update(state: AgentState, draft: Dict[str, Any]) -> AgentState:
     state["draft"] = draft
     state["tool_used"] = "DraftUpdate"
 
@@ -152,10 +367,26 @@ def draft_update_node(state: AgentState) -> AgentState:
     return state
 
 
+def draft_update_node(state: AgentState) -> AgentState:
+    draft = _prepare_draft_update(state)
+
+    combo = _suggestions(state, draft)
+    draft = _apply_suggestions(state, "draft_update", draft, combo)
+    return _finish_draft_update(state, draft)
+
+
+async def adraft_update_node(state: AgentState) -> AgentState:
+    draft = _prepare_draft_update(state)
+    combo = await _asuggestions(state, draft)
+    draft = _apply_suggestions(state, "draft_update", draft, combo)
+    return _finish_draft_update(state, draft)
+
+
 # ----------------------------
 # Node 3: Edit intent packaging (no DB write here)
 # ----------------------------
-def edit_intent_node(state: AgentState) -> AgentState:
+@timed(AGENT_STEP_SECONDS, "merge_normalize")
+def _prepare_edit_intent(state: AgentState) -> Dict[str, Any]:
     parsed = state.get("extracted", {}).get("parsed", {}) or {}
     draft = state.get("draft", {}) or {}
 
@@ -170,38 +401,63 @@ def edit_intent_node(state: AgentState) -> AgentState:
 
     # Merge, normalize, and compute suggestions/compliance for UI preview
     draft = merge_into_draft(draft, parsed)
-    draft = normalize_draft_fields(draft)
+    return normalize_draft_fields(draft)
 
-    combo = tool_suggestions_and_compliance_llm(draft)
-    draft["_ai_suggestions"] = combo["_ai_suggestions"]
-    draft["_compliance"] = combo["_compliance"]
 
+def _finish_edit_intent(state: AgentState, draft: Dict[str, Any]) -> AgentState:
     state["draft"] = draft
     state["tool_used"] = "EditInteraction"
     state["assistant_message"] = "Edit request captured. I will update the latest interaction for this HCP."
     return state
 
 
+def edit_intent_node(state: AgentState) -> AgentState:
+    draft = _prepare_edit_intent(state)
+    combo = _suggestions(state, draft)
+    draft = _apply_suggestions(state, "edit_intent", draft, combo)
+    return _finish_edit_intent(state, draft)
+
+
+async def aedit_intent_node(state: AgentState) -> AgentState:
+    draft = _prepare_edit_intent(state)
+    combo = await _asuggestions(state, draft)
+    draft = _apply_suggestions(state, "edit_intent", draft, combo)
+    return _finish_edit_intent(state, draft)
+
+
 # ----------------------------
 # Node 4: Log intent packaging (no DB write here)
 # ----------------------------
-def log_intent_node(state: AgentState) -> AgentState:
+@timed(AGENT_STEP_SECONDS, "merge_normalize")
+def _prepare_log_intent(state: AgentState) -> Dict[str, Any]:
     parsed = state.get("extracted", {}).get("parsed", {}) or {}
     draft = state.get("draft", {}) or {}
 
     draft = merge_into_draft(draft, parsed)
-    draft = normalize_draft_fields(draft)
+    return normalize_draft_fields(draft)
 
-    combo = tool_suggestions_and_compliance_llm(draft)
-    draft["_ai_suggestions"] = combo["_ai_suggestions"]
-    draft["_compliance"] = combo["_compliance"]
 
+def _finish_log_intent(state: AgentState, draft: Dict[str, Any]) -> AgentState:
     state["draft"] = draft
     state["tool_used"] = "LogInteraction"
     state["assistant_message"] = "Ready to log. Logging will happen via the Log tool endpoint."
     return state
 
 
+def log_intent_node(state: AgentState) -> AgentState:
+    draft = _prepare_log_intent(state)
+    combo = _suggestions(state, draft)
+    draft = _apply_suggestions(state, "log_intent", draft, combo)
+    return _finish_log_intent(state, draft)
+
+
+async def alog_intent_node(state: AgentState) -> AgentState:
+    draft = _prepare_log_intent(state)
+    combo = await _asuggestions(state, draft)
+    draft = _apply_suggestions(state, "log_intent", draft, combo)
+    return _finish_log_intent(state, draft)
+
+
 # ----------------------------
 # Router: decide which path to take
 # ----------------------------
@@ -220,14 +476,40 @@ def decide_node(state: AgentState) -> str:
 # Build graph
 # ----------------------------
 def build_graph():
+    # langgraph is imported here, not at module level: it only matters once a graph is built
+    from langgraph.graph import StateGraph, END
+    from langchain_core.runnables import RunnableLambda
+
     g = StateGraph(AgentState)
 
-    g.add_node("extract", extract_node)
-    g.add_node("draft_update", draft_update_node)
-    g.add_node("edit_intent", edit_intent_node)
-    g.add_node("log_intent", log_intent_node)
+    # Each node has a sync + async implementation:
+    # invoke() uses the sync one, ainvoke() the async one.
+    # Every node is timed into crm_graph_node_seconds{node} (see app.core.metrics).
+    def node(name, fn, afn=None):
+        node_timer = timed(GRAPH_NODE_SECONDS, name)
+        if afn is None:
+            return node_timer(fn)
+        return RunnableLambda(node_timer(fn), afunc=node_timer(afn))
+
+    g.add_node("route", node("route", route_node))
+    g.add_node("extract", node("extract", extract_node, aextract_node))
+    g.add_node("draft_update", node("draft_update", draft_update_node, adraft_update_node))
+    g.add_node("edit_intent", node("edit_intent", edit_intent_node, aedit_intent_node))
+    g.add_node("log_intent", node("log_intent", log_intent_node, alog_intent_node))
+
+    g.set_entry_point("route")
 
-    g.set_entry_point("extract")
+    # Trivial turns skip the extraction LLM and go straight to their intent node
+    g.add_conditional_edges(
+        "route",
+        decide_route,
+        {
+            "extract": "extract",
+            "draft": "draft_update",
+            "edit": "edit_intent",
+            "log": "log_intent",
+        },
+    )
 
     g.add_conditional_edges(
         "extract",
@@ -246,4 +528,15 @@ def build_graph():
     return g.compile()
 
 
-agent_app = build_graph()
+# Compiled on first use (or in the app lifespan), not at import time
+_agent_app = None
+_agent_app_lock = threading.Lock()
+
+
+def get_agent_app():
+    global _agent_app
+    if _agent_app is None:
+        with _agent_app_lock:
+            if _agent_app is None:
+                _agent_app = build_graph()
+    return _agent_app
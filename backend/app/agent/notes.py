@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional
+import re
+
+# ----------------------------
+# Split a pasted day of notes into one note per HCP
+# ----------------------------
+# Paragraphs, bullets, numbered lines and sentences are the units. A unit that names a
+# doctor starts (or joins) that doctor's note; units without a name belong to the
+# note above them. Notes for the same doctor are joined, so each HCP gets one draft.
+
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_SENTENCE_RE = re.compile(r"(?<!\bDr\.)(?<!\bProf\.)(?<=[.!?;])\s+(?=[A-Z])")
+_HCP_RE = re.compile(r"\b(?:Dr\.?|Doctor|Prof\.?)\s+([A-Z][\w'-]+(?:\s+[A-Z][\w'-]+)?)")
+
+
+def _chunks(text: str) -> List[str]:
+    chunks: List[str] = []
+    current: List[str] = []
+    for line in text.splitlines():
+        if not line.strip() or _BULLET_RE.match(line):
+            if current:
+                chunks.append(" ".join(current))
+            current = []
+        line = _BULLET_RE.sub("", line).strip()
+        if line:
+            current.append(line)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def hcp_key(text: str) -> Optional[str]:
+    m = _HCP_RE.search(text)
+    return " ".join(m.group(1).lower().split()) if m else None
+
+
+def group_notes(notes: List[str]) -> List[str]:
+    """
+    Joins notes that name the same doctor (explicit note lists), in order of first
+    mention. Notes without a name stay on their own: there is nobody to join them to.
+    """
+    grouped: Dict[object, List[str]] = {}
+    for i, note in enumerate(notes):
+        key = hcp_key(note)
+        grouped.setdefault(key if key is not None else i, []).append(note)
+    return [" ".join(parts) for parts in grouped.values()]
+
+
+def split_notes(text: str) -> List[str]:
+    """Returns one note per HCP, in order of first mention."""
+    notes: Dict[Optional[str], List[str]] = {}
+    last: Optional[str] = None
+    for chunk in _chunks(text or ""):
+        for unit in _SENTENCE_RE.split(chunk):
+            key = hcp_key(unit)
+            if key is None:
+                key = last  # continuation of the previous doctor's note
+            notes.setdefault(key, []).append(unit)
+            last = key
+    return [" ".join(parts) for parts in notes.values()]
@@ -0,0 +1,206 @@
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import re
+import threading
+
+from app.agent.prompts import SYSTEM_PROMPT
+from app.core.config import settings
+
+# ----------------------------
+# Token-budgeted prompt construction
+# ----------------------------
+# System prompts are passed through untouched and always come first, so the static
+# prefix stays byte-identical across requests (provider-side prefix caching).
+# Only the variable part (draft/context JSON) is compacted and trimmed.
+
+# Draft keys the extractor can use; everything else (internal "_" keys, UI flags) is dropped
+EXTRACT_DRAFT_KEYS = (
+    "hcp_id", "hcp_name", "interaction_type", "date", "time", "occurred_at",
+    "attendees", "topics_discussed", "materials_shared", "samples_distributed",
+    "consent_required", "sentiment", "products_discussed", "summary", "outcomes", "follow_ups",
+)
+
+# Approximates Llama/BPE token counts closely enough for budgeting (words + punctuation)
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_ELLIPSIS = " …"
+
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text or ""))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Keeps the first `max_tokens` tokens of text (cut on a token boundary)."""
+    if max_tokens <= 0:
+        return ""
+    for i, m in enumerate(_TOKEN_RE.finditer(text)):
+        if i == max_tokens:
+            return text[:m.start()].rstrip() + _ELLIPSIS
+    return text
+
+
+def _is_empty(v: Any) -> bool:
+    return v is None or (isinstance(v, (str, list, dict)) and len(v) == 0) or (isinstance(v, str) and not v.strip())
+
+
+def compact_fields(
+    data: Dict[str, Any],
+    keys: Optional[Iterable[str]] = None,
+    field_max_tokens: Optional[int] = None,
+    total_max_tokens: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Drops empty (and, if `keys` is given, irrelevant) fields, caps each string field at
+    `field_max_tokens`, then halves the longest string fields until the whole dict fits
+    `total_max_tokens`.
+    """
+    field_max = settings.PROMPT_FIELD_MAX_TOKENS if field_max_tokens is None else field_max_tokens
+    total_max = settings.PROMPT_DRAFT_MAX_TOKENS if total_max_tokens is None else total_max_tokens
+
+    allowed = set(keys) if keys is not None else None
+    out: Dict[str, Any] = {}
+    for k, v in (data or {}).items():
+        if (allowed is not None and k not in allowed) or str(k).startswith("_") or _is_empty(v):
+            continue
+        out[k] = truncate_tokens(v, field_max) if isinstance(v, str) else v
+
+    sizes = {k: count_tokens(v) for k, v in out.items() if isinstance(v, str)}
+    total = sum(sizes.values())
+    while total > total_max and sizes:
+        k = max(sizes, key=sizes.get)
+        if sizes[k] <= 16:
+            break
+        out[k] = truncate_tokens(out[k], sizes[k] // 2)
+        total -= sizes[k]
+        sizes[k] = count_tokens(out[k])
+        total += sizes[k]
+    return out
+
+
+def compact_context(context: Optional[Dict[str, Any]], max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Context (HCP + history) trimmed to budget by dropping the oldest list items first."""
+    budget = settings.PROMPT_CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens
+    field_max = settings.PROMPT_FIELD_MAX_TOKENS // 2
+
+    def _compact(v: Any) -> Any:
+        if isinstance(v, dict):
+            return compact_fields(v, field_max_tokens=field_max, total_max_tokens=budget)
+        if isinstance(v, list):
+            return [_compact(i) for i in v if not _is_empty(i)]
+        return v
+
+    out = {k: _compact(v) for k, v in (context or {}).items() if not _is_empty(v)}
+    while count_tokens(dumps(out)) > budget:
+        lists = [k for k, v in out.items() if isinstance(v, list) and v]
+        if not lists:
+            break
+        longest = max(lists, key=lambda k: len(out[k]))
+        out[longest] = out[longest][:-1]
+    return out
+
+
+def dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def record_prompt_tokens(purpose: str, messages: List[Any]) -> int:
+    tokens = sum(count_tokens(str(getattr(m, "content", m))) for m in messages)
+    with _lock:
+        s = _stats.setdefault(purpose, {"requests": 0, "total_tokens": 0, "max_tokens": 0, "last_tokens": 0})
+        s["requests"] += 1
+        s["total_tokens"] += tokens
+        s["max_tokens"] = max(s["max_tokens"], tokens)
+        s["last_tokens"] = tokens
+    return tokens
+
+
+def prompt_stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            purpose: {**s, "avg_tokens": round(s["total_tokens"] / s["requests"], 1) if s["requests"] else 0.0}
+            for purpose, s in _stats.items()
+        }
+
+
+# ----------------------------
+# Clipped draft fields echoed back by the extractor
+# ----------------------------
+_CLIPPED_NOTE = f"Draft values ending in \"{_ELLIPSIS.strip()}\" are shortened: leave them out unless the user changes them.\n"
+
+
+def _clipped_fields(draft: Dict[str, Any], visible: Dict[str, Any]) -> Dict[str, str]:
+    """Draft keys shown shortened in the prompt -> the text the model saw (without the ellipsis)."""
+    return {
+        k: v[:-len(_ELLIPSIS)]
+        for k, v in visible.items()
+        if isinstance(v, str) and v.endswith(_ELLIPSIS) and v != draft.get(k)
+    }
+
+
+def _is_echo(value: Any, shown: str, full: str) -> bool:
+    if not isinstance(value, str):
+        return False
+    value = value.rstrip()
+    clipped = value.endswith(_ELLIPSIS.strip())
+    stem = value[:-len(_ELLIPSIS.strip())].rstrip() if clipped else value
+    return stem == shown.rstrip() or (clipped and full.startswith(stem))
+
+
+def drop_clipped_echoes(parsed: Dict[str, Any], draft: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Removes extracted values that only repeat a draft field the prompt showed shortened;
+    merging them would replace the full text with its first tokens.
+    """
+    clipped = _clipped_fields(draft, compact_fields(draft, keys=EXTRACT_DRAFT_KEYS))
+    if not clipped or not parsed:
+        return parsed
+
+    def _clean(fields: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in fields.items() if k not in clipped or not _is_echo(v, clipped[k], draft[k])}
+
+    out = _clean(parsed)
+    if isinstance(out.get("fields_to_update"), dict):
+        out["fields_to_update"] = _clean(out["fields_to_update"])
+    return out
+
+
+def build_extract_messages(message: str, draft: Dict[str, Any]) -> List[Any]:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    visible = compact_fields(draft, keys=EXTRACT_DRAFT_KEYS)
+    note = _CLIPPED_NOTE if _clipped_fields(draft, visible) else ""
+    messages = [
+        SystemMessage(content=SYSTEM_PROMPT),
+        HumanMessage(
+            content=(
+                "User message:\n"
+                f"{truncate_tokens(message or '', settings.PROMPT_MESSAGE_MAX_TOKENS)}\n\n"
+                "Current draft JSON:\n"
+                f"{dumps(visible)}\n\n"
+                f"{note}"
+                "Return ONLY JSON."
+            )
+        ),
+    ]
+    record_prompt_tokens("extract", messages)
+    return messages
+
+
+def build_suggest_messages(
+    system_prompt: str,
+    minimal: Dict[str, Any],
+    context: Optional[Dict[str, Any]],
+    extra: Optional[Dict[str, Any]] = None,
+) -> List[Any]:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    body = {"draft": compact_fields(minimal), "context": compact_context(context), **(extra or {})}
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=dumps(body)),
+    ]
+    record_prompt_tokens("tools", messages)
+    return messages
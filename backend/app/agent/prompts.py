@@ -36,3 +36,78 @@ Rules:
 - Otherwise:
   action="draft"
 """
+
+# Appended (as a separate message) only for the fast model in the extraction cascade
+CONFIDENCE_INSTRUCTION = """Also include "confidence": a number from 0 to 1 for how sure you are that
+the action and every extracted field are correct."""
+
+# ----------------------------
+# Output schemas for structured output (LLM_STRUCTURED_OUTPUT="tool")
+# ----------------------------
+# Same keys as the prompts above, as forced tool calls. Every key is optional, like in
+# the prompts; the parser and merge logic still decide what to keep.
+_STR = {"type": "string"}
+
+_EXTRACT_FIELDS = {
+    "hcp_name": _STR,
+    "interaction_type": _STR,
+    "date": {"type": "string", "description": 'YYYY-MM-DD or "today"'},
+    "time": {"type": "string", "description": 'HH:MM or h:mm AM/PM'},
+    "attendees": _STR,
+    "topics_discussed": _STR,
+    "materials_shared": _STR,
+    "samples_distributed": _STR,
+    "consent_required": {"type": "boolean"},
+    "sentiment": {"type": "string", "enum": ["positive", "neutral", "negative"]},
+    "products_discussed": _STR,
+    "summary": _STR,
+    "outcomes": _STR,
+    "follow_ups": _STR,
+}
+
+EXTRACT_OUTPUT_SCHEMA = {
+    "type": "function",
+    "function": {
+        "name": "record_interaction_fields",
+        "description": "Fields extracted from the rep's note.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "action": {"type": "string", "enum": ["draft", "log", "edit"]},
+                **_EXTRACT_FIELDS,
+                "fields_to_update": {"type": "object", "properties": _EXTRACT_FIELDS},
+                "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+            },
+            "required": ["action"],
+        },
+    },
+}
+
+SUGGEST_OUTPUT_SCHEMA = {
+    "type": "function",
+    "function": {
+        "name": "record_suggestions",
+        "description": "Follow-up suggestions (and the compliance verdict when asked for).",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "_ai_suggestions": {"type": "array", "items": _STR},
+                "_compliance": {
+                    "type": "object",
+                    "properties": {
+                        "status": {"type": "string", "enum": ["ok", "review"]},
+                        "issues": {"type": "array", "items": _STR},
+                    },
+                },
+            },
+            "required": ["_ai_suggestions"],
+        },
+    },
+}
+
+# by groq_client purpose
+OUTPUT_SCHEMAS = {
+    "extract": EXTRACT_OUTPUT_SCHEMA,
+    "extract_fast": EXTRACT_OUTPUT_SCHEMA,
+    "tools": SUGGEST_OUTPUT_SCHEMA,
+}
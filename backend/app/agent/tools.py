@@ -1,38 +1,51 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+import asyncio
+import hashlib
 import json
 import re
 
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
 from app.db import models
-from app.agent.utils import resolve_hcp_by_name_or_id
+from app.db.models import normalize_hcp_name
+from app.db.session import SessionLocal
+from app.db.writer import writer
+from app.services.hcp_index import hcp_index, stage_new_hcp
+from app.services.hcp_context import hcp_context_cache, stage_context_log, stage_context_edit
+from app.agent.utils import ambiguous_hcp_error, parse_json_object, resolve_hcp_by_name_or_id, resolve_hcp_for_write
+
+from app.agent.prompt_builder import build_suggest_messages
+from app.services.groq_client import invoke_llm, ainvoke_llm
+from app.core.config import settings
+from app.core.metrics import TOOL_SECONDS, record_json_parse, timed
+
+# Editable interaction columns (what the chat draft mirrors)
+INTERACTION_FIELDS = (
+    "interaction_type", "date", "time", "attendees", "topics_discussed",
+    "materials_shared", "samples_distributed", "consent_required",
+    "occurred_at", "sentiment", "products_discussed", "summary", "outcomes", "follow_ups",
+)
+
+
+def interaction_to_dict(i: models.Interaction) -> Dict[str, Any]:
+    return {
+        "id": i.id,
+        "created_at": str(i.created_at),
+        **{k: getattr(i, k) for k in INTERACTION_FIELDS},
+    }
 
-from langchain_core.messages import SystemMessage, HumanMessage
-from app.services.groq_client import get_llm
 
 # ============================================================
 # Tool 1: Log Interaction (required)
 # ============================================================
 
-def tool_log_interaction(db: Session, draft: Dict[str, Any]) -> Dict[str, Any]:
-    # resolve HCP by id or name (video-style, no dropdown required)
-    hcp_id = draft.get("hcp_id") or None
-    hcp_name = draft.get("hcp_name") or None
-
-    hcp = resolve_hcp_by_name_or_id(db, hcp_id, hcp_name)
-
-    # If HCP not found but name exists, create it (optional; good for demo)
-    if not hcp and hcp_name:
-        hcp = models.HCP(name=hcp_name.strip(), specialty="", city="")
-        db.add(hcp)
-        db.commit()
-        db.refresh(hcp)
-
-    if not hcp:
-        return {"error": "HCP is required to log. Please mention HCP name in chat."}
-
-    interaction = models.Interaction(
-        hcp_id=hcp.id,
+def _interaction_values(draft: Dict[str, Any], hcp_id: int) -> Dict[str, Any]:
+    return dict(
+        hcp_id=hcp_id,
         interaction_type=draft.get("interaction_type", "Meeting"),
 
         date=draft.get("date", ""),
@@ -50,113 +63,493 @@ def tool_log_interaction(db: Session, draft: Dict[str, Any]) -> Dict[str, Any]:
         outcomes=draft.get("outcomes", ""),
         follow_ups=draft.get("follow_ups", ""),
     )
+
+
+_HCP_REQUIRED = "HCP is required to log. Please mention HCP name in chat."
+
+
+def _resolve_log_hcps(db: Session, drafts: List[Dict[str, Any]]) -> List[Any]:
+    """
+    The HCP rule for logging, shared by the single and the batch path (and so by the
+    group-commit writer, which folds single calls into one batch): a known hcp_id wins,
+    else the name (exact key or unique prefix, then hcps.name_norm); names nobody has yet
+    become new HCPs, names that are a prefix of several HCPs get an error.
+    One query per lookup kind whatever the number of drafts.
+    Returns, per draft, the hcp id or the error message for that draft.
+    """
+    def _id(d: Dict[str, Any]) -> Optional[int]:
+        v = str(d.get("hcp_id") or "").strip()
+        return int(v) if v.isdigit() else None
+
+    def _name(d: Dict[str, Any]) -> str:
+        return str(d.get("hcp_name") or "").strip()
+
+    requested = [_id(d) for d in drafts]
+    known_ids = set()
+    if any(i is not None for i in requested):
+        ids = {i for i in requested if i is not None}
+        known_ids = set(db.scalars(select(models.HCP.id).where(models.HCP.id.in_(ids))))
+    hcp_ids: List[Optional[int]] = [i if i in known_ids else None for i in requested]
+
+    # An unknown (or missing) id falls back to the name
+    keys = [normalize_hcp_name(_name(d)) if i is None else "" for d, i in zip(drafts, hcp_ids)]
+    # Exact key or unique prefix only: a typo must not attach the log to someone else
+    by_name: Dict[str, int] = {}
+    ambiguous: Dict[str, List[str]] = {}
+    for refresh in (False, True):
+        todo = set(k for k in keys if k and k not in by_name and k not in ambiguous)
+        if not todo:
+            break
+        if refresh:
+            hcp_index.refresh(db)  # once per call, only if something missed
+        for key in todo:
+            hit, candidates = hcp_index.match_strict(db, key, refresh=False)
+            if hit is not None:
+                by_name[key] = hit[0]
+            elif candidates:
+                ambiguous[key] = candidates
+    if by_name:
+        # the index can be ahead of this transaction (rolled back / deleted rows)
+        live = set(db.scalars(select(models.HCP.id).where(models.HCP.id.in_(set(by_name.values())))))
+        by_name = {k: i for k, i in by_name.items() if i in live}
+
+    unresolved = {k for k in keys if k and k not in by_name and k not in ambiguous}
+    if unresolved:
+        rows = db.execute(
+            select(models.HCP.name_norm, func.min(models.HCP.id))
+            .where(models.HCP.name_norm.in_(unresolved))
+            .group_by(models.HCP.name_norm)
+        )
+        by_name.update({key: hcp_id for key, hcp_id in rows})
+
+    # Create missing HCPs (first spelling seen wins); ids come back in insert order
+    missing: Dict[str, str] = {}
+    for d, key in zip(drafts, keys):
+        if key and key not in by_name and key not in ambiguous and key not in missing:
+            missing[key] = _name(d)
+    if missing:
+        new_ids = db.scalars(
+            insert(models.HCP).returning(models.HCP.id, sort_by_parameter_order=True),
+            [{"name": name, "specialty": "", "city": ""} for name in missing.values()],
+        ).all()
+        for hcp_id, name in zip(new_ids, missing.values()):
+            stage_new_hcp(db, hcp_id, name)
+        by_name.update(zip(missing.keys(), new_ids))
+
+    out: List[Any] = []
+    for d, hcp_id, key in zip(drafts, hcp_ids, keys):
+        if hcp_id is not None:
+            out.append(hcp_id)
+        elif key in ambiguous:
+            out.append(ambiguous_hcp_error(db, _name(d), ambiguous[key]))
+        else:
+            out.append(by_name[key] if key else _HCP_REQUIRED)
+    return out
+
+
+@timed(TOOL_SECONDS, "log_interaction")
+def write_log_interaction(db: Session, draft: Dict[str, Any]) -> Dict[str, Any]:
+    """Log without committing (flushes for ids); the caller owns the transaction."""
+    # resolve HCP by id or name (video-style, no dropdown required); unknown names are created
+    hcp_id = _resolve_log_hcps(db, [draft])[0]
+    if isinstance(hcp_id, str):
+        return {"error": hcp_id}
+
+    interaction = models.Interaction(**_interaction_values(draft, hcp_id))
     db.add(interaction)
-    db.commit()
-    db.refresh(interaction)
+    db.flush()
+    stage_context_log(db, hcp_id, interaction_to_dict(interaction))
 
     return {
         "tool_used": "LogInteraction",
         "interaction_id": interaction.id,
-        "hcp_id": hcp.id,
+        "hcp_id": hcp_id,
         "message": "Logged interaction successfully."
     }
 
 
+def tool_log_interaction(db: Session, draft: Dict[str, Any]) -> Dict[str, Any]:
+    result = write_log_interaction(db, draft)
+    db.commit()
+    return result
+
+
+# ============================================================
+# Tool 1b: Log many interactions (offline sync) in one transaction
+# ============================================================
+
+@timed(TOOL_SECONDS, "log_interactions_batch")
+def write_log_interactions_batch(db: Session, drafts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Same semantics as tool_log_interaction per draft (same HCP rule, _resolve_log_hcps),
+    but missing HCPs are created in bulk and interactions inserted with one executemany, one commit.
+    Results are returned in input order; invalid drafts get an "error" instead of an id.
+    Does not commit; the caller owns the transaction.
+    """
+    resolved = _resolve_log_hcps(db, drafts)
+
+    results: List[Dict[str, Any]] = []
+    rows_to_insert: List[Dict[str, Any]] = []
+    for index, (d, hcp_id) in enumerate(zip(drafts, resolved)):
+        if isinstance(hcp_id, str):
+            results.append({"index": index, "error": hcp_id})
+            continue
+        results.append({"index": index, "hcp_id": hcp_id})
+        rows_to_insert.append(_interaction_values(d, hcp_id))
+
+    if rows_to_insert:
+        inserted = db.execute(
+            insert(models.Interaction).returning(
+                models.Interaction.id, models.Interaction.created_at, sort_by_parameter_order=True
+            ),
+            rows_to_insert,
+        ).all()
+        ok = (r for r in results if "error" not in r)
+        for r, row, (interaction_id, created_at) in zip(ok, rows_to_insert, inserted):
+            r["interaction_id"] = interaction_id
+            stage_context_log(db, row["hcp_id"], {"id": interaction_id, "created_at": str(created_at), **row})
+
+    logged = len(rows_to_insert)
+    return {
+        "tool_used": "LogInteractionBatch",
+        "logged": logged,
+        "failed": len(drafts) - logged,
+        "results": results,
+    }
+
+
+def _write_log_interactions(db: Session, calls: List[tuple]) -> List[Dict[str, Any]]:
+    """Bulk variant of write_log_interaction for the group-commit writer (same result shape)."""
+    out = write_log_interactions_batch(db, [draft for (draft,) in calls])
+    return [
+        {"error": r["error"]} if "error" in r else {
+            "tool_used": "LogInteraction",
+            "interaction_id": r["interaction_id"],
+            "hcp_id": r["hcp_id"],
+            "message": "Logged interaction successfully.",
+        }
+        for r in out["results"]
+    ]
+
+
+writer.register_many(write_log_interaction, _write_log_interactions)
+
+
+def tool_log_interactions_batch(db: Session, drafts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    result = write_log_interactions_batch(db, drafts)
+    db.commit()
+    return result
+
+
 # ============================================================
 # Tool 2: Edit Latest Interaction (required, no interaction_id in UI)
 # ============================================================
 
-def tool_edit_latest_interaction(
+@timed(TOOL_SECONDS, "edit_latest_interaction")
+def write_edit_latest_interaction(
     db: Session,
     hcp_id: Optional[int],
     hcp_name: Optional[str],
     fields_to_update: Dict[str, Any],
 ) -> Dict[str, Any]:
-    hcp = resolve_hcp_by_name_or_id(db, hcp_id, hcp_name)
+    """Edit without committing; the caller owns the transaction."""
+    hcp, error = resolve_hcp_for_write(db, hcp_id, hcp_name)
+    if error:
+        return {"error": error}
     if not hcp:
         return {"error": "HCP not found for edit. Please mention the HCP name."}
 
     target = (
         db.query(models.Interaction)
         .filter(models.Interaction.hcp_id == hcp.id)
-        .order_by(desc(models.Interaction.created_at))
+        .order_by(desc(models.Interaction.created_at), desc(models.Interaction.id))
         .first()
     )
     if not target:
         return {"error": "No interactions found for this HCP to edit."}
 
-    allowed = {
-        "interaction_type", "date", "time", "attendees", "topics_discussed",
-        "materials_shared", "samples_distributed", "consent_required",
-        "occurred_at", "sentiment", "products_discussed", "summary", "outcomes", "follow_ups"
-    }
-
     updated = {}
     for k, v in (fields_to_update or {}).items():
-        if k in allowed and v is not None:
+        if k in INTERACTION_FIELDS and v is not None:
             setattr(target, k, v)
             updated[k] = v
 
-    db.commit()
+    db.flush()
+    row = interaction_to_dict(target)
+    stage_context_edit(db, hcp.id, row)
 
     return {
         "tool_used": "EditInteraction",
         "interaction_id": target.id,
         "hcp_id": hcp.id,  # ✅ always return hcp_id
         "updated_fields": updated,
+        # the row as it is after the edit, so callers don't have to re-read it
+        "interaction": row,
         "message": f"Updated latest interaction for {hcp.name}."
     }
 
 
+def tool_edit_latest_interaction(
+    db: Session,
+    hcp_id: Optional[int],
+    hcp_name: Optional[str],
+    fields_to_update: Dict[str, Any],
+) -> Dict[str, Any]:
+    result = write_edit_latest_interaction(db, hcp_id, hcp_name, fields_to_update)
+    db.commit()
+    return result
+
+
 # ============================================================
 # Tool 3: Retrieve HCP Context
 # ============================================================
 
+@timed(TOOL_SECONDS, "load_hcp_context")
+def _load_hcp_context(db: Session, hcp: models.HCP) -> Dict[str, Any]:
+    latest = (
+        db.query(models.Interaction)
+        .filter(models.Interaction.hcp_id == hcp.id)
+        .order_by(desc(models.Interaction.created_at), desc(models.Interaction.id))
+        .limit(hcp_context_cache.latest_n)
+        .all()
+    )
+    sentiments = dict(
+        db.execute(
+            select(models.Interaction.sentiment, func.count())
+            .where(models.Interaction.hcp_id == hcp.id)
+            .group_by(models.Interaction.sentiment)
+        ).all()
+    )
+    entry = hcp_context_cache.build(
+        hcp={"id": hcp.id, "name": hcp.name, "specialty": hcp.specialty, "city": hcp.city},
+        name_key=hcp.name_norm,
+        interactions=[interaction_to_dict(i) for i in latest],
+        count=sum(sentiments.values()),
+        sentiments={k: v for k, v in sentiments.items() if k},
+    )
+    hcp_context_cache.put(hcp.id, entry)
+    return entry
+
+
+def _cached_hcp_context(
+    db: Optional[Session],
+    hcp_id: Optional[int],
+    hcp_name: Optional[str],
+) -> Optional[Dict[str, Any]]:
+    """Cached context entry; touches the DB (when given) only on a cache miss."""
+    cached_id = int(hcp_id) if str(hcp_id or "").isdigit() else None
+    if cached_id is None and hcp_name:
+        cached_id = hcp_context_cache.id_for_name(normalize_hcp_name(hcp_name))
+    if cached_id is not None:
+        entry = hcp_context_cache.get(cached_id)
+        if entry is not None:
+            return entry
+    if db is None:
+        return None
+
+    hcp = resolve_hcp_by_name_or_id(db, hcp_id, hcp_name)
+    if not hcp:
+        return None
+    return hcp_context_cache.get(hcp.id) or _load_hcp_context(db, hcp)
+
+
+@timed(TOOL_SECONDS, "retrieve_hcp_context")
 def tool_retrieve_hcp_context(
     db: Session,
     hcp_id: Optional[int] = None,
     hcp_name: Optional[str] = None,
 ) -> Dict[str, Any]:
+    # Always from the DB (and refreshes the cache): another worker may have just written
     hcp = resolve_hcp_by_name_or_id(db, hcp_id, hcp_name)
     if not hcp:
         return {"error": "HCP not found"}
-
-    latest = (
-        db.query(models.Interaction)
-        .filter(models.Interaction.hcp_id == hcp.id)
-        .order_by(desc(models.Interaction.created_at))
-        .limit(5)
-        .all()
-    )
+    entry = _load_hcp_context(db, hcp)
 
     return {
-        "hcp": {"id": hcp.id, "name": hcp.name, "specialty": hcp.specialty, "city": hcp.city},
+        "hcp": entry["hcp"],
         "latest_interactions": [
             {
-                "id": i.id,
-                "created_at": str(i.created_at),
-
-                "interaction_type": i.interaction_type,
-                "date": i.date,
-                "time": i.time,
-                "attendees": i.attendees,
-                "topics_discussed": i.topics_discussed,
-                "materials_shared": i.materials_shared,
-                "samples_distributed": i.samples_distributed,
-                "consent_required": i.consent_required,
-
-                "occurred_at": i.occurred_at,
-                "sentiment": i.sentiment,
-                "products_discussed": i.products_discussed,
-                "summary": i.summary,
-                "outcomes": i.outcomes,
-                "follow_ups": i.follow_ups,
+                "id": i.get("id"),
+                "created_at": i.get("created_at", ""),
+                **{k: i.get(k, False if k == "consent_required" else "") for k in INTERACTION_FIELDS},
             }
-            for i in latest
+            for i in entry["latest"]
         ],
+        "rollups": entry["rollups"],
     }
 
 
+# Interaction fields worth showing the suggestions model
+_CONTEXT_FIELDS = (
+    "date", "interaction_type", "sentiment", "products_discussed",
+    "topics_discussed", "summary", "outcomes", "follow_ups",
+)
+
+
+def _suggest_context(entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not entry:
+        return None
+    hcp = {k: v for k, v in entry["hcp"].items() if k != "id" and v}
+    rollups = {k: v for k, v in entry["rollups"].items() if v}
+    return {
+        "hcp": hcp,
+        "rollups": rollups,
+        "recent_interactions": [
+            {k: i[k] for k in _CONTEXT_FIELDS if k in i} for i in entry["latest"]
+        ],
+    }
+
+
+@timed(TOOL_SECONDS, "hcp_context")
+def hcp_context_for_draft(draft: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """History for the draft's HCP (suggestions prompt). Cache first; DB only on a miss."""
+    hcp_id, hcp_name = draft.get("hcp_id"), draft.get("hcp_name")
+    if not hcp_id and not hcp_name:
+        return None
+    entry = _cached_hcp_context(None, hcp_id, hcp_name)
+    if entry is None:
+        db = SessionLocal()
+        try:
+            entry = _cached_hcp_context(db, hcp_id, hcp_name)
+        except SQLAlchemyError:
+            entry = None  # suggestions still work without history
+        finally:
+            db.close()
+    return _suggest_context(entry)
+
+
+async def ahcp_context_for_draft(draft: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    hcp_id, hcp_name = draft.get("hcp_id"), draft.get("hcp_name")
+    if not hcp_id and not hcp_name:
+        return None
+    entry = _cached_hcp_context(None, hcp_id, hcp_name)
+    if entry is not None:
+        return _suggest_context(entry)
+    return await asyncio.to_thread(hcp_context_for_draft, draft)
+
+
+# ============================================================
+# Compliance rule engine (local, deterministic)
+# ============================================================
+
+CONSENT_ISSUE = "Consent not confirmed for voice note summarization"
+
+# Free-text draft fields scanned for risky claims (same fields the suggestions tool sees)
+COMPLIANCE_TEXT_FIELDS = (
+    "products_discussed", "materials_shared", "samples_distributed",
+    "topics_discussed", "summary", "outcomes", "follow_ups",
+)
+
+_DEFAULT_RULES_PATH = Path(__file__).with_name("compliance_rules.json")
+
+
+class _PhraseMatcher:
+    """
+    Aho-Corasick automaton: finds every rule phrase in one pass over the text,
+    regardless of how many phrases are configured.
+    """
+
+    def __init__(self, phrases: Dict[str, Dict[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Dict[str, Any]]]] = [[]]
+
+        for phrase, rule in phrases.items():
+            node = 0
+            for ch in phrase:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(phrase), rule))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """Yields (start, end, rule) for whole-word matches in an already lowercased text."""
+        node = 0
+        n = len(text)
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, rule in self._out[node]:
+                start, end = i - length + 1, i + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end < n and text[end].isalnum():
+                    continue
+                yield start, end, rule
+
+
+class ComplianceRules:
+    def __init__(self, config: Dict[str, Any]):
+        self.negations = {str(w).lower() for w in config.get("negations", [])}
+        self.negation_window = int(config.get("negation_window", 3))
+
+        phrases: Dict[str, Dict[str, Any]] = {}
+        for rule in config.get("rules", []):
+            for phrase in rule.get("phrases", []):
+                phrases[str(phrase).lower()] = rule
+        self._matcher = _PhraseMatcher(phrases)
+
+    def _is_negated(self, text: str, start: int) -> bool:
+        # only look back within the current clause
+        head = re.split(r"[.;:!?\n]", text[max(0, start - 80):start])[-1]
+        words = re.findall(r"[a-z']+", head)
+        return any(w in self.negations for w in words[-self.negation_window:])
+
+    def check(self, draft: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns {"status", "issues", "uncertain"}.
+        "uncertain" lists hits the rules cannot decide on; only those need the LLM.
+        """
+        issues: List[str] = []
+        uncertain: List[str] = []
+
+        for field in COMPLIANCE_TEXT_FIELDS:
+            value = draft.get(field)
+            if not value:
+                continue
+            text = str(value).lower()
+            for start, end, rule in self._matcher.finditer(text):
+                if rule.get("negatable", True) and self._is_negated(text, start):
+                    continue
+                target = uncertain if rule.get("kind") == "uncertain" else issues
+                issue = f"{rule['issue']} ('{text[start:end]}' in {field})"
+                if issue not in target:
+                    target.append(issue)
+
+        if bool(draft.get("used_voice_note")) and not bool(draft.get("consent_required")):
+            issues.append(CONSENT_ISSUE)
+
+        return {"status": "review" if issues else "ok", "issues": issues, "uncertain": uncertain}
+
+
+@lru_cache(maxsize=1)
+def get_compliance_rules() -> ComplianceRules:
+    path = Path(settings.COMPLIANCE_RULES_PATH) if settings.COMPLIANCE_RULES_PATH else _DEFAULT_RULES_PATH
+    with open(path, encoding="utf-8") as f:
+        return ComplianceRules(json.load(f))
+
+
+def tool_compliance_rules(draft: Dict[str, Any]) -> Dict[str, Any]:
+    return get_compliance_rules().check(draft)
+
+
 # ============================================================
 # Tool 4 + Tool 5 (LLM): Suggestions + Compliance in ONE call
 # ============================================================
@@ -176,33 +569,33 @@ Rules:
 - If used_voice_note is true AND consent_required is false -> status MUST be "review"
   with issue "Consent not confirmed for voice note summarization".
 - Flag risky claims if present: guarantee, 100% effective, cure, permanent, no side effects.
+- "compliance_hints" (if present) lists phrases a rule engine flagged as ambiguous; decide if they are issues.
 - Do NOT invent medical claims or facts.
 - Keep responses concise.
 """
 
-def _safe_json_load(s: str) -> Dict[str, Any]:
-    try:
-        return json.loads(s)
-    except Exception:
-        m = re.search(r"\{.*\}", s, re.DOTALL)
-        if not m:
-            return {}
-        try:
-            return json.loads(m.group(0))
-        except Exception:
-            return {}
+# Used when the local rule engine already decided compliance (no ambiguous hits)
+LLM_SUGGEST_SYSTEM = """You are an AI CRM assistant for pharma sales reps.
+Task: produce follow-up suggestions.
 
-def tool_suggestions_and_compliance_llm(
-    draft: Dict[str, Any],
-    context: Optional[Dict[str, Any]] = None
-) -> Dict[str, Any]:
-    """
-    One fast LLM call for both suggestions and compliance.
-    Keep payload small for speed.
-    """
-    llm = get_llm("tools")
+Return ONLY valid JSON in this exact schema:
+{
+  "_ai_suggestions": ["...", "...", "..."]
+}
 
-    minimal = {
+Rules:
+- Suggestions: 3 to 6, short, actionable.
+- Do NOT invent medical claims or facts.
+- Keep responses concise.
+"""
+
+def _safe_json_load(s: str) -> Dict[str, Any]:
+    data, outcome = parse_json_object(s)
+    record_json_parse("tools", outcome)
+    return data
+
+def _suggest_minimal(draft: Dict[str, Any]) -> Dict[str, Any]:
+    return {
         "hcp_name": draft.get("hcp_name"),
         "interaction_type": draft.get("interaction_type"),
         "date": draft.get("date"),
@@ -219,29 +612,35 @@ def tool_suggestions_and_compliance_llm(
         "consent_required": bool(draft.get("consent_required")),
     }
 
-    prompt = [
-        SystemMessage(content=LLM_SUGGEST_COMPLIANCE_SYSTEM),
-        HumanMessage(content=json.dumps({"draft": minimal, "context": context or {}}, ensure_ascii=False)),
-    ]
-
-    resp = llm.invoke(prompt)
-    data = _safe_json_load((resp.content or "").strip())
+def _suggest_prompt(minimal: Dict[str, Any], context: Optional[Dict[str, Any]], local: Dict[str, Any]) -> list:
+    # Only ask the LLM about compliance when the rule engine found something ambiguous
+    if local["uncertain"]:
+        return build_suggest_messages(
+            LLM_SUGGEST_COMPLIANCE_SYSTEM, minimal, context, {"compliance_hints": local["uncertain"]}
+        )
+    return build_suggest_messages(LLM_SUGGEST_SYSTEM, minimal, context)
+
+def _merge_compliance(local: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Rule engine result, plus the LLM's verdict only for ambiguous cases."""
+    issues = list(local["issues"])
+    status = local["status"]
+
+    if local["uncertain"]:
+        comp = data.get("_compliance") if isinstance(data.get("_compliance"), dict) else {}
+        for i in comp.get("issues") if isinstance(comp.get("issues"), list) else []:
+            i = str(i).strip()
+            if i and i not in issues:
+                issues.append(i)
+        if issues or comp.get("status") == "review":
+            status = "review"
+
+    return {"status": status, "issues": issues}
+
+def _finalize_suggestions(raw: str, minimal: Dict[str, Any], local: Dict[str, Any]) -> Dict[str, Any]:
+    data = _safe_json_load((raw or "").strip())
 
     suggestions = data.get("_ai_suggestions") if isinstance(data.get("_ai_suggestions"), list) else []
-    comp = data.get("_compliance") if isinstance(data.get("_compliance"), dict) else {}
-
-    issues = comp.get("issues") if isinstance(comp.get("issues"), list) else []
-    status = comp.get("status")
-
-    # Enforce consent rule deterministically (never miss)
-    if minimal["used_voice_note"] and not minimal["consent_required"]:
-        if "Consent not confirmed for voice note summarization" not in issues:
-            issues.append("Consent not confirmed for voice note summarization")
-        status = "review"
-
-    # Ensure status is valid
-    if status not in ["ok", "review"]:
-        status = "ok" if not issues else "review"
+    compliance = _merge_compliance(local, data)
 
     # Clean + unique suggestions
     uniq: List[str] = []
@@ -270,7 +669,152 @@ def tool_suggestions_and_compliance_llm(
                 final.append(s)
         uniq = final[:6]
 
-    return {"_ai_suggestions": uniq, "_compliance": {"status": status, "issues": issues}}
+    return {"_ai_suggestions": uniq, "_compliance": compliance}
+
+def _degraded_suggestions(minimal: Dict[str, Any], local: Dict[str, Any]) -> Dict[str, Any]:
+    # Out of latency budget: deterministic fallback suggestions + rule-engine compliance
+    combo = _finalize_suggestions("", minimal, local)
+    combo["degraded"] = True
+    return combo
+
+def tool_suggestions_and_compliance_llm(
+    draft: Dict[str, Any],
+    context: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    One fast LLM call for suggestions; compliance comes from the local rule engine
+    and is only delegated to the same call when a rule is uncertain.
+    Keep payload small for speed. If `deadline` passes, returns the fallback with "degraded": True.
+    """
+    minimal = _suggest_minimal(draft)
+    local = tool_compliance_rules(minimal)
+
+    try:
+        resp = invoke_llm("tools", _suggest_prompt(minimal, context, local), deadline=deadline)
+    except TimeoutError:
+        return _degraded_suggestions(minimal, local)
+    return _finalize_suggestions(resp.content, minimal, local)
+
+async def atool_suggestions_and_compliance_llm(
+    draft: Dict[str, Any],
+    context: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Async variant of tool_suggestions_and_compliance_llm (does not block the event loop).
+    """
+    minimal = _suggest_minimal(draft)
+    local = tool_compliance_rules(minimal)
+
+    try:
+        resp = await ainvoke_llm("tools", _suggest_prompt(minimal, context, local), deadline=deadline)
+    except TimeoutError:
+        return _degraded_suggestions(minimal, local)
+    return _finalize_suggestions(resp.content, minimal, local)
+
+
+# ============================================================
+# Incremental suggestions/compliance (skip the LLM when inputs did not change)
+# ============================================================
+
+# Fields that only affect compliance (the deterministic consent rule), not suggestions
+_CONSENT_ONLY_KEYS = ("used_voice_note", "consent_required")
+
+def _fingerprint(obj: Any) -> str:
+    payload = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def _suggest_fingerprints(minimal: Dict[str, Any], context: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    content = {k: v for k, v in minimal.items() if k not in _CONSENT_ONLY_KEYS}
+    return {
+        "minimal": _fingerprint({"draft": minimal, "context": context or {}}),
+        "content": _fingerprint({"draft": content, "context": context or {}}),
+    }
+
+def suggestion_fingerprints(draft: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """{"minimal", "content"} fingerprints of what the suggestions tool would see for this draft."""
+    return _suggest_fingerprints(_suggest_minimal(draft), context)
+
+def _llm_verdict(local: Dict[str, Any], compliance: Dict[str, Any]) -> Dict[str, Any]:
+    """What the LLM added on top of the rule engine (only asked about its uncertain hits)."""
+    issues = [i for i in compliance.get("issues") or [] if i not in local["issues"]]
+    review = bool(issues) or (compliance.get("status") == "review" and not local["issues"])
+    return {"uncertain": local["uncertain"], "status": "review" if review else "ok", "issues": issues}
+
+def _reuse_suggestions(
+    draft: Dict[str, Any],
+    minimal: Dict[str, Any],
+    fps: Dict[str, str],
+) -> Optional[Dict[str, Any]]:
+    """
+    Previous suggestions if nothing they depend on changed. Compliance is never taken
+    from the draft: the rules run again (rule file changes apply at once), and only the
+    LLM's verdict on the same uncertain hits is kept. `_suggest_fp` is server-only, so
+    the stored verdict is ours, not the client's.
+    """
+    prev_fp = draft.get("_suggest_fp")
+    suggestions = draft.get("_ai_suggestions")
+    if not isinstance(prev_fp, dict) or not isinstance(suggestions, list):
+        return None
+    # consent flags only matter to the rules, which run again below
+    if prev_fp.get("content") != fps["content"]:
+        return None
+
+    local = tool_compliance_rules(minimal)
+    verdict = prev_fp.get("verdict") if isinstance(prev_fp.get("verdict"), dict) else {}
+    if local["uncertain"] and verdict.get("uncertain") != local["uncertain"]:
+        return None  # hits the LLM has not ruled on
+
+    return {
+        "_ai_suggestions": suggestions,
+        "_compliance": _merge_compliance(local, {"_compliance": verdict}),
+        "_suggest_fp": {**fps, "verdict": verdict},
+    }
+
+def _remember_suggestions(combo: Dict[str, Any], minimal: Dict[str, Any], fps: Dict[str, str]) -> Dict[str, Any]:
+    # a degraded result is not cached, so the next turn retries the LLM
+    if combo.get("degraded"):
+        combo["_suggest_fp"] = None
+    else:
+        combo["_suggest_fp"] = {**fps, "verdict": _llm_verdict(tool_compliance_rules(minimal), combo["_compliance"])}
+    return combo
+
+@timed(TOOL_SECONDS, "suggestions_compliance")
+def tool_suggestions_and_compliance_cached(
+    draft: Dict[str, Any],
+    context: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Same result as tool_suggestions_and_compliance_llm, plus "_suggest_fp".
+    Reuses the draft's previous _ai_suggestions when their inputs are unchanged (see _reuse_suggestions).
+    """
+    minimal = _suggest_minimal(draft)
+    fps = _suggest_fingerprints(minimal, context)
+
+    reused = _reuse_suggestions(draft, minimal, fps)
+    if reused is not None:
+        return reused
+
+    combo = tool_suggestions_and_compliance_llm(draft, context=context, deadline=deadline)
+    return _remember_suggestions(combo, minimal, fps)
+
+@timed(TOOL_SECONDS, "suggestions_compliance")
+async def atool_suggestions_and_compliance_cached(
+    draft: Dict[str, Any],
+    context: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    minimal = _suggest_minimal(draft)
+    fps = _suggest_fingerprints(minimal, context)
+
+    reused = _reuse_suggestions(draft, minimal, fps)
+    if reused is not None:
+        return reused
+
+    combo = await atool_suggestions_and_compliance_llm(draft, context=context, deadline=deadline)
+    return _remember_suggestions(combo, minimal, fps)
 
 
 # ============================================================
@@ -280,5 +824,19 @@ def tool_suggestions_and_compliance_llm(
 def tool_followup_suggestions(draft: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> List[str]:
     return tool_suggestions_and_compliance_llm(draft, context=context)["_ai_suggestions"]
 
-def tool_compliance_check(draft: Dict[str, Any]) -> Dict[str, Any]:
-    return tool_suggestions_and_compliance_llm(draft, context=None)["_compliance"]
+# Given the same context, the follow-up and compliance tools send byte-identical prompts
+# (one combined call), so a client calling both at once gets one coalesced LLM request.
+def tool_compliance_check(draft: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    local = tool_compliance_rules(_suggest_minimal(draft))
+    if not local["uncertain"]:
+        return {"status": local["status"], "issues": local["issues"]}
+    return tool_suggestions_and_compliance_llm(draft, context=context)["_compliance"]
+
+async def atool_followup_suggestions(draft: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> List[str]:
+    return (await atool_suggestions_and_compliance_llm(draft, context=context))["_ai_suggestions"]
+
+async def atool_compliance_check(draft: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    local = tool_compliance_rules(_suggest_minimal(draft))
+    if not local["uncertain"]:
+        return {"status": local["status"], "issues": local["issues"]}
+    return (await atool_suggestions_and_compliance_llm(draft, context=context))["_compliance"]
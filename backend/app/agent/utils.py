@@ -1,36 +1,230 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import json, re
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from app.core.metrics import record_json_parse
 from app.db import models
+from app.db.models import normalize_hcp_name
+from app.services.hcp_index import hcp_index
 
-def merge_json_safely(raw: str) -> Dict[str, Any]:
+# ----------------------------
+# JSON objects out of LLM text
+# ----------------------------
+# Models wrap their JSON in fences or prose, emit two objects, leave trailing commas or
+# get cut off. The scanner walks the text once (it only stops at braces, brackets,
+# quotes, backslashes and commas), tracks string/escape state and brace depth, and
+# hands back each top-level {...} as soon as it closes. It can be fed a whole reply or
+# a token stream chunk by chunk.
+
+_STRUCTURAL = re.compile(r'[{}\[\]",\\]')
+
+
+class JSONObjectScanner:
+    def __init__(self) -> None:
+        self.text = ""
+        self.objects: List[Dict[str, Any]] = []
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._start = -1
+        self._comma = -1           # last comma at the current depth (trailing-comma repair)
+        self._drop: List[int] = []  # trailing commas to skip when the object is decoded
+
+    @property
+    def last(self) -> Optional[Dict[str, Any]]:
+        """Last complete object seen so far."""
+        return self.objects[-1] if self.objects else None
+
+    @property
+    def partial(self) -> str:
+        """The object that is still open ("" if none)."""
+        return self.text[self._start:] if self._depth else ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consumes more text; returns the objects completed by it."""
+        self.text += chunk
+        text, done = self.text, []
+        pos = self._pos
+        while True:
+            m = _STRUCTURAL.search(text, pos)
+            if m is None:
+                break
+            c, i = m.group(), m.start()
+            pos = i + 1
+            if self._in_string:
+                if c == "\\":
+                    if i + 1 >= len(text):
+                        pos = i  # escape split across chunks: look again next time
+                        break
+                    pos = i + 2
+                elif c == '"':
+                    self._in_string = False
+                continue
+            if c == "{":
+                if self._depth == 0:
+                    self._start, self._drop = i, []
+                self._depth += 1
+            elif not self._depth:
+                continue  # prose between objects
+            elif c == '"':
+                self._in_string = True
+            elif c == ",":
+                self._comma = i
+                continue
+            elif c in "}]":
+                if self._comma >= 0 and not text[self._comma + 1:i].strip():
+                    self._drop.append(self._comma)
+                if c == "}":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        obj = self._decode(self._start, i + 1)
+                        if obj is not None:
+                            self.objects.append(obj)
+                            done.append(obj)
+            self._comma = -1
+        self._pos = pos
+        return done
+
+    def _decode(self, start: int, end: int) -> Optional[Dict[str, Any]]:
+        raw = self.text[start:end]
+        if self._drop:
+            cut = [d - start for d in self._drop]
+            raw = "".join(raw[a + 1:b] for a, b in zip([-1, *cut], [*cut, len(raw)]))
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            return None
+        return obj if isinstance(obj, dict) else None
+
+
+def parse_json_object(raw: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Returns (object, outcome). outcome is "strict" (the whole text is one JSON object),
+    "recovered" (first complete object inside noise), "partial" (cut off: the top-level
+    fields that were complete) or "failed" ({}).
+
+    For a whole reply the first object wins: what models append after the answer is an
+    example or a note, not a correction. Stream consumers use JSONObjectScanner.last.
+    """
+    raw = (raw or "").strip()
     if not raw:
-        return {}
-    raw = raw.strip()
+        return {}, "failed"
+    if raw[0] == "{":
+        try:
+            data = json.loads(raw)
+            if isinstance(data, dict):
+                return data, "strict"
+        except ValueError:
+            pass
+
+    scanner = JSONObjectScanner()
+    scanner.feed(raw)
+    if scanner.objects:
+        return scanner.objects[0], "recovered"
+    data = parse_partial_json_fields(scanner.partial)
+    if data:
+        return data, "partial"
+    return {}, "failed"
 
-    # strip code fences
-    raw = re.sub(r"^```(json)?", "", raw, flags=re.IGNORECASE).strip()
-    raw = re.sub(r"```$", "", raw).strip()
 
-    # strict parse
-    try:
-        return json.loads(raw)
-    except Exception:
-        pass
+def parse_extraction(raw: str) -> Tuple[Dict[str, Any], str]:
+    """parse_json_object for extraction replies, counted under parser "extract"."""
+    data, outcome = parse_json_object(raw)
+    record_json_parse("extract", outcome)
+    return data, outcome
 
-    # extract first {...}
-    m = re.search(r"\{[\s\S]*\}", raw)
-    if not m:
+
+def merge_json_safely(raw: str) -> Dict[str, Any]:
+    return parse_extraction(raw)[0]
+
+_DECODER = json.JSONDecoder()
+
+def parse_partial_json_fields(raw: str) -> Dict[str, Any]:
+    """
+    Best-effort parse of a JSON object that is still being streamed.
+    Returns only the top-level key/value pairs that are already complete,
+    e.g. '{"hcp_name": "Dr. A", "summ' -> {"hcp_name": "Dr. A"}.
+    """
+    if not raw:
         return {}
-    try:
-        return json.loads(m.group(0))
-    except Exception:
+    start = raw.find("{")
+    if start < 0:
         return {}
 
+    out: Dict[str, Any] = {}
+    i, n = start + 1, len(raw)
+    while True:
+        while i < n and raw[i] in " \t\r\n,":
+            i += 1
+        if i >= n or raw[i] != '"':
+            return out
+        try:
+            key, i = _DECODER.raw_decode(raw, i)
+        except ValueError:
+            return out
+        while i < n and raw[i] in " \t\r\n":
+            i += 1
+        if i >= n or raw[i] != ":":
+            return out
+        i += 1
+        while i < n and raw[i] in " \t\r\n":
+            i += 1
+        try:
+            value, i = _DECODER.raw_decode(raw, i)
+        except ValueError:
+            return out
+        # a value is only complete once its delimiter arrived (numbers may still grow)
+        j = i
+        while j < n and raw[j] in " \t\r\n":
+            j += 1
+        if j >= n or raw[j] not in ",}":
+            return out
+        out[key] = value
+        i = j
+
 def resolve_hcp_by_name_or_id(db: Session, hcp_id: Optional[int], hcp_name: Optional[str]) -> Optional[models.HCP]:
     if hcp_id:
         return db.query(models.HCP).filter(models.HCP.id == int(hcp_id)).first()
     if hcp_name:
-        return db.query(models.HCP).filter(func.lower(models.HCP.name) == hcp_name.strip().lower()).first()
+        # normalized key via the in-process index ("Dr Asha" / "Dr. Asha Sharma" / typos)
+        return hcp_index.resolve(db, hcp_name)
     return None
+
+
+def ambiguous_hcp_error(db: Session, name: str, keys: List[str]) -> str:
+    names = db.scalars(
+        select(models.HCP.name).where(models.HCP.name_norm.in_(keys)).order_by(models.HCP.name_norm)
+    ).all()
+    return f"HCP name '{name}' matches several HCPs ({', '.join(dict.fromkeys(names))}). Please use the full name."
+
+
+def resolve_hcp_for_write(
+    db: Session, hcp_id: Optional[int], hcp_name: Optional[str]
+) -> Tuple[Optional[models.HCP], Optional[str]]:
+    """
+    HCP for a write (edit): a known id wins, else the name by exact key or unique
+    prefix only (no fuzzy matching). Returns (hcp, None), (None, error) when the name
+    is ambiguous, or (None, None) when nothing matches.
+    """
+    if str(hcp_id or "").strip().isdigit():
+        hcp = db.get(models.HCP, int(hcp_id))
+        if hcp is not None:
+            return hcp, None
+    if not hcp_name:
+        return None, None
+
+    hit, ambiguous = hcp_index.match_strict(db, hcp_name)
+    if ambiguous:
+        return None, ambiguous_hcp_error(db, hcp_name, ambiguous)
+    if hit is not None:
+        hcp = db.get(models.HCP, hit[0])
+        if hcp is not None and hcp.name_norm == hit[1]:
+            return hcp, None
+        hcp_index.discard(hit[1])  # rolled back / deleted behind our back
+
+    key = normalize_hcp_name(hcp_name)
+    hcp = (
+        db.query(models.HCP).filter(models.HCP.name_norm == key).order_by(models.HCP.id).first()
+        if key else None
+    )
+    return hcp, None
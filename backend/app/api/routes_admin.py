@@ -0,0 +1,44 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.security import require_admin
+from app.services.profiler import profiler_stats, sampler
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+# ----------------------------
+# Statistical sampler (all threads of this worker)
+# ----------------------------
+@router.post("/profile/sample")
+async def profile_sample(
+    seconds: float = Query(10.0, gt=0),
+    hz: float = Query(100.0, gt=0, le=1000),
+    include_idle: bool = False,
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+) -> Any:
+    """
+    Samples every thread's stack for `seconds` and returns samples grouped by graph
+    node / tool function and category. format=collapsed returns only the collapsed
+    stacks (text/plain), ready for flamegraph.pl or speedscope.
+    Only the worker that receives this request is sampled.
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {settings.PROFILE_MAX_SECONDS:g}")
+    try:
+        result = await run_in_threadpool(sampler.run, seconds, hz, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"])
+    return result
+
+
+@router.get("/profile/stats")
+def profile_stats() -> Dict[str, Any]:
+    return profiler_stats()
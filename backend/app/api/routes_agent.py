@@ -1,15 +1,40 @@
-from typing import Any, Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import contextlib
+import copy
+import json
+import time
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.db.session import get_db
-from app.agent.graph import agent_app
+from app.db.session import get_db, SessionLocal
+from app.db.writer import run_write, writer_stats
+from app.core.config import settings
+from app.core.metrics import AGENT_STEP_SECONDS, end_trace, json_parse_stats, start_trace, timed
+from app.core.security import admin_token_ok
+from app.services.groq_client import llm_call_stats, llm_cache_stats
+from app.services.sessions import sessions, client_draft, draft_patch
+from app.services.hcp_index import hcp_index_stats
+from app.services.hcp_context import hcp_context_stats
+from app.services.profiler import profile_call, profiler_stats
+from app.agent.graph import get_agent_app, speculation_stats
+from app.agent.utils import JSONObjectScanner, parse_partial_json_fields
+from app.agent.notes import group_notes, split_notes, hcp_key
+from app.agent.fastpath import fast_path_stats
+from app.agent.cascade import cascade_stats
+from app.agent.prompt_builder import EXTRACT_DRAFT_KEYS, drop_clipped_echoes, prompt_stats
 from app.agent.tools import (
-    tool_log_interaction,
-    tool_edit_latest_interaction,
+    write_log_interaction,
+    write_log_interactions_batch,
+    write_edit_latest_interaction,
+    INTERACTION_FIELDS,
     tool_retrieve_hcp_context,
-    tool_followup_suggestions,
-    tool_compliance_check,
+    atool_followup_suggestions,
+    ahcp_context_for_draft,
+    atool_compliance_check,
 )
 
 router = APIRouter(prefix="/agent", tags=["agent"])
@@ -18,78 +43,396 @@ router = APIRouter(prefix="/agent", tags=["agent"])
 # ----------------------------
 # Chat (LangGraph orchestrator)
 # ----------------------------
-@router.post("/chat")
-def agent_chat(payload: Dict[str, Any], db: Session = Depends(get_db)) -> Dict[str, Any]:
+def _chat_state_in(payload: Dict[str, Any], draft: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """`draft` is a server-held draft (sessions); a client-sent one loses its server-only keys."""
     message = (payload.get("message") or "").strip()
     if not message:
         raise HTTPException(status_code=400, detail="message is required")
 
-    draft = payload.get("draft") or {}
-
-    state_in = {
+    return {
         "message": message,
         "mode": payload.get("mode") or "draft",
-        "draft": draft,
+        "draft": draft if draft is not None else client_draft(payload.get("draft") or {}),
         "extracted": {},
         "tool_used": "",
         "assistant_message": "",
+        "deadline": time.monotonic() + settings.CHAT_LATENCY_BUDGET_MS / 1000.0,
+        "degraded": [],
+        "speculative": None,
     }
 
-    state_out = agent_app.invoke(state_in)
 
+@timed(AGENT_STEP_SECONDS, "edit_db")
+def _execute_edit(db: Session, updated_draft: Dict[str, Any]) -> str:
+    """
+    Runs the DB side of an edit turn (edit latest + refresh draft from the edited row).
+    Returns the assistant message. Sync on purpose: called via run_in_threadpool.
+    """
+    ep = updated_draft["_edit_payload"] or {}
+
+    # ✅ fallback: if user didn't repeat the HCP name in edit message, use current draft hcp_name
+    hcp_name_for_edit = ep.get("hcp_name") or updated_draft.get("hcp_name")
+    hcp_id_for_edit = ep.get("hcp_id") or updated_draft.get("hcp_id")
+
+    result = run_write(
+        db,
+        write_edit_latest_interaction,
+        hcp_id_for_edit,
+        hcp_name_for_edit,
+        ep.get("fields_to_update") or {},
+    )
+
+    if "error" in result:
+        return result["error"]
+
+    assistant_message = result.get("message", "Updated latest interaction.")
+    updated_draft["_last_edited_interaction_id"] = result.get("interaction_id")
+
+    # ✅ Refresh UI draft from the edited DB record (returned by the edit itself)
+    latest = result.get("interaction") or {}
+    for k in INTERACTION_FIELDS:
+        if k in latest:
+            updated_draft[k] = latest[k]
+
+    return assistant_message
+
+
+async def _chat_response(state_out: Dict[str, Any], db: Session, server_draft: bool = False) -> Dict[str, Any]:
+    """`server_draft` keeps server-only keys in updated_draft (the caller stores it, e.g. sessions)."""
     updated_draft = state_out.get("draft", {}) or {}
     tool_used = state_out.get("tool_used", "DraftUpdate")
     assistant_message = state_out.get("assistant_message", "")
+    degraded = state_out.get("degraded") or []
+
+    if "extract" in degraded:
+        assistant_message = "The assistant is slow right now and could not read that message. Your draft is unchanged; please try again."
 
     # ---- Edit intent: execute edit immediately (no interaction_id in UI) ----
     if tool_used == "EditInteraction" and updated_draft.get("_edit_payload"):
-        ep = updated_draft["_edit_payload"] or {}
-
-        # ✅ fallback: if user didn't repeat the HCP name in edit message, use current draft hcp_name
-        hcp_name_for_edit = ep.get("hcp_name") or updated_draft.get("hcp_name")
-        hcp_id_for_edit = ep.get("hcp_id") or updated_draft.get("hcp_id")
-
-        result = tool_edit_latest_interaction(
-            db=db,
-            hcp_id=hcp_id_for_edit,
-            hcp_name=hcp_name_for_edit,
-            fields_to_update=ep.get("fields_to_update") or {},
-        )
-
-        if "error" in result:
-            assistant_message = result["error"]
-        else:
-            assistant_message = result.get("message", "Updated latest interaction.")
-            updated_draft["_last_edited_interaction_id"] = result.get("interaction_id")
-
-            # ✅ Refresh UI draft from latest DB record
-            # Prefer hcp_id if available; else use hcp_name
-            ctx = None
-            hcp_id_for_ctx = result.get("hcp_id") or hcp_id_for_edit or updated_draft.get("hcp_id")
-
-            if hcp_id_for_ctx:
-                ctx = tool_retrieve_hcp_context(db, hcp_id=hcp_id_for_ctx, hcp_name=None)
-            elif hcp_name_for_edit:
-                ctx = tool_retrieve_hcp_context(db, hcp_id=None, hcp_name=hcp_name_for_edit)
-
-            if ctx and "latest_interactions" in ctx and ctx["latest_interactions"]:
-                latest = ctx["latest_interactions"][0]
-
-                for k in [
-                    "interaction_type", "date", "time", "attendees", "topics_discussed",
-                    "materials_shared", "samples_distributed", "consent_required",
-                    "occurred_at", "sentiment", "products_discussed", "summary", "outcomes", "follow_ups"
-                ]:
-                    if k in latest:
-                        updated_draft[k] = latest[k]
+        # DB work is short; keep it off the event loop so LLM-bound chats keep flowing
+        assistant_message = await run_in_threadpool(_execute_edit, db, updated_draft)
 
         # cleanup so UI never shows internal payload
         updated_draft.pop("_edit_payload", None)
 
     return {
         "assistant_message": assistant_message,
-        "updated_draft": updated_draft,
+        "updated_draft": updated_draft if server_draft else client_draft(updated_draft),
         "tool_used": tool_used,
+        "degraded": degraded,
+    }
+
+
+def _flag(value: Optional[str]) -> bool:
+    return (value or "").lower() in ("1", "true", "yes")
+
+
+async def _run_chat(
+    state_in: Dict[str, Any],
+    db: Session,
+    debug_timing: Optional[str],
+    profile: bool = False,
+    server_draft: bool = False,
+) -> Dict[str, Any]:
+    """
+    One chat turn. With an `X-Debug-Timing: 1` request header the response also carries
+    "timing": per-node / per-step / per-tool ms, each LLM request and JSON parse failures.
+    With `profile` it also carries "profile": a cProfile of the graph run, grouped by
+    node, tool and category (see services.profiler).
+    """
+    if not profile and not (settings.CHAT_DEBUG_TIMING and _flag(debug_timing)):
+        return await _chat_response(await get_agent_app().ainvoke(state_in), db, server_draft)
+
+    report = None
+    trace, token = start_trace()
+    try:
+        if profile:
+            # The sync graph in one worker thread: cProfile sees only this turn, not
+            # whatever else the event loop is running; LLM waits show up as wait_io.
+            state_out, report = await run_in_threadpool(profile_call, get_agent_app().invoke, state_in)
+        else:
+            state_out = await get_agent_app().ainvoke(state_in)
+        out = await _chat_response(state_out, db, server_draft)
+    finally:
+        timing = end_trace(trace, token)
+    out = {**out, "timing": timing}
+    if report is not None:
+        out["profile"] = report
+    return out
+
+
+@router.post("/chat")
+async def agent_chat(
+    payload: Dict[str, Any],
+    db: Session = Depends(get_db),
+    x_debug_timing: Optional[str] = Header(default=None),
+    x_profile: Optional[str] = Header(default=None),
+    x_admin_token: Optional[str] = Header(default=None),
+) -> Dict[str, Any]:
+    profile = _flag(x_profile)
+    if profile and not admin_token_ok(x_admin_token):
+        raise HTTPException(status_code=403, detail="X-Profile requires a valid X-Admin-Token")
+    return await _run_chat(_chat_state_in(payload), db, x_debug_timing, profile)
+
+
+# ----------------------------
+# Batch chat: a day of notes -> one draft per HCP
+# ----------------------------
+@router.post("/chat/batch")
+async def agent_chat_batch(payload: Dict[str, Any], db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """
+    payload: {"message": "<pasted notes>"} or {"notes": ["...", "..."]}, optional "concurrency"
+    Either way notes naming the same doctor are joined first (one draft per HCP).
+    Notes run through the graph concurrently (LLM rate limits are shared process-wide);
+    results come back in note order.
+    """
+    notes = payload.get("notes")
+    if notes is not None and not isinstance(notes, list):
+        raise HTTPException(status_code=400, detail="notes must be a list of strings")
+    if notes:
+        # one draft per HCP, same as for a pasted message
+        notes = group_notes([n.strip() for n in notes if isinstance(n, str) and n.strip()])
+    else:
+        notes = split_notes(payload.get("message") or "")
+    if not notes:
+        raise HTTPException(status_code=400, detail="message or notes is required")
+    if len(notes) > settings.CHAT_BATCH_MAX_NOTES:
+        raise HTTPException(status_code=400, detail=f"at most {settings.CHAT_BATCH_MAX_NOTES} notes per batch")
+
+    concurrency = payload.get("concurrency")
+    if concurrency is None:
+        concurrency = settings.CHAT_BATCH_CONCURRENCY
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int):
+        raise HTTPException(status_code=400, detail="concurrency must be an integer")
+    concurrency = max(1, min(concurrency, settings.CHAT_BATCH_CONCURRENCY))
+    gate = asyncio.Semaphore(concurrency)
+
+    async def run(note: str) -> Dict[str, Any]:
+        async with gate:
+            # budget starts when the note gets a slot, not when the batch was received
+            return await get_agent_app().ainvoke(_chat_state_in({"message": note, "mode": payload.get("mode")}))
+
+    started = time.perf_counter()
+    outs = await asyncio.gather(*(run(n) for n in notes), return_exceptions=True)
+
+    # DB side (edits) one note at a time: the request session is not shared across threads
+    results: List[Dict[str, Any]] = []
+    for note, out in zip(notes, outs):
+        if isinstance(out, Exception):
+            results.append({"note": note, "hcp_key": hcp_key(note), "error": str(out) or out.__class__.__name__})
+            continue
+        results.append({"note": note, "hcp_key": hcp_key(note), **(await _chat_response(out, db))})
+
+    return {
+        "results": results,
+        "count": len(results),
+        "failed": sum(1 for r in results if "error" in r),
+        "concurrency": concurrency,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1),
+    }
+
+
+# ----------------------------
+# Chat with server-side draft sessions (delta payloads)
+# ----------------------------
+@router.post("/sessions")
+def create_session(payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    draft = client_draft((payload or {}).get("draft") or {})
+    return {"session_id": sessions.create(draft), "draft": draft}
+
+
+@router.get("/sessions/{session_id}")
+def get_session(session_id: str) -> Dict[str, Any]:
+    draft = sessions.get(session_id)
+    if draft is None:
+        raise HTTPException(status_code=404, detail="session not found")
+    return {"session_id": session_id, "draft": client_draft(draft)}
+
+
+@router.delete("/sessions/{session_id}")
+def delete_session(session_id: str) -> Dict[str, Any]:
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="session not found")
+    return {"session_id": session_id, "deleted": True}
+
+
+# One turn at a time per session: a second message waits for the first and builds on the
+# draft it saved instead of both starting from the same draft and the later put winning.
+# Sessions live in this process' store, so a per-process lock covers them.
+_session_locks: Dict[str, List[Any]] = {}  # session_id -> [asyncio.Lock, waiting + running turns]
+
+
+@contextlib.asynccontextmanager
+async def _session_turn(session_id: str) -> AsyncIterator[None]:
+    entry = _session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            _session_locks.pop(session_id, None)
+
+
+@router.post("/sessions/{session_id}/chat")
+async def session_chat(
+    session_id: str,
+    payload: Dict[str, Any],
+    db: Session = Depends(get_db),
+    x_debug_timing: Optional[str] = Header(default=None),
+) -> Dict[str, Any]:
+    """
+    payload: {"message": "..."}
+    Returns "patch" (JSON-patch ops on the top-level draft keys) instead of the full draft.
+    """
+    async with _session_turn(session_id):
+        # the store may read/write its SQLite spill file: keep that off the event loop
+        before = await run_in_threadpool(sessions.get, session_id)
+        if before is None:
+            raise HTTPException(status_code=404, detail="session not found")
+
+        state_in = _chat_state_in(payload, draft=copy.deepcopy(before))
+        out = await _run_chat(state_in, db, x_debug_timing, server_draft=True)
+
+        after = out.pop("updated_draft")
+        await run_in_threadpool(sessions.put, session_id, after)
+    return {"session_id": session_id, **out, "patch": draft_patch(before, after)}
+
+
+# ----------------------------
+# Chat streaming (Server-Sent Events)
+# ----------------------------
+# Events, in order:
+#   draft_patch  - draft fields as soon as they are complete in the streamed extraction tokens
+#   draft_reset  - {"fields": [...]} previously patched fields to drop: the cascade escalated
+#                  past the fast model, or the final extraction disagrees with a patch
+#   extracted    - full parsed extraction once extract_node (or the fast-path router) finishes
+#   suggestions  - _ai_suggestions/_compliance once the intent node finishes
+#   done         - same payload as POST /agent/chat
+#   error        - {"detail": "..."} if the turn failed
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+_TERMINAL_NODES = {"draft_update", "edit_intent", "log_intent"}
+_EXTRACT_PURPOSES = ("extract", "extract_fast")
+
+
+def _stream_purpose(ev: Dict[str, Any]) -> Optional[str]:
+    for tag in ev.get("tags") or ():
+        if tag.startswith("llm:") and tag[4:] in _EXTRACT_PURPOSES:
+            return tag[4:]
+    return None
+
+
+async def _chat_events(state_in: Dict[str, Any]) -> AsyncIterator[str]:
+    streamed: Dict[str, JSONObjectScanner] = {}  # per model run (cascade escalation, hedged duplicate)
+    sent: Dict[str, Any] = {}
+    sent_purpose: Optional[str] = None
+    state_out: Optional[Dict[str, Any]] = None
+    draft_in = copy.deepcopy(state_in.get("draft") or {})  # nodes merge into the draft in place
+
+    def reset(fields: List[str]) -> str:
+        for k in fields:
+            sent.pop(k, None)
+        return _sse("draft_reset", {"fields": fields})
+
+    try:
+        async for ev in get_agent_app().astream_events(state_in, version="v2"):
+            kind = ev["event"]
+            node = (ev.get("metadata") or {}).get("langgraph_node")
+
+            if kind == "on_chat_model_stream" and node == "extract":
+                purpose = _stream_purpose(ev)
+                if purpose is None:
+                    continue  # not an extraction call (e.g. speculative suggestions)
+                if purpose != sent_purpose:
+                    # the cascade escalated: what the fast model said no longer counts
+                    if sent:
+                        yield reset(sorted(sent))
+                    sent_purpose = purpose
+                scanner = streamed.setdefault(ev["run_id"], JSONObjectScanner())
+                scanner.feed(ev["data"]["chunk"].content or "")
+                # fields of the first object, whether it has closed yet or not
+                fields = scanner.objects[0] if scanner.objects else parse_partial_json_fields(scanner.partial)
+                patch = {
+                    k: v
+                    for k, v in fields.items()
+                    if k in EXTRACT_DRAFT_KEYS
+                    and v not in (None, "")
+                    and sent.get(k) != v
+                }
+                if patch:
+                    # a shortened draft field repeated back is not a new value
+                    patch = drop_clipped_echoes(patch, draft_in)
+                if patch:
+                    sent.update(patch)
+                    yield _sse("draft_patch", patch)
+
+            elif kind == "on_chain_end" and ev["name"] == node == "extract":
+                out = ev["data"].get("output") or {}
+                parsed = (out.get("extracted") or {}).get("parsed") or {}
+                stale = sorted(k for k, v in sent.items() if parsed.get(k) != v)
+                if stale:
+                    yield reset(stale)
+                yield _sse("extracted", parsed)
+
+            elif kind == "on_chain_end" and ev["name"] == node == "route":
+                extracted = (ev["data"].get("output") or {}).get("extracted") or {}
+                if extracted.get("fast_path"):
+                    yield _sse("extracted", extracted.get("parsed") or {})
+
+            elif kind == "on_chain_end" and ev["name"] == node and node in _TERMINAL_NODES:
+                draft = (ev["data"].get("output") or {}).get("draft") or {}
+                yield _sse("suggestions", {
+                    "_ai_suggestions": draft.get("_ai_suggestions", []),
+                    "_compliance": draft.get("_compliance"),
+                })
+
+            elif kind == "on_chain_end" and not ev.get("parent_ids"):
+                state_out = ev["data"].get("output")
+
+        if state_out is None:
+            raise RuntimeError("agent graph finished without output")
+
+        # Own session: yield-dependencies are already closed while the body streams
+        db = SessionLocal()
+        try:
+            yield _sse("done", await _chat_response(state_out, db))
+        finally:
+            db.close()
+    except Exception as e:
+        yield _sse("error", {"detail": str(e) or e.__class__.__name__})
+
+
+@router.post("/chat/stream")
+async def agent_chat_stream(payload: Dict[str, Any]) -> StreamingResponse:
+    state_in = _chat_state_in(payload)
+    return StreamingResponse(
+        _chat_events(state_in),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ----------------------------
+# Agent stats
+# ----------------------------
+@router.get("/stats")
+def agent_stats() -> Dict[str, Any]:
+    return {
+        "fast_path": fast_path_stats(),
+        "extract_cascade": cascade_stats(),
+        "llm": llm_call_stats(),
+        "llm_cache": llm_cache_stats(),
+        "prompts": prompt_stats(),
+        "db_writer": writer_stats(),
+        "hcp_index": hcp_index_stats(),
+        "hcp_context": hcp_context_stats(),
+        "profiler": profiler_stats(),
+        "json_parse": json_parse_stats(),
+        "speculative_suggestions": speculation_stats(),
     }
 
 
@@ -98,12 +441,29 @@ def agent_chat(payload: Dict[str, Any], db: Session = Depends(get_db)) -> Dict[s
 # ----------------------------
 @router.post("/tools/log")
 def tools_log(draft: Dict[str, Any], db: Session = Depends(get_db)) -> Dict[str, Any]:
-    result = tool_log_interaction(db, draft)
+    result = run_write(db, write_log_interaction, draft)
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
 
 
+# ----------------------------
+# Tool 1b: Log many interactions (offline sync, one transaction)
+# ----------------------------
+@router.post("/tools/log-batch")
+def tools_log_batch(payload: Dict[str, Any], db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """
+    payload: {"drafts": [{...draft...}, ...]}
+    Returns per-item results in input order (interaction_id or error).
+    """
+    drafts = payload.get("drafts")
+    if not isinstance(drafts, list) or not drafts:
+        raise HTTPException(status_code=400, detail="drafts must be a non-empty list")
+    if not all(isinstance(d, dict) for d in drafts):
+        raise HTTPException(status_code=400, detail="each draft must be an object")
+    return run_write(db, write_log_interactions_batch, drafts)
+
+
 # ----------------------------
 # Tool 2: Edit Latest Interaction (no interaction_id)
 # ----------------------------
@@ -121,11 +481,12 @@ def tools_edit_latest(payload: Dict[str, Any], db: Session = Depends(get_db)) ->
     if not fields:
         raise HTTPException(status_code=400, detail="fields_to_update is required")
 
-    result = tool_edit_latest_interaction(
-        db=db,
-        hcp_id=payload.get("hcp_id"),
-        hcp_name=payload.get("hcp_name"),
-        fields_to_update=fields,
+    result = run_write(
+        db,
+        write_edit_latest_interaction,
+        payload.get("hcp_id"),
+        payload.get("hcp_name"),
+        fields,
     )
     
     if "error" in result:
@@ -147,11 +508,15 @@ def tools_hcp_context(hcp_id: Optional[int] = None, hcp_name: Optional[str] = No
 # ----------------------------
 # Tool 4: Follow-up Suggestions
 # ----------------------------
+async def _tool_context(payload: Dict[str, Any], draft: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # same context for both LLM tools, so a paired followup + compliance call is one request
+    return payload.get("context") or await ahcp_context_for_draft(draft)
+
+
 @router.post("/tools/followup-suggest")
-def tools_followup_suggest(payload: Dict[str, Any]) -> Dict[str, Any]:
+async def tools_followup_suggest(payload: Dict[str, Any]) -> Dict[str, Any]:
     draft = payload.get("draft") or {}
-    context = payload.get("context") or None
-    suggestions = tool_followup_suggestions(draft, context=context)
+    suggestions = await atool_followup_suggestions(draft, context=await _tool_context(payload, draft))
     return {"_ai_suggestions": suggestions}
 
 
@@ -159,6 +524,6 @@ def tools_followup_suggest(payload: Dict[str, Any]) -> Dict[str, Any]:
 # Tool 5: Compliance Check
 # ----------------------------
 @router.post("/tools/compliance-check")
-def tools_compliance_check(payload: Dict[str, Any]) -> Dict[str, Any]:
+async def tools_compliance_check(payload: Dict[str, Any]) -> Dict[str, Any]:
     draft = payload.get("draft") or {}
-    return {"_compliance": tool_compliance_check(draft)}
+    return {"_compliance": await atool_compliance_check(draft, context=await _tool_context(payload, draft))}
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Depends
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db.session import get_db
+from app.db import models
 from app import crud
-from app.schemas import HCPOut
+from app.schemas import HCPOut, InteractionPage
+from app.services.hcp_index import hcp_index
 
 router = APIRouter(prefix="/hcps", tags=["hcps"])
 
@@ -10,3 +17,46 @@ router = APIRouter(prefix="/hcps", tags=["hcps"])
 def get_hcps(db: Session = Depends(get_db)):
     crud.seed_hcps(db)
     return crud.list_hcps(db)
+
+@router.get("/search", response_model=list[HCPOut])
+def search_hcps(q: str, limit: int = 10, db: Session = Depends(get_db)):
+    # prefix match on the normalized name ("dr. ash" -> Dr. Asha Sharma)
+    ids = hcp_index.search(db, q, limit=min(max(limit, 1), 50))
+    if not ids:
+        return []
+    rows = {h.id: h for h in db.query(models.HCP).filter(models.HCP.id.in_(ids))}
+    return [rows[i] for i in ids if i in rows]
+
+
+def _encode_cursor(created_at: datetime, interaction_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), interaction_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, interaction_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(interaction_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+@router.get("/{hcp_id}/interactions", response_model=InteractionPage)
+def get_hcp_interactions(
+    hcp_id: int,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Newest first. Pass next_cursor back as `cursor` for the next page."""
+    if db.get(models.HCP, hcp_id) is None:
+        raise HTTPException(status_code=404, detail="HCP not found")
+
+    limit = min(max(limit, 1), 100)
+    before = _decode_cursor(cursor) if cursor else None
+    rows = crud.list_interactions_for_hcp(db, hcp_id, limit=limit + 1, before=before)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    return {"items": rows, "next_cursor": next_cursor}
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -9,6 +11,86 @@ class Settings(BaseSettings):
     EXTRACT_MODEL: str = "llama-3.3-70b-versatile"
     TOOL_MODEL: str = "llama-3.1-8b-instant"
 
+    # Extraction cascade: try TOOL_MODEL first, escalate to EXTRACT_MODEL when needed
+    EXTRACT_CASCADE: bool = False
+    EXTRACT_CASCADE_MIN_CONFIDENCE: float = 0.7
+
+    # Pooled HTTP transport for Groq (shared per model/purpose within a worker)
+    LLM_POOL_MAX_CONNECTIONS: int = 100
+    LLM_POOL_MAX_KEEPALIVE: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_READ_TIMEOUT: float = 60.0
+    LLM_HTTP2: bool = False
+    # On startup, build the LLM clients and open their connections before serving traffic
+    LLM_WARMUP: bool = True
+
+    # Structured output for the extraction and suggestion calls: "" (prompt only),
+    # "json" (Groq JSON mode) or "tool" (forced tool call with the schemas in agent/prompts.py).
+    # Either mode turns off token streaming for those calls.
+    LLM_STRUCTURED_OUTPUT: str = ""
+
+    # Start suggestions/compliance on the incoming draft alongside extraction; kept when
+    # extraction leaves its inputs unchanged (a wrong guess costs one extra tools call)
+    SPECULATIVE_SUGGESTIONS: bool = False
+
+    # Latency budget per chat turn + hedged LLM requests
+    CHAT_LATENCY_BUDGET_MS: float = 25000.0
+    LLM_HEDGE: bool = True
+    LLM_HEDGE_AFTER_MS: float = 4000.0   # used until enough samples for a p95
+    LLM_HEDGE_MIN_MS: float = 500.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+
+    # Rate limits per model, e.g. LLM_RATE_LIMITS='{"llama-3.3-70b-versatile": {"rpm": 30, "tpm": 6000}}'
+    LLM_RATE_LIMITS: Dict[str, Dict[str, float]] = {}
+    LLM_DEFAULT_RPM: float = 1000.0
+    LLM_DEFAULT_TPM: float = 250000.0
+    LLM_COMPLETION_TOKENS_ESTIMATE: int = 300
+    LLM_MAX_RETRIES: int = 4
+    LLM_BACKOFF_BASE_MS: float = 500.0
+    LLM_BACKOFF_MAX_MS: float = 8000.0
+
+    # Persistent LLM response cache (SQLite file shared by all workers); opt-in per purpose
+    LLM_CACHE_PURPOSES: List[str] = ["tools"]
+    LLM_CACHE_PATH: str = "./llm_cache.db"
+    LLM_CACHE_TTL_S: float = 86400.0
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Prompt budgets (approximate tokens) for the variable part of each prompt
+    PROMPT_FIELD_MAX_TOKENS: int = 160
+    PROMPT_DRAFT_MAX_TOKENS: int = 800
+    PROMPT_CONTEXT_MAX_TOKENS: int = 400
+    PROMPT_MESSAGE_MAX_TOKENS: int = 2000
+
+    # Per-HCP context cache (HCP + latest interactions + rollups) fed to suggestions
+    HCP_CONTEXT_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    HCP_CONTEXT_LATEST_N: int = 5
+    # Entries are reloaded after this long: writes in other workers don't reach this cache
+    HCP_CONTEXT_TTL_S: float = 30.0
+
+    # Chat responses include a timing breakdown when the request sends X-Debug-Timing: 1
+    CHAT_DEBUG_TIMING: bool = True
+
+    # Admin endpoints (/admin/*, X-Profile on chat) need X-Admin-Token; disabled while empty
+    ADMIN_TOKEN: str = ""
+    PROFILE_MAX_SECONDS: float = 60.0
+
+    # Multi-note batch chat (/agent/chat/batch)
+    CHAT_BATCH_CONCURRENCY: int = 4
+    CHAT_BATCH_MAX_NOTES: int = 50
+
+    # Server-side draft sessions (in-memory LRU, optional SQLite spill for evicted entries)
+    SESSION_MAX_ENTRIES: int = 10000
+    SESSION_SPILL_PATH: str = ""
+
+    # Group-commit writer: concurrent log/edit writes share one transaction per window
+    DB_GROUP_COMMIT: bool = True
+    DB_GROUP_COMMIT_WINDOW_MS: float = 3.0
+    DB_GROUP_COMMIT_MAX_BATCH: int = 256
+
+    # Local compliance rules (empty -> bundled app/agent/compliance_rules.json)
+    COMPLIANCE_RULES_PATH: str = ""
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,207 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# ----------------------------
+# In-process metrics (Prometheus text format) + per-request timing traces
+# ----------------------------
+# Histograms and counters are plain dicts behind one lock per metric; an observation is
+# a bisect and two adds. Values are per worker process (scrape each worker, or sum).
+#
+# A trace is a dict bound to the current request through a ContextVar. Observations made
+# while one is active (including in tasks/threads that inherited the context) are also
+# added to it, so a chat response can carry its own breakdown (X-Debug-Timing header).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+_trace: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], buckets=LATENCY_BUCKETS,
+                 trace_key: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.trace_key = trace_key
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # counts per bucket (+Inf last), sum, count
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0.0] * (len(self.buckets) + 3)
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+        if self.trace_key:
+            trace = _trace.get()
+            if trace is not None:
+                section = trace.setdefault(self.trace_key, {})
+                key = labels[0] if len(labels) == 1 else "/".join(labels)
+                section[key] = round(section.get(key, 0.0) + value * 1000.0, 2)
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, s in sorted(series.items()):
+            cumulative = 0.0
+            for bound, n in zip((*self.buckets, float("inf")), s):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                extra = f'le="{le}"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, extra)} {_num(cumulative)}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {_num(s[-1])}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], trace_key: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.trace_key = trace_key
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+        if self.trace_key:
+            trace = _trace.get()
+            if trace is not None:
+                section = trace.setdefault(self.trace_key, {})
+                key = "/".join(labels)
+                section[key] = section.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, v in sorted(values.items()):
+            out.append(f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}")
+        return out
+
+
+# ---- the metrics ----
+GRAPH_NODE_SECONDS = Histogram(
+    "crm_graph_node_seconds", "LangGraph node wall time.", ("node",), trace_key="nodes"
+)
+AGENT_STEP_SECONDS = Histogram(
+    "crm_agent_step_seconds", "Chat steps outside the LLM (merge/normalize, edit DB path).", ("step",),
+    trace_key="steps",
+)
+TOOL_SECONDS = Histogram(
+    "crm_tool_seconds", "Agent tool wall time (DB tools, HCP context, suggestions).", ("tool",), trace_key="tools"
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "crm_llm_request_seconds", "One Groq request (each retry/hedge counts).", ("purpose", "model", "outcome")
+)
+LLM_TOKENS = Histogram(
+    "crm_llm_tokens", "Tokens per Groq request as reported by the API.", ("purpose", "model", "kind"), TOKEN_BUCKETS
+)
+JSON_PARSE_TOTAL = Counter(
+    "crm_llm_json_parse_total", "LLM JSON replies by parser and outcome (strict, recovered, partial, failed).",
+    ("parser", "outcome"),
+)
+JSON_PARSE_FAILURES = Counter(
+    "crm_llm_json_parse_failures_total", "LLM replies no JSON object could be read from.", ("parser",),
+    trace_key="json_parse_failures",
+)
+
+REGISTRY = [
+    GRAPH_NODE_SECONDS, AGENT_STEP_SECONDS, TOOL_SECONDS,
+    LLM_REQUEST_SECONDS, LLM_TOKENS, JSON_PARSE_TOTAL, JSON_PARSE_FAILURES,
+]
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def record_json_parse(parser: str, outcome: str) -> None:
+    JSON_PARSE_TOTAL.inc(parser, outcome)
+    if outcome == "failed":
+        JSON_PARSE_FAILURES.inc(parser)
+
+
+def json_parse_stats() -> Dict[str, Dict[str, int]]:
+    """{parser: {outcome: count}} for /agent/stats."""
+    out: Dict[str, Dict[str, int]] = {}
+    for (parser, outcome), n in sorted(JSON_PARSE_TOTAL.values().items()):
+        out.setdefault(parser, {})[outcome] = int(n)
+    return out
+
+
+def timed(hist: Histogram, label: str) -> Callable:
+    """Decorator: observe the wall time of each call (sync or async) under `label`."""
+
+    def wrap(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args: Any, **kwargs: Any) -> Any:
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    hist.observe(time.perf_counter() - started, label)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - started, label)
+        return wrapper
+
+    return wrap
+
+
+# ---- per-request traces ----
+def start_trace() -> Tuple[Dict[str, Any], contextvars.Token]:
+    trace: Dict[str, Any] = {"_started": time.perf_counter()}
+    return trace, _trace.set(trace)
+
+
+def end_trace(trace: Dict[str, Any], token: contextvars.Token) -> Dict[str, Any]:
+    _trace.reset(token)
+    out = {k: v for k, v in trace.items() if not k.startswith("_")}
+    out["total_ms"] = round((time.perf_counter() - trace["_started"]) * 1000.0, 2)
+    return out
+
+
+def trace_event(key: str, event: Dict[str, Any]) -> None:
+    trace = _trace.get()
+    if trace is not None:
+        trace.setdefault(key, []).append(event)
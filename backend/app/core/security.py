@@ -0,0 +1,20 @@
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from app.core.config import settings
+
+
+def admin_token_ok(token: Optional[str]) -> bool:
+    """Admin features are off entirely while ADMIN_TOKEN is unset."""
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8"))
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not admin_token_ok(x_admin_token):
+        raise HTTPException(status_code=403, detail="admin token required")
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import Integer, tuple_
 from sqlalchemy.orm import Session
 from app.db import models
 
@@ -32,10 +35,24 @@ def update_interaction_fields(db: Session, interaction: models.Interaction, upda
     db.refresh(interaction)
     return interaction
 
-def list_interactions_for_hcp(db: Session, hcp_id: int):
+def list_interactions_for_hcp(
+    db: Session,
+    hcp_id: int,
+    limit: int = 50,
+    before: Optional[Tuple[datetime, int]] = None,
+):
+    """
+    Newest first, keyset-paginated on (created_at, id): pass the last row's
+    (created_at, id) as `before` to get the next page. Served by ix_interactions_hcp_id_created_at.
+    """
+    q = db.query(models.Interaction).filter(models.Interaction.hcp_id == hcp_id)
+    if before is not None:
+        created_at, interaction_id = before
+        # row-value comparison: SQLite/Postgres seek straight to the cursor in the index
+        key = tuple_(models.Interaction.created_at, models.Interaction.id)
+        q = q.filter(key < tuple_(created_at, interaction_id, types=[models.Interaction.created_at.type, Integer()]))
     return (
-        db.query(models.Interaction)
-        .filter(models.Interaction.hcp_id == hcp_id)
-        .order_by(models.Interaction.id.desc())
+        q.order_by(models.Interaction.created_at.desc(), models.Interaction.id.desc())
+        .limit(limit)
         .all()
     )
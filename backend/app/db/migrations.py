@@ -0,0 +1,44 @@
+from typing import Callable, List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.models import normalize_hcp_name
+
+# ----------------------------
+# In-place schema upgrades for existing databases
+# ----------------------------
+# create_all() only creates missing tables; columns/indexes added to existing tables
+# are applied here. Every step is idempotent and runs at startup after create_all().
+
+
+def _add_hcp_name_norm(conn: Connection) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns("hcps")}
+    if "name_norm" not in columns:
+        conn.execute(text("ALTER TABLE hcps ADD COLUMN name_norm VARCHAR(120) NOT NULL DEFAULT ''"))
+
+    rows = conn.execute(text("SELECT id, name FROM hcps WHERE name_norm = ''")).all()
+    if rows:
+        conn.execute(
+            text("UPDATE hcps SET name_norm = :name_norm WHERE id = :id"),
+            [{"id": r.id, "name_norm": normalize_hcp_name(r.name)} for r in rows],
+        )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_hcps_name_norm ON hcps (name_norm)"))
+
+
+def _add_interactions_hcp_created_index(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_interactions_hcp_id_created_at ON interactions (hcp_id, created_at)"
+    ))
+
+
+MIGRATIONS: List[Callable[[Connection], None]] = [
+    _add_hcp_name_norm,
+    _add_interactions_hcp_created_index,
+]
+
+
+def upgrade(engine: Engine) -> None:
+    with engine.begin() as conn:
+        for step in MIGRATIONS:
+            step(conn)
@@ -1,5 +1,22 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, DateTime, Text, ForeignKey, Integer, Boolean, func
+from sqlalchemy import String, DateTime, Text, ForeignKey, Integer, Boolean, Index, func
+from sqlalchemy.dialects import sqlite
+import re
+
+_TITLE_RE = re.compile(r"^(?:dr|doctor|prof|professor|mr|mrs|ms)\s+")
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+def normalize_hcp_name(name: str) -> str:
+    """Lookup key for HCP names: "Dr. Asha  Sharma" / "dr asha sharma" / "Asha Sharma" -> "asha sharma"."""
+    key = " ".join(_NON_WORD_RE.sub(" ", (name or "").lower()).split())
+    while True:
+        stripped = _TITLE_RE.sub("", key)
+        if stripped == key:
+            return key
+        key = stripped
+
+def _name_norm_default(context) -> str:
+    return normalize_hcp_name(context.get_current_parameters().get("name") or "")
 
 class Base(DeclarativeBase):
     pass
@@ -8,13 +25,27 @@ class HCP(Base):
     __tablename__ = "hcps"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(120), index=True)
+    # normalized lookup key (see normalize_hcp_name); filled from name on insert
+    name_norm: Mapped[str] = mapped_column(String(120), index=True, default=_name_norm_default)
     specialty: Mapped[str] = mapped_column(String(120), default="")
     city: Mapped[str] = mapped_column(String(120), default="")
 
     interactions = relationship("Interaction", back_populates="hcp")
 
+# SQLite's CURRENT_TIMESTAMP (the created_at server default) has no fractional seconds;
+# bind datetimes the same way so keyset comparisons on created_at line up with stored text
+_SQLITE_DATETIME = sqlite.DATETIME(
+    storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+)
+
 class Interaction(Base):
     __tablename__ = "interactions"
+    __table_args__ = (
+        # latest-first per HCP: filter(hcp_id).order_by(created_at desc, id desc)
+        Index("ix_interactions_hcp_id_created_at", "hcp_id", "created_at"),
+    )
+    # fetch server defaults (created_at) in the INSERT itself via RETURNING
+    __mapper_args__ = {"eager_defaults": True}
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     hcp_id: Mapped[int] = mapped_column(ForeignKey("hcps.id"), index=True)
 
@@ -37,6 +68,8 @@ class Interaction(Base):
     outcomes: Mapped[str] = mapped_column(Text, default="")
     follow_ups: Mapped[str] = mapped_column(Text, default="")
 
-    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True).with_variant(_SQLITE_DATETIME, "sqlite"), server_default=func.now()
+    )
 
     hcp = relationship("HCP", back_populates="interactions")
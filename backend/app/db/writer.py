@@ -0,0 +1,187 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+# ----------------------------
+# Group-commit writer (write-behind queue)
+# ----------------------------
+# Concurrent requests hand their write to a single writer thread instead of each
+# committing on their own session. The writer drains whatever arrived within
+# DB_GROUP_COMMIT_WINDOW_MS, runs every op on one session and commits once. Callers
+# block on a Future that resolves only after that commit, so a returned
+# interaction_id is always durable. SQLite sees one writer and one fsync per batch
+# instead of N sessions fighting over the database lock.
+#
+# Ops are `fn(db, *args) -> result` and must not commit (see tools.write_*). An op
+# registered with a bulk variant has consecutive calls in a batch folded into one
+# `many_fn(db, [args, ...]) -> [result, ...]` call (e.g. one executemany for logs).
+
+WriteOp = Callable[..., Any]
+_STOP = object()
+
+
+class GroupCommitWriter:
+    def __init__(self, session_factory: Callable[[], Session], window_ms: float, max_batch: int):
+        self.session_factory = session_factory
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._many: Dict[WriteOp, Callable[[Session, List[tuple]], List[Any]]] = {}
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"writes": 0, "batches": 0, "max_batch": 0, "commit_ms": 0.0, "fallbacks": 0, "errors": 0}
+
+    def register_many(self, fn: WriteOp, many_fn: Callable[[Session, List[tuple]], List[Any]]) -> None:
+        self._many[fn] = many_fn
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-group-commit", daemon=True)
+                self._thread.start()
+
+    def submit(self, fn: WriteOp, *args: Any) -> Future:
+        fut: Future = Future()
+        self._ensure_started()
+        self._queue.put((fn, args, fut))
+        return fut
+
+    def run(self, fn: WriteOp, *args: Any) -> Any:
+        """Blocks until the batch containing this write has committed."""
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn: WriteOp, *args: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Commits whatever is queued, then stops the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+
+    # ---- writer thread ----
+    def _collect(self, first: Any) -> Tuple[List[Tuple[WriteOp, tuple, Future]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._commit_batch(batch)
+            if stop:
+                return
+
+    def _commit_batch(self, batch: List[Tuple[WriteOp, tuple, Future]]) -> None:
+        started = time.perf_counter()
+        db = self.session_factory()
+        results: List[Any] = []
+        try:
+            i = 0
+            while i < len(batch):
+                fn = batch[i][0]
+                j = i + 1
+                while j < len(batch) and batch[j][0] is fn and fn in self._many:
+                    j += 1
+                if j - i > 1:
+                    results.extend(self._many[fn](db, [args for _, args, _ in batch[i:j]]))
+                else:
+                    results.append(fn(db, *batch[i][1]))
+                i = j
+            db.commit()
+        except Exception:
+            # One bad op must not sink its neighbours: replay each in its own transaction
+            db.rollback()
+            db.close()
+            self._count(fallbacks=1)
+            self._commit_each(batch)
+            return
+        finally:
+            db.close()
+
+        self._count(
+            writes=len(batch), batches=1, commit_ms=(time.perf_counter() - started) * 1000.0, max_batch=len(batch)
+        )
+        for (_, _, fut), result in zip(batch, results):
+            fut.set_result(result)
+
+    def _commit_each(self, batch: List[Tuple[WriteOp, tuple, Future]]) -> None:
+        for fn, args, fut in batch:
+            started = time.perf_counter()
+            db = self.session_factory()
+            try:
+                result = fn(db, *args)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self._count(errors=1)
+                fut.set_exception(e)
+                continue
+            finally:
+                db.close()
+            self._count(writes=1, batches=1, commit_ms=(time.perf_counter() - started) * 1000.0, max_batch=1)
+            fut.set_result(result)
+
+    def _count(self, max_batch: int = 0, **deltas: float) -> None:
+        with self._stats_lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+            self._stats["max_batch"] = max(self._stats["max_batch"], max_batch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            s = dict(self._stats)
+        return {
+            "enabled": settings.DB_GROUP_COMMIT,
+            "writes": s["writes"],
+            "batches": s["batches"],
+            "avg_batch": round(s["writes"] / s["batches"], 2) if s["batches"] else 0.0,
+            "max_batch": s["max_batch"],
+            "avg_commit_ms": round(s["commit_ms"] / s["batches"], 2) if s["batches"] else 0.0,
+            "fallbacks": s["fallbacks"],
+            "errors": s["errors"],
+            "queued": self._queue.qsize(),
+        }
+
+
+writer = GroupCommitWriter(SessionLocal, settings.DB_GROUP_COMMIT_WINDOW_MS, settings.DB_GROUP_COMMIT_MAX_BATCH)
+
+
+def run_write(db: Session, fn: WriteOp, *args: Any) -> Any:
+    """
+    Runs a write op through the group-commit writer, or directly on `db` (and commits)
+    when DB_GROUP_COMMIT is off.
+    """
+    if settings.DB_GROUP_COMMIT:
+        return writer.run(fn, *args)
+    result = fn(db, *args)
+    db.commit()
+    return result
+
+
+def writer_stats() -> Dict[str, Any]:
+    return writer.stats()
@@ -1,12 +1,48 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.config import settings
 from app.db.models import Base
-from app.db.session import engine
+from app.db.session import engine, SessionLocal
+from app.db.migrations import upgrade
 from app.api.routes_hcps import router as hcps_router
 from app.api.routes_agent import router as agent_router
+from app.api.routes_metrics import router as metrics_router
+from app.api.routes_admin import router as admin_router
+from app.db.writer import writer
+from app.services.groq_client import aclose_llm_clients, awarm_up_llms
+from app.services.hcp_index import hcp_index
+from app.agent.graph import get_agent_app
+
+
+def _init_db():
+    Base.metadata.create_all(bind=engine)
+    upgrade(engine)
+
+
+def _warm_caches():
+    get_agent_app()  # compile the LangGraph once, before the first request
+    with SessionLocal() as db:
+        hcp_index.refresh(db)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing below runs at import time, so spawning a worker (or importing app.main
+    # in a script) stays cheap; the work happens once per worker, before it serves.
+    await run_in_threadpool(_init_db)
+    await run_in_threadpool(_warm_caches)
+    if settings.LLM_WARMUP:
+        purposes = ("extract", "extract_fast", "tools") if settings.EXTRACT_CASCADE else ("extract", "tools")
+        app.state.llm_warmup = await awarm_up_llms(purposes)
+    yield
+    writer.close()
+    await aclose_llm_clients()
 
 def create_app():
-    app = FastAPI(title="AI-First CRM HCP Module")
+    app = FastAPI(title="AI-First CRM HCP Module", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -16,10 +52,10 @@ def create_app():
         allow_headers=["*"],
     )
 
-    Base.metadata.create_all(bind=engine)
-
     app.include_router(hcps_router)
     app.include_router(agent_router)
+    app.include_router(metrics_router)
+    app.include_router(admin_router)
 
     return app
 
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 class HCPOut(BaseModel):
     id: int
@@ -33,10 +34,14 @@ class InteractionCreate(InteractionBase):
 
 class InteractionOut(InteractionBase):
     id: int
-    created_at: Optional[str] = None
+    created_at: Optional[datetime] = None
     class Config:
         from_attributes = True
 
+class InteractionPage(BaseModel):
+    items: List[InteractionOut]
+    next_cursor: Optional[str] = None
+
 class AgentChatIn(BaseModel):
     mode: str = Field(default="draft", description="draft or save")
     message: str
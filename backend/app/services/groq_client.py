@@ -1,16 +1,649 @@
-from langchain_groq import ChatGroq
+import asyncio
+import contextvars
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Tuple
+
 from app.core.config import settings
+from app.core.metrics import LLM_REQUEST_SECONDS, LLM_TOKENS, trace_event
+from app.services.llm_cache import LLMResponseCache, cache_key
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_groq import ChatGroq
+
+# groq / langchain_groq / httpx are imported on first use (get_llm / awarm_up_llms),
+# not at import time: they are most of a cold worker's import cost.
+
+# One ChatGroq (and one pooled keep-alive HTTP transport pair) per (purpose, model),
+# shared by every thread and coroutine in this worker process.
+_lock = threading.Lock()
+_llms: Dict[Tuple[str, str], "ChatGroq"] = {}
+_http: Dict[Tuple[str, str], Tuple["httpx.Client", "httpx.AsyncClient"]] = {}
+
+GROQ_API_BASE = "https://api.groq.com"
+WARM_UP_PURPOSES = ("extract", "extract_fast", "tools")
+
+
+def _model_for(purpose: str) -> str:
+    return settings.EXTRACT_MODEL if purpose == "extract" else settings.TOOL_MODEL
+
+
+def _http_clients() -> Tuple["httpx.Client", "httpx.AsyncClient"]:
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        settings.LLM_READ_TIMEOUT,
+        connect=settings.LLM_CONNECT_TIMEOUT,
+    )
+    kwargs = dict(limits=limits, timeout=timeout, http2=settings.LLM_HTTP2)
+    return httpx.Client(**kwargs), httpx.AsyncClient(**kwargs)
+
 
 def get_llm(purpose: str = "extract"):
     """
     purpose:
       - "extract": field extraction + intent detection
+      - "extract_fast": first stage of the extraction cascade (fast model)
       - "tools": suggestions + compliance (fast)
+
+    Clients are built once and reused, so calls keep their TLS connections alive.
     """
-    model = settings.EXTRACT_MODEL if purpose == "extract" else settings.TOOL_MODEL
+    model = _model_for(purpose)
+    key = (purpose, model)
 
-    return ChatGroq(
-        groq_api_key=settings.GROQ_API_KEY,
-        model_name=model,
-        temperature=0.2,
-    )
+    llm = _llms.get(key)
+    if llm is not None:
+        return llm
+
+    with _lock:
+        llm = _llms.get(key)
+        if llm is None:
+            from langchain_groq import ChatGroq
+
+            sync_client, async_client = _http_clients()
+            llm = ChatGroq(
+                groq_api_key=settings.GROQ_API_KEY,
+                model_name=model,
+                temperature=0.2,
+                http_client=sync_client,
+                http_async_client=async_client,
+                max_retries=0,  # retries/backoff are handled in _attempt/_aattempt
+                # JSON mode / forced tool calls are not streamed; SSE gets the reply whole
+                disable_streaming=_structured_mode() is not None,
+            )
+            _http[key] = (sync_client, async_client)
+            _llms[key] = llm
+    return llm
+
+
+async def aclose_llm_clients() -> None:
+    """Close pooled connections (call on app shutdown)."""
+    with _lock:
+        clients = list(_http.values())
+        _http.clear()
+        _llms.clear()
+        _bound.clear()
+
+    for sync_client, async_client in clients:
+        sync_client.close()
+        await async_client.aclose()
+
+
+async def awarm_up_llms(purposes: Tuple[str, ...] = WARM_UP_PURPOSES) -> Dict[str, Any]:
+    """
+    Builds the ChatGroq clients and opens one keep-alive connection per pool (a cheap
+    GET /models on both the sync and async transport), so a fresh worker's first chat
+    turn doesn't pay for imports, DNS and the TLS handshake. Never raises.
+    """
+    out: Dict[str, Any] = {}
+    for purpose in purposes:
+        started = time.perf_counter()
+        try:
+            llm = get_llm(purpose)
+            key = (purpose, _model_for(purpose))
+            if settings.GROQ_API_KEY and key in _http:
+                sync_client, async_client = _http[key]
+                base = (getattr(llm, "groq_api_base", None) or GROQ_API_BASE).rstrip("/")
+                url = f"{base}/openai/v1/models"
+                kwargs = dict(
+                    headers={"Authorization": f"Bearer {settings.GROQ_API_KEY}"},
+                    timeout=settings.LLM_CONNECT_TIMEOUT,  # never hold up startup for long
+                )
+                await asyncio.gather(
+                    async_client.get(url, **kwargs),
+                    asyncio.to_thread(sync_client.get, url, **kwargs),
+                )
+            out[purpose] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000.0, 1)}
+        except Exception as e:
+            out[purpose] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    return out
+
+
+# ----------------------------
+# Rate limiting: process-wide token buckets per model (requests/min + tokens/min)
+# ----------------------------
+class TokenBucket:
+    """
+    Reservation-style bucket: reserve() always succeeds and returns how long the caller
+    must wait, so concurrent callers queue in arrival order instead of failing.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+_buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+
+
+def _limits_for(model: str) -> Tuple[TokenBucket, TokenBucket]:
+    buckets = _buckets.get(model)
+    if buckets is None:
+        with _lock:
+            buckets = _buckets.get(model)
+            if buckets is None:
+                conf = settings.LLM_RATE_LIMITS.get(model, {})
+                buckets = (
+                    TokenBucket(conf.get("rpm", settings.LLM_DEFAULT_RPM)),
+                    TokenBucket(conf.get("tpm", settings.LLM_DEFAULT_TPM)),
+                )
+                _buckets[model] = buckets
+    return buckets
+
+
+def _estimate_tokens(messages: List[Any]) -> int:
+    chars = sum(len(str(getattr(m, "content", m))) for m in messages)
+    return chars // 4 + settings.LLM_COMPLETION_TOKENS_ESTIMATE
+
+
+def _rate_limit_wait(purpose: str, messages: List[Any]) -> float:
+    requests, tokens = _limits_for(_model_for(purpose))
+    wait_s = max(requests.reserve(1), tokens.reserve(_estimate_tokens(messages)))
+    if wait_s > 0:
+        with _stats_lock:
+            _call_stats["rate_limited"] += 1
+            _call_stats["rate_limit_wait_ms"] += int(wait_s * 1000)
+    return wait_s
+
+
+# ----------------------------
+# Retries: 429 / connection / 5xx with full-jitter exponential backoff
+# ----------------------------
+_retryable_errors: Optional[Tuple[type, ...]] = None
+
+
+def _retryable() -> Tuple[type, ...]:
+    global _retryable_errors
+    if _retryable_errors is None:
+        import groq
+
+        _retryable_errors = (groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError)
+    return _retryable_errors
+
+
+def _backoff(attempt: int, err: Exception) -> float:
+    with _stats_lock:
+        _call_stats["retries"] += 1
+    # honour the server's retry-after on 429s when it sends one
+    response = getattr(err, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after:
+            return float(retry_after) + random.uniform(0, 0.25)
+    except ValueError:
+        pass
+    cap = settings.LLM_BACKOFF_MAX_MS / 1000.0
+    return random.uniform(0, min(cap, settings.LLM_BACKOFF_BASE_MS / 1000.0 * 2 ** attempt))
+
+
+def _observe_call(purpose: str, started: float, outcome: str, resp: Any = None) -> None:
+    model = _model_for(purpose)
+    elapsed = time.perf_counter() - started
+    LLM_REQUEST_SECONDS.observe(elapsed, purpose, model, outcome)
+    usage = getattr(resp, "usage_metadata", None) or {}
+    prompt_tokens, completion_tokens = usage.get("input_tokens"), usage.get("output_tokens")
+    if prompt_tokens is not None:
+        LLM_TOKENS.observe(prompt_tokens, purpose, model, "prompt")
+    if completion_tokens is not None:
+        LLM_TOKENS.observe(completion_tokens, purpose, model, "completion")
+    trace_event("llm", {
+        "purpose": purpose,
+        "model": model,
+        "outcome": outcome,
+        "ms": round(elapsed * 1000.0, 2),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+    })
+
+
+# ----------------------------
+# Structured output (LLM_STRUCTURED_OUTPUT): JSON mode or a forced tool call
+# ----------------------------
+# Either way callers still get an AIMessage whose content is the JSON text, so caching,
+# single-flight and the parsers don't care which mode produced it.
+_bound: Dict[Tuple[str, str], Tuple[Any, Any]] = {}  # (purpose, mode) -> (llm, bound runnable)
+
+
+def _structured_mode() -> Optional[str]:
+    mode = (settings.LLM_STRUCTURED_OUTPUT or "").lower()
+    return mode if mode in ("json", "tool") else None
+
+
+def _structured(purpose: str, llm: Any) -> Any:
+    mode = _structured_mode()
+    if mode is None:
+        return llm
+    key = (purpose, mode)
+    entry = _bound.get(key)
+    if entry is None or entry[0] is not llm:
+        from app.agent.prompts import OUTPUT_SCHEMAS
+
+        schema = OUTPUT_SCHEMAS.get(purpose)
+        if mode == "tool" and schema is not None:
+            bound = llm.bind_tools([schema], tool_choice=schema["function"]["name"])
+        else:
+            bound = llm.bind(response_format={"type": "json_object"})
+        entry = _bound[key] = (llm, bound)
+    return entry[1]
+
+
+def _as_json_message(resp: Any) -> Any:
+    """Forced tool call -> its arguments as the message's JSON content."""
+    calls = getattr(resp, "tool_calls", None)
+    if calls and not (resp.content or "").strip():
+        resp.content = json.dumps(calls[0].get("args") or {}, ensure_ascii=False)
+    return resp
+
+
+def _failed_generation(err: Exception) -> Optional[str]:
+    """
+    Groq rejects replies that break JSON mode / the tool schema with a 400 that carries
+    the model's text (json_validate_failed, tool_use_failed). That text is usually one
+    stray character away from valid; hand it to the lenient parser instead of failing.
+    """
+    body = getattr(err, "body", None)
+    if not isinstance(body, dict):
+        return None
+    body = body.get("error", body) if isinstance(body.get("error"), dict) else body
+    if body.get("code") not in ("json_validate_failed", "tool_use_failed"):
+        return None
+    text = body.get("failed_generation")
+    return text if isinstance(text, str) else None
+
+
+def _salvaged(purpose: str, started: float, err: Exception) -> Any:
+    text = _failed_generation(err)
+    if text is None:
+        return None
+    from langchain_core.messages import AIMessage
+
+    _observe_call(purpose, started, "schema_rejected")
+    _count("schema_rejected")
+    return AIMessage(content=text)
+
+
+def _run_config(purpose: str) -> Dict[str, Any]:
+    # Tags the model run, so astream_events consumers (SSE) can tell purposes apart
+    return {"tags": [f"llm:{purpose}"]}
+
+
+class _Sending:
+    """When the current request of one attempt went on the wire (None while it waits)."""
+
+    __slots__ = ("at",)
+
+    def __init__(self) -> None:
+        self.at: Optional[float] = None
+
+
+def _attempt(purpose: str, messages: List[Any], sending: Optional[_Sending] = None):
+    llm = _structured(purpose, get_llm(purpose))
+    sending = sending or _Sending()
+    time.sleep(_rate_limit_wait(purpose, messages))
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        started = time.perf_counter()
+        sending.at = time.monotonic()
+        try:
+            resp = _as_json_message(llm.invoke(messages, config=_run_config(purpose)))
+        except _retryable() as e:
+            sending.at = None
+            last = attempt == settings.LLM_MAX_RETRIES
+            _observe_call(purpose, started, "error" if last else "retry")
+            if last:
+                raise
+            time.sleep(_backoff(attempt, e) + _rate_limit_wait(purpose, messages))
+            continue
+        except Exception as e:
+            salvaged = _salvaged(purpose, started, e)
+            if salvaged is not None:
+                return salvaged
+            _observe_call(purpose, started, "error")
+            raise
+        _observe_call(purpose, started, "ok", resp)
+        return resp
+
+
+async def _aattempt(purpose: str, messages: List[Any], sending: Optional[_Sending] = None):
+    llm = _structured(purpose, get_llm(purpose))
+    sending = sending or _Sending()
+    await asyncio.sleep(_rate_limit_wait(purpose, messages))
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        started = time.perf_counter()
+        sending.at = time.monotonic()
+        try:
+            resp = _as_json_message(await llm.ainvoke(messages, config=_run_config(purpose)))
+        except _retryable() as e:
+            sending.at = None
+            last = attempt == settings.LLM_MAX_RETRIES
+            _observe_call(purpose, started, "error" if last else "retry")
+            if last:
+                raise
+            await asyncio.sleep(_backoff(attempt, e) + _rate_limit_wait(purpose, messages))
+            continue
+        except asyncio.CancelledError:
+            _observe_call(purpose, started, "cancelled")  # lost a hedge race / caller gave up
+            raise
+        except Exception as e:
+            salvaged = _salvaged(purpose, started, e)
+            if salvaged is not None:
+                return salvaged
+            _observe_call(purpose, started, "error")
+            raise
+        _observe_call(purpose, started, "ok", resp)
+        return resp
+
+
+# ----------------------------
+# Hedged requests
+# ----------------------------
+# If a call has not answered by the observed p95 latency for its purpose, one duplicate
+# request is sent and whichever answers first wins. Latency and the hedge clock are
+# measured from when the request goes out, not from when the call was made.
+
+_latencies: Dict[str, Deque[float]] = {}
+_call_stats: Dict[str, int] = {
+    "calls": 0, "coalesced": 0, "hedged": 0, "hedge_wins": 0, "timeouts": 0,
+    "retries": 0, "rate_limited": 0, "rate_limit_wait_ms": 0, "schema_rejected": 0,
+}
+_stats_lock = threading.Lock()
+_hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+_flight_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-flight")
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until deadline (None = no deadline)."""
+    return None if deadline is None else deadline - time.monotonic()
+
+
+_HEDGE_POLL_S = 0.05  # how often a hedger looks whether a held-back request went out
+
+
+def _hedge_after(purpose: str) -> Optional[float]:
+    if not settings.LLM_HEDGE:
+        return None
+    with _stats_lock:
+        samples = sorted(_latencies.get(purpose, ()))
+    if len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+        ms = settings.LLM_HEDGE_AFTER_MS
+    else:
+        ms = samples[int(0.95 * (len(samples) - 1))] * 1000.0
+    return max(ms, settings.LLM_HEDGE_MIN_MS) / 1000.0
+
+
+def _record_call(purpose: str, started: float, hedged: bool, winner: int) -> None:
+    with _stats_lock:
+        _latencies.setdefault(purpose, deque(maxlen=200)).append(time.monotonic() - started)
+        _call_stats["calls"] += 1
+        _call_stats["hedged"] += int(hedged)
+        _call_stats["hedge_wins"] += int(winner > 0)
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _call_stats[name] += 1
+
+
+def _hedge_wait(sending: _Sending, hedge_after: float) -> Optional[float]:
+    """
+    Seconds to wait before checking again; None once a hedge is due. The clock only runs
+    while the first request is on the wire: a call held by the rate limiter or backing
+    off after a 429 is not slow, and a duplicate would only add load.
+    """
+    if sending.at is None:
+        return _HEDGE_POLL_S
+    left = sending.at + hedge_after - time.monotonic()
+    return left if left > 0 else None
+
+
+def _first_success(attempts: List[Any]) -> Any:
+    """First finished attempt (Future or Task) that did not fail. A fast error on one
+    attempt must not throw away the other one that is still running."""
+    for a in attempts:
+        if a.done() and not a.cancelled() and a.exception() is None:
+            return a
+    return None
+
+
+def _hedged(purpose: str, messages: List[Any]):
+    started = time.monotonic()
+    hedge_after = _hedge_after(purpose)
+    sending = _Sending()
+    futures = [_hedge_pool.submit(contextvars.copy_context().run, _attempt, purpose, messages, sending)]
+
+    while hedge_after is not None:
+        timeout = _hedge_wait(sending, hedge_after)
+        if timeout is None:
+            futures.append(_hedge_pool.submit(contextvars.copy_context().run, _attempt, purpose, messages))
+            break
+        done, _ = wait(futures, timeout=timeout)
+        if done:
+            break
+    pending = set(futures)
+    while pending:
+        _, pending = wait(pending, return_when=FIRST_COMPLETED)
+        if _first_success(futures) is not None:
+            break
+
+    # threads cannot be cancelled; a losing request finishes in the background
+    winner = _first_success(futures) or futures[0]
+    _record_call(purpose, sending.at or started, len(futures) > 1, futures.index(winner))
+    return winner.result()
+
+
+async def _ahedged(purpose: str, messages: List[Any]):
+    started = time.monotonic()
+    hedge_after = _hedge_after(purpose)
+    sending = _Sending()
+    tasks = [asyncio.ensure_future(_aattempt(purpose, messages, sending))]
+    try:
+        while hedge_after is not None:
+            timeout = _hedge_wait(sending, hedge_after)
+            if timeout is None:
+                tasks.append(asyncio.ensure_future(_aattempt(purpose, messages)))
+                break
+            done, _ = await asyncio.wait(tasks, timeout=timeout)
+            if done:
+                break
+        pending = set(tasks)
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if _first_success(tasks) is not None:
+                break
+
+        winner = _first_success(tasks) or tasks[0]
+        _record_call(purpose, sending.at or started, len(tasks) > 1, tasks.index(winner))
+        return winner.result()
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+
+
+# ----------------------------
+# Response cache (opt-in per purpose via LLM_CACHE_PURPOSES)
+# ----------------------------
+_cache: Optional[LLMResponseCache] = None
+
+
+def _cache_for(purpose: str) -> Optional[LLMResponseCache]:
+    global _cache
+    if purpose not in settings.LLM_CACHE_PURPOSES:
+        return None
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    settings.LLM_CACHE_PATH, settings.LLM_CACHE_TTL_S, settings.LLM_CACHE_MAX_BYTES
+                )
+    return _cache
+
+
+def llm_cache_stats() -> Optional[Dict[str, Any]]:
+    return _cache.stats() if _cache is not None else None
+
+
+# ----------------------------
+# Public entry points: cache + single-flight + deadline
+# ----------------------------
+# Identical in-flight prompts (same model/messages) share one upstream request.
+# Each caller waits with its own `deadline` (a time.monotonic() timestamp); when it
+# passes, TimeoutError is raised so callers can degrade. The shared request keeps
+# running for the other callers (and still fills the cache).
+
+_inflight: Dict[str, Future] = {}
+_ainflight: Dict[str, "asyncio.Future[Any]"] = {}
+
+
+def _check_budget(purpose: str, deadline: Optional[float]) -> Optional[float]:
+    timeout = remaining(deadline)
+    if timeout is not None and timeout <= 0:
+        _count("timeouts")
+        raise TimeoutError(f"no latency budget left for {purpose}")
+    return timeout
+
+
+def _cacheable(content: Any) -> bool:
+    # only replies that are exactly one JSON object; a salvaged or truncated reply would
+    # keep being served long after the model would have answered properly
+    if not isinstance(content, str):
+        return False
+    try:
+        return isinstance(json.loads(content), dict)
+    except ValueError:
+        return False
+
+
+def _flight(purpose: str, messages: List[Any], key: str):
+    resp = _hedged(purpose, messages)
+    cache = _cache_for(purpose)
+    if cache is not None and _cacheable(resp.content):
+        cache.put(key, purpose, _model_for(purpose), resp.content)
+    return resp
+
+
+async def _aflight(purpose: str, messages: List[Any], key: str):
+    resp = await _ahedged(purpose, messages)
+    cache = _cache_for(purpose)
+    if cache is not None and _cacheable(resp.content):
+        # SQLite write off the event loop; nobody needs to wait for it
+        asyncio.get_running_loop().run_in_executor(
+            None, cache.put, key, purpose, _model_for(purpose), resp.content
+        )
+    return resp
+
+
+def invoke_llm(purpose: str, messages: List[Any], deadline: Optional[float] = None):
+    """Sync LLM call (cached, coalesced, rate limited, retried, hedged); returns the model's message."""
+    timeout = _check_budget(purpose, deadline)
+    key = cache_key(_model_for(purpose), messages)
+
+    cache = _cache_for(purpose)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        from langchain_core.messages import AIMessage
+
+        return AIMessage(content=cached)
+
+    with _lock:
+        future = _inflight.get(key)
+        if future is None:
+            # context goes along (like asyncio tasks), so per-request traces see the call
+            future = _flight_pool.submit(contextvars.copy_context().run, _flight, purpose, messages, key)
+            _inflight[key] = future
+            future.add_done_callback(lambda f: _inflight.pop(key, None) if _inflight.get(key) is f else None)
+        else:
+            _count("coalesced")
+
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        _count("timeouts")
+        raise TimeoutError(f"{purpose} LLM call exceeded its latency budget") from None
+
+
+def _forget_flight(key: str, task: "asyncio.Future[Any]") -> None:
+    if _ainflight.get(key) is task:
+        _ainflight.pop(key, None)
+    # consume the exception even if every waiter already gave up
+    if not task.cancelled():
+        task.exception()
+
+
+async def ainvoke_llm(purpose: str, messages: List[Any], deadline: Optional[float] = None):
+    """Async LLM call (cached, coalesced, rate limited, retried, hedged); returns the model's message."""
+    timeout = _check_budget(purpose, deadline)
+    key = cache_key(_model_for(purpose), messages)
+
+    cache = _cache_for(purpose)
+    # SQLite read (and the occasional LRU touch) off the event loop
+    cached = await asyncio.get_running_loop().run_in_executor(None, cache.get, key) if cache is not None else None
+    if cached is not None:
+        from langchain_core.messages import AIMessage
+
+        return AIMessage(content=cached)
+
+    task = _ainflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_aflight(purpose, messages, key))
+        _ainflight[key] = task
+        task.add_done_callback(lambda t: _forget_flight(key, t))
+    else:
+        _count("coalesced")
+
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        _count("timeouts")
+        raise TimeoutError(f"{purpose} LLM call exceeded its latency budget") from None
+
+
+def llm_call_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_call_stats)
+        purposes = list(_latencies)
+    stats["hedge_after_ms"] = {
+        p: round(h * 1000.0, 1) for p in purposes if (h := _hedge_after(p)) is not None
+    }
+    return stats
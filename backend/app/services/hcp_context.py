@@ -0,0 +1,214 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+# ----------------------------
+# Per-HCP context cache
+# ----------------------------
+# One entry per HCP: the HCP record, its latest N interactions as compact projections
+# (empty fields dropped) and rollups. Log/edit writes stage their rows on the session;
+# once the transaction commits they are applied to the cached entry in place, so a
+# busy HCP is never reloaded just because someone logged a visit. Memory is bounded
+# by the serialized size of the entries (LRU eviction).
+# Only this process' writes are applied; entries expire `ttl_s` after they were loaded,
+# which bounds how long a write committed by another worker goes unseen. Reads that
+# must be current (GET /agent/tools/hcp-context) load from the DB instead.
+
+_PENDING = "hcp_context_pending"
+
+
+def compact_interaction(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in row.items() if v not in (None, "") and k != "hcp_id"}
+
+
+def _rollups(latest: List[Dict[str, Any]], count: int, sentiments: Dict[str, int]) -> Dict[str, Any]:
+    last = latest[0] if latest else {}
+    return {
+        "interaction_count": count,
+        "sentiment_counts": sentiments,
+        "last_sentiment": last.get("sentiment", ""),
+        "last_products": last.get("products_discussed", ""),
+        "last_interaction_at": last.get("created_at") or last.get("date", ""),
+    }
+
+
+class HCPContextCache:
+    def __init__(self, max_bytes: int, latest_n: int, ttl_s: float):
+        self.max_bytes = max_bytes
+        self.latest_n = latest_n
+        self.ttl_s = ttl_s
+        self._items: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._loaded_at: Dict[int, float] = {}
+        self._names: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "incremental": 0, "invalidations": 0, "evictions": 0, "expired": 0}
+
+    # ---- entries ----
+    def build(
+        self,
+        hcp: Dict[str, Any],
+        name_key: str,
+        interactions: List[Dict[str, Any]],
+        count: int,
+        sentiments: Dict[str, int],
+    ) -> Dict[str, Any]:
+        latest = [compact_interaction(i) for i in interactions[: self.latest_n]]
+        return {
+            "hcp": hcp,
+            "name_key": name_key,
+            "latest": latest,
+            "count": count,
+            "sentiments": dict(sentiments),
+            "rollups": _rollups(latest, count, sentiments),
+        }
+
+    def get(self, hcp_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._items.get(hcp_id)
+            if entry is not None and time.monotonic() - self._loaded_at.get(hcp_id, 0.0) > self.ttl_s:
+                self._drop(hcp_id)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._items.move_to_end(hcp_id)
+            self._stats["hits"] += 1
+            return copy.deepcopy(entry)
+
+    def id_for_name(self, name_key: str) -> Optional[int]:
+        with self._lock:
+            return self._names.get(name_key)
+
+    def put(self, hcp_id: int, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._stats["loads"] += 1
+            self._loaded_at[hcp_id] = time.monotonic()  # incremental updates don't renew it
+            self._store(hcp_id, copy.deepcopy(entry))
+
+    def invalidate(self, hcp_id: int) -> None:
+        with self._lock:
+            if self._drop(hcp_id):
+                self._stats["invalidations"] += 1
+
+    # ---- incremental updates (called after commit) ----
+    def apply_log(self, hcp_id: int, row: Dict[str, Any]) -> None:
+        with self._lock:
+            entry = self._items.get(hcp_id)
+            if entry is None:
+                return
+            row = compact_interaction(row)
+            if any(i.get("id") == row.get("id") for i in entry["latest"]):
+                return  # entry was loaded after this row committed
+            entry["latest"] = [row] + entry["latest"][: self.latest_n - 1]
+            entry["count"] += 1
+            s = row.get("sentiment", "")
+            if s:
+                entry["sentiments"][s] = entry["sentiments"].get(s, 0) + 1
+            self._refresh(hcp_id, entry)
+
+    def apply_edit(self, hcp_id: int, row: Dict[str, Any]) -> None:
+        with self._lock:
+            entry = self._items.get(hcp_id)
+            if entry is None:
+                return
+            row = compact_interaction(row)
+            for i, old in enumerate(entry["latest"]):
+                if old.get("id") == row.get("id"):
+                    break
+            else:
+                # edited row is older than what we hold: rollups can't be patched
+                self._drop(hcp_id)
+                self._stats["invalidations"] += 1
+                return
+            before, after = old.get("sentiment", ""), row.get("sentiment", "")
+            if before != after:
+                if before and entry["sentiments"].get(before):
+                    entry["sentiments"][before] -= 1
+                if after:
+                    entry["sentiments"][after] = entry["sentiments"].get(after, 0) + 1
+            entry["latest"][i] = row
+            self._refresh(hcp_id, entry)
+
+    # ---- internals (caller holds self._lock) ----
+    def _refresh(self, hcp_id: int, entry: Dict[str, Any]) -> None:
+        entry["sentiments"] = {k: v for k, v in entry["sentiments"].items() if v > 0}
+        entry["rollups"] = _rollups(entry["latest"], entry["count"], entry["sentiments"])
+        self._stats["incremental"] += 1
+        self._store(hcp_id, entry)
+
+    def _store(self, hcp_id: int, entry: Dict[str, Any]) -> None:
+        size = len(json.dumps(entry, ensure_ascii=False, default=str).encode("utf-8"))
+        self._bytes += size - self._sizes.get(hcp_id, 0)
+        self._sizes[hcp_id] = size
+        self._items[hcp_id] = entry
+        self._items.move_to_end(hcp_id)
+        if entry.get("name_key"):
+            self._names[entry["name_key"]] = hcp_id
+        while self._bytes > self.max_bytes and len(self._items) > 1:
+            old_id = next(iter(self._items))
+            self._drop(old_id)
+            self._stats["evictions"] += 1
+
+    def _drop(self, hcp_id: int) -> bool:
+        entry = self._items.pop(hcp_id, None)
+        if entry is None:
+            return False
+        self._bytes -= self._sizes.pop(hcp_id, 0)
+        self._loaded_at.pop(hcp_id, None)
+        if self._names.get(entry.get("name_key")) == hcp_id:
+            del self._names[entry["name_key"]]
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+            }
+
+
+hcp_context_cache = HCPContextCache(
+    settings.HCP_CONTEXT_CACHE_MAX_BYTES, settings.HCP_CONTEXT_LATEST_N, settings.HCP_CONTEXT_TTL_S
+)
+
+
+# Writes stage their effect on the session; it reaches the cache only if the commit succeeds
+def stage_context_log(db: Session, hcp_id: int, row: Dict[str, Any]) -> None:
+    db.info.setdefault(_PENDING, []).append(("log", hcp_id, row))
+
+
+def stage_context_edit(db: Session, hcp_id: int, row: Dict[str, Any]) -> None:
+    db.info.setdefault(_PENDING, []).append(("edit", hcp_id, row))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_context_updates(session: Session) -> None:
+    for kind, hcp_id, row in session.info.pop(_PENDING, ()):
+        if kind == "log":
+            hcp_context_cache.apply_log(hcp_id, row)
+        else:
+            hcp_context_cache.apply_edit(hcp_id, row)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_context_updates(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def hcp_context_stats() -> Dict[str, Any]:
+    return hcp_context_cache.stats()
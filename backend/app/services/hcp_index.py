@@ -0,0 +1,296 @@
+import bisect
+import difflib
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.db.models import normalize_hcp_name
+
+# ----------------------------
+# In-process HCP name resolver
+# ----------------------------
+# Keys are models.normalize_hcp_name() values (the indexed hcps.name_norm column).
+# Lookups try, in order: exact key, unique whole-word prefix ("asha" -> "asha sharma"),
+# then a fuzzy match over a token deletion index ("asha sharmaa"). Writes (match_strict)
+# stop before the fuzzy step. The index is loaded lazily, picks up HCPs committed by
+# this process via session events, and catches up on rows inserted by other workers
+# (id > last seen id) whenever a lookup misses. Ids are not committed in order across
+# workers, so a miss also looks the name up directly (exact key or whole-word prefix).
+
+FUZZY_CUTOFF = 0.88
+_MAX_FUZZY_CANDIDATES = 200
+_MAX_AMBIGUOUS = 5  # candidates listed back when a write names several HCPs
+_PENDING = "hcp_index_pending"
+
+
+def _deletes(token: str) -> Set[str]:
+    # token plus every single-character deletion: two tokens within one typo
+    # (insert/delete/substitute/transpose) always share at least one variant
+    if len(token) < 4:
+        return {token}
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class HCPNameIndex:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._max_id = 0
+        self._exact: Dict[str, int] = {}
+        self._sorted: List[str] = []
+        self._postings: Dict[str, List[str]] = {}   # token -> keys containing it
+        self._variants: Dict[str, Set[str]] = {}    # deletion variant -> tokens
+        self._stats = {"lookups": 0, "exact": 0, "prefix": 0, "fuzzy": 0, "misses": 0, "refreshes": 0, "catch_ups": 0, "stale": 0}
+
+    # ---- maintenance ----
+    def _add(self, hcp_id: int, key: str, keep_sorted: bool = True) -> None:
+        # caller holds self._lock
+        self._max_id = max(self._max_id, hcp_id)
+        if not key:
+            return
+        current = self._exact.get(key)
+        if current is not None:
+            if hcp_id < current:
+                self._exact[key] = hcp_id  # oldest record wins, same as the DB fallback
+            return
+        self._exact[key] = hcp_id
+        if keep_sorted:
+            bisect.insort(self._sorted, key)
+        for token in set(key.split()):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = []
+                for v in _deletes(token):
+                    self._variants.setdefault(v, set()).add(token)
+            postings.append(key)
+
+    def _load(self, db: Session) -> None:
+        rows = db.execute(select(models.HCP.id, models.HCP.name_norm).order_by(models.HCP.id))
+        with self._lock:
+            if self._loaded:
+                return
+            for hcp_id, key in rows:
+                self._add(hcp_id, key, keep_sorted=False)
+            self._sorted = sorted(self._exact)
+            self._loaded = True
+
+    def refresh(self, db: Session) -> None:
+        """Loads HCPs inserted since the last load (by any worker)."""
+        if not self._loaded:
+            self._load(db)
+            return
+        rows = db.execute(
+            select(models.HCP.id, models.HCP.name_norm).where(models.HCP.id > self._max_id).order_by(models.HCP.id)
+        ).all()
+        with self._lock:
+            self._stats["refreshes"] += 1
+            for hcp_id, key in rows:
+                self._add(hcp_id, key)
+
+    def _catch_up(self, db: Session, key: str) -> bool:
+        """
+        Indexes rows for `key` (exact or whole-word prefix) that the id watermark skipped:
+        committed by another worker with an id below one this worker has already seen.
+        Returns True if anything new was added.
+        """
+        rows = db.execute(
+            select(models.HCP.id, models.HCP.name_norm)
+            .where(or_(
+                models.HCP.name_norm == key,
+                # range on the name_norm index: keys starting with "<key> "
+                and_(models.HCP.name_norm >= key + " ", models.HCP.name_norm < key + "!"),
+            ))
+            .order_by(models.HCP.id)
+            .limit(_MAX_FUZZY_CANDIDATES)
+        ).all()
+        with self._lock:
+            self._stats["catch_ups"] += 1
+            new = [(hcp_id, k) for hcp_id, k in rows if self._exact.get(k, hcp_id + 1) > hcp_id]
+            for hcp_id, k in new:
+                self._add(hcp_id, k)
+        return bool(new)
+
+    def add(self, hcp_id: int, name: str) -> None:
+        with self._lock:
+            if self._loaded:
+                self._add(hcp_id, normalize_hcp_name(name))
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._exact.pop(key, None)
+            i = bisect.bisect_left(self._sorted, key)
+            if i < len(self._sorted) and self._sorted[i] == key:
+                del self._sorted[i]
+            self._stats["stale"] += 1
+
+    # ---- lookups ----
+    def _prefixed(self, key: str, limit: int) -> List[str]:
+        i = bisect.bisect_left(self._sorted, key)
+        out: List[str] = []
+        while i < len(self._sorted) and len(out) < limit and self._sorted[i].startswith(key):
+            out.append(self._sorted[i])
+            i += 1
+        return out
+
+    def _similar_tokens(self, token: str) -> Set[str]:
+        if token in self._postings:
+            return {token}
+        out: Set[str] = set()
+        for v in _deletes(token):
+            out.update(self._variants.get(v, ()))
+        return out
+
+    def _fuzzy(self, key: str) -> Optional[str]:
+        candidates: Optional[Set[str]] = None
+        for token in key.split():
+            keys: Set[str] = set()
+            for t in self._similar_tokens(token):
+                keys.update(self._postings[t])
+            candidates = keys if candidates is None else candidates & keys
+            if not candidates:
+                return None
+        if not candidates or len(candidates) > _MAX_FUZZY_CANDIDATES:
+            return None
+
+        scored = sorted(
+            ((difflib.SequenceMatcher(None, key, c).ratio(), c) for c in candidates if c in self._exact),
+            reverse=True,
+        )
+        if not scored or scored[0][0] < FUZZY_CUTOFF:
+            return None
+        if len(scored) > 1 and scored[1][0] == scored[0][0]:
+            return None  # ambiguous
+        return scored[0][1]
+
+    def _match(self, key: str) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            if key in self._exact:
+                return key, "exact"
+            prefixed = self._prefixed(key + " ", 2)
+            if len(prefixed) == 1:
+                return prefixed[0], "prefix"
+            if prefixed:
+                return None  # ambiguous prefix: let the caller decide (e.g. create a new HCP)
+            fuzzy = self._fuzzy(key)
+            return (fuzzy, "fuzzy") if fuzzy else None
+
+    def match(self, db: Session, name: str, refresh: bool = True) -> Optional[Tuple[int, str, str]]:
+        """Returns (hcp_id, matched_key, how) or None."""
+        key = normalize_hcp_name(name)
+        if not key:
+            return None
+        if not self._loaded:
+            self._load(db)
+        hit = self._match(key)
+        if hit is None and refresh:
+            self.refresh(db)
+            hit = self._match(key)
+            if hit is None and self._catch_up(db, key):
+                hit = self._match(key)
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats[hit[1] if hit else "misses"] += 1
+            hcp_id = self._exact.get(hit[0]) if hit else None
+        if hit is None or hcp_id is None:
+            return None
+        return hcp_id, hit[0], hit[1]
+
+    def _match_strict(self, key: str) -> Tuple[Optional[Tuple[str, str]], List[str]]:
+        with self._lock:
+            if key in self._exact:
+                return (key, "exact"), []
+            prefixed = self._prefixed(key + " ", _MAX_AMBIGUOUS)
+            if len(prefixed) == 1:
+                return (prefixed[0], "prefix"), []
+            return None, prefixed
+
+    def match_strict(self, db: Session, name: str, refresh: bool = True) -> Tuple[Optional[Tuple[int, str, str]], List[str]]:
+        """
+        Lookup for writes (log/edit): exact key or a unique whole-word prefix, never fuzzy,
+        so a typo can't attach an interaction to someone else.
+        Returns ((hcp_id, matched_key, how), []) on a hit, (None, keys) when the name is a
+        prefix of several HCPs, (None, []) when nobody matches.
+        """
+        key = normalize_hcp_name(name)
+        if not key:
+            return None, []
+        if not self._loaded:
+            self._load(db)
+        hit, ambiguous = self._match_strict(key)
+        if hit is None and not ambiguous and refresh:
+            self.refresh(db)
+            hit, ambiguous = self._match_strict(key)
+            if hit is None and not ambiguous and self._catch_up(db, key):
+                hit, ambiguous = self._match_strict(key)
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats[hit[1] if hit else "misses"] += 1
+            hcp_id = self._exact.get(hit[0]) if hit else None
+        if hit is None or hcp_id is None:
+            return None, ambiguous
+        return (hcp_id, hit[0], hit[1]), []
+
+    def resolve(self, db: Session, name: str) -> Optional[models.HCP]:
+        hit = self.match(db, name)
+        if hit is not None:
+            hcp = db.get(models.HCP, hit[0])
+            if hcp is not None and hcp.name_norm == hit[1]:
+                return hcp
+            self.discard(hit[1])  # rolled back / deleted behind our back
+
+        key = normalize_hcp_name(name)
+        if not key:
+            return None
+        return (
+            db.query(models.HCP)
+            .filter(models.HCP.name_norm == key)
+            .order_by(models.HCP.id)
+            .first()
+        )
+
+    def search(self, db: Session, prefix: str, limit: int = 10) -> List[int]:
+        """HCP ids whose normalized name starts with the prefix (autocomplete)."""
+        key = normalize_hcp_name(prefix)
+        if not self._loaded:
+            self._load(db)
+        with self._lock:
+            return [self._exact[k] for k in self._prefixed(key, limit)] if key else []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "loaded": self._loaded, "entries": len(self._exact), "tokens": len(self._postings)}
+
+
+hcp_index = HCPNameIndex()
+
+
+# New HCPs become visible to the index once their transaction commits
+def stage_new_hcp(db: Session, hcp_id: int, name: str) -> None:
+    db.info.setdefault(_PENDING, []).append((hcp_id, name))
+
+
+@event.listens_for(models.HCP, "after_insert")
+def _hcp_inserted(mapper, connection, target) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        stage_new_hcp(session, target.id, target.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_new_hcps(session: Session) -> None:
+    for hcp_id, name in session.info.pop(_PENDING, ()):
+        hcp_index.add(hcp_id, name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_new_hcps(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def hcp_index_stats() -> Dict[str, Any]:
+    return hcp_index.stats()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# ----------------------------
+# Content-addressed LLM response cache (SQLite, shared by every worker on the host)
+# ----------------------------
+# Keys are sha256 over canonical JSON of [model, messages]; message contents that are
+# JSON themselves are re-serialized with sorted keys and compact separators, so
+# whitespace/key-order differences in json.dumps payloads map to the same entry.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    purpose TEXT NOT NULL,
+    model TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at);
+"""
+
+# Only refresh accessed_at on hits this often (keeps reads from becoming writes)
+_TOUCH_INTERVAL_S = 30.0
+# Expired rows are skipped by get(); deleting them can wait until this often (or until full)
+_SWEEP_INTERVAL_S = 60.0
+
+
+def _canonical_content(content: Any) -> Any:
+    if isinstance(content, str):
+        try:
+            return json.loads(content)
+        except ValueError:
+            return content.strip()
+    return content
+
+
+def cache_key(model: str, messages: List[Any]) -> str:
+    payload = [
+        [getattr(m, "type", ""), _canonical_content(getattr(m, "content", m))]
+        for m in messages
+    ]
+    raw = json.dumps([model, payload], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, path: str, ttl_s: float, max_bytes: int):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "hit_bytes": 0, "stored_bytes": 0, "evictions": 0}
+        # running SUM(size) for this process' puts; other workers write too, so it is
+        # re-read from the table whenever it says the cache is full
+        self._size_lock = threading.Lock()
+        self._total: Optional[int] = None
+        self._swept_at = 0.0
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread; WAL lets workers read while one writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **deltas: int) -> None:
+        with self._stats_lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, created_at, accessed_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl_s:
+            self._count(misses=1)
+            return None
+
+        if now - row[2] > _TOUCH_INTERVAL_S:
+            try:
+                conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            except sqlite3.OperationalError:
+                pass  # busy: LRU order is best-effort
+        self._count(hits=1, hit_bytes=len(row[0].encode("utf-8")))
+        return row[0]
+
+    def put(self, key: str, purpose: str, model: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        conn = self._conn()
+        try:
+            old = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, purpose, model, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, purpose, model, value, size, now, now),
+            )
+            self._count(stored_bytes=size)
+            self._evict(conn, now, size - (old[0] if old else 0))
+        except sqlite3.OperationalError:
+            pass  # another worker holds the write lock; caching is best-effort
+
+    def _evict(self, conn: sqlite3.Connection, now: float, added: int) -> None:
+        with self._size_lock:
+            if self._total is None:
+                self._total = self._table_size(conn)
+            else:
+                self._total += added
+            if self._total <= self.max_bytes and now - self._swept_at < _SWEEP_INTERVAL_S:
+                return
+            self._swept_at = now
+            self._total = self._sweep(conn, now)
+
+    def _table_size(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def _sweep(self, conn: sqlite3.Connection, now: float) -> int:
+        """Drops expired rows, then least recently used ones until under max_bytes; returns the size left."""
+        expired = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_s,)).rowcount
+        total = self._table_size(conn)
+        evicted = 0
+        while total > self.max_bytes:
+            rows = conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            drop = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                drop.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", drop)
+            evicted += len(drop)
+        if expired or evicted:
+            self._count(evictions=expired + evicted)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        row = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        lookups = stats["hits"] + stats["misses"]
+        stats.update(
+            entries=row[0],
+            bytes=row[1],
+            max_bytes=self.max_bytes,
+            hit_rate=(stats["hits"] / lookups) if lookups else 0.0,
+        )
+        return stats
@@ -0,0 +1,269 @@
+import cProfile
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# ----------------------------
+# On-demand profiling (admin endpoints / X-Profile header)
+# ----------------------------
+# Two tools, both off unless asked for:
+#   - StackSampler: a thread that snapshots every other thread's Python stack at `hz`
+#     for N seconds (sys._current_frames), so cost is paid only while a session runs.
+#     Returns collapsed stacks (flamegraph.pl / speedscope) plus the same samples
+#     grouped by graph node / routing / tool function and by category.
+#   - profile_call: cProfile around one call (one chat turn), grouped the same way.
+#
+# Categories tell apart the usual suspects: JSON/regex parsing (merge_json_safely,
+# _safe_json_load), ORM/DB (sqlalchemy, sqlite3), waiting on the network / other
+# threads, framework overhead (langchain/langgraph/pydantic/fastapi) and our own code.
+
+Frame = Tuple[str, str]  # (module, function)
+
+NODES = ("route", "extract", "draft_update", "edit_intent", "log_intent")
+# Conditional-edge functions: routing between nodes, not nodes (decide_node included)
+_ROUTING_FUNCS = {"decide_route", "decide_node"}
+_JSON_FUNCS = {"merge_json_safely", "_safe_json_load", "parse_partial_json_fields"}
+_CATEGORY_PREFIXES = (
+    ("json_regex", ("json", "_json", "re", "sre_compile", "sre_parse", "_sre")),
+    ("orm_db", ("sqlalchemy", "sqlite3", "_sqlite3")),
+    ("wait_io", ("ssl", "socket", "selectors", "httpx", "httpcore", "h11", "h2", "anyio", "asyncio.base_events",
+                 "threading", "queue", "concurrent.futures")),
+    ("framework", ("langchain", "langchain_core", "langchain_groq", "langgraph", "langsmith", "pydantic",
+                   "pydantic_core", "fastapi", "starlette", "groq")),
+)
+# Parked threads (pool workers waiting for work) are not "doing" anything
+_IDLE_FRAMES = {
+    ("concurrent.futures.thread", "_worker"),
+    ("app.db.writer", "_run"),
+    ("app.db.writer", "_collect"),
+    ("anyio._backends._asyncio", "run"),
+    ("threading", "_bootstrap_inner"),
+}
+
+
+def _top_module(module: str) -> str:
+    return module.split(".")[0]
+
+
+def category(module: str, func: str) -> Optional[str]:
+    if func in _JSON_FUNCS:
+        return "json_regex"
+    for name, prefixes in _CATEGORY_PREFIXES:
+        for p in prefixes:
+            if module == p or module.startswith(p + "."):
+                return name
+    if module.startswith("app."):
+        return "app"
+    return None
+
+
+def stack_category(stack: List[Frame]) -> str:
+    """Category of the innermost frame that has one (leaf first)."""
+    for module, func in reversed(stack):
+        c = category(module, func)
+        if c is not None:
+            return c
+    return "other"
+
+
+def component(stack: List[Frame]) -> str:
+    """Innermost graph node, routing step or public tools.py function on the stack."""
+    for module, func in reversed(stack):
+        if module == "app.agent.tools" and func.isidentifier() and not func.startswith("_"):
+            return f"tool:{func}"
+        if module == "app.agent.graph" and func in _ROUTING_FUNCS:
+            return "routing"
+        if module == "app.agent.graph" and func.endswith("_node"):
+            name = func[:-len("_node")]
+            if name not in NODES and name[1:] in NODES:
+                name = name[1:]  # async variant (aextract_node -> extract)
+            return f"node:{name}"
+    return "(none)"
+
+
+def _is_idle(stack: List[Frame]) -> bool:
+    i = len(stack) - 1
+    while i >= 0 and _top_module(stack[i][0]) in ("threading", "queue") and stack[i] not in _IDLE_FRAMES:
+        i -= 1
+    return i >= 0 and stack[i] in _IDLE_FRAMES
+
+
+def _stack(frame: Any, max_depth: int = 128) -> List[Frame]:
+    out: List[Frame] = []
+    while frame is not None and len(out) < max_depth:
+        out.append((frame.f_globals.get("__name__", "?"), frame.f_code.co_name))
+        frame = frame.f_back
+    out.reverse()
+    return out
+
+
+def _grouped(counts: "Counter[Tuple[str, Tuple[Frame, ...]]]") -> Dict[str, Any]:
+    total = sum(counts.values())
+    by_component: Dict[str, Dict[str, int]] = {}
+    by_category: Counter = Counter()
+    for (_, stack), n in counts.items():
+        comp, cat = component(list(stack)), stack_category(list(stack))
+        by_component.setdefault(comp, Counter())[cat] += n
+        by_category[cat] += n
+
+    def share(n: float) -> float:
+        return round(n / total, 4) if total else 0.0
+
+    return {
+        "by_component": {
+            comp: {"samples": sum(cats.values()), "share": share(sum(cats.values())), "categories": dict(cats)}
+            for comp, cats in sorted(by_component.items(), key=lambda kv: -sum(kv[1].values()))
+        },
+        "by_category": {cat: {"samples": n, "share": share(n)} for cat, n in by_category.most_common()},
+    }
+
+
+def collapsed(counts: "Counter[Tuple[str, Tuple[Frame, ...]]]") -> str:
+    """Brendan Gregg's collapsed format: `thread;mod:func;mod:func count` per line."""
+    lines = []
+    for (thread, stack), n in counts.most_common():
+        frames = [thread.replace(" ", "_")] + [f"{m}:{f}" for m, f in stack]
+        lines.append(";".join(frames) + f" {n}")
+    return "\n".join(lines) + "\n"
+
+
+class StackSampler:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._running = False
+        self._stats = {"sessions": 0, "ticks": 0, "last_overhead_ms_per_tick": 0.0}
+
+    def run(self, seconds: float, hz: float = 100.0, include_idle: bool = False) -> Dict[str, Any]:
+        """Samples all other threads for `seconds`; one session at a time per process."""
+        with self._lock:
+            if self._running:
+                raise RuntimeError("a sampling session is already running")
+            self._running = True
+        try:
+            return self._sample(seconds, hz, include_idle)
+        finally:
+            with self._lock:
+                self._running = False
+
+    def _sample(self, seconds: float, hz: float, include_idle: bool) -> Dict[str, Any]:
+        me = threading.get_ident()
+        interval = 1.0 / hz
+        counts: "Counter[Tuple[str, Tuple[Frame, ...]]]" = Counter()
+        names: Dict[int, str] = {}
+        ticks, busy = 0, 0.0
+        started = time.monotonic()
+        deadline = started + seconds
+        while time.monotonic() < deadline:
+            tick = time.perf_counter()
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = _stack(frame)
+                if not include_idle and _is_idle(stack):
+                    continue
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                counts[(names.get(tid, str(tid)), tuple(stack))] += 1
+            ticks += 1
+            spent = time.perf_counter() - tick
+            busy += spent
+            time.sleep(max(0.0, interval - spent))
+
+        with self._lock:
+            self._stats["sessions"] += 1
+            self._stats["ticks"] += ticks
+            self._stats["last_overhead_ms_per_tick"] = round(busy / ticks * 1000.0, 3) if ticks else 0.0
+        return {
+            "seconds": round(time.monotonic() - started, 3),
+            "hz": hz,
+            "ticks": ticks,
+            "samples": sum(counts.values()),
+            "sampler_ms_per_tick": round(busy / ticks * 1000.0, 3) if ticks else 0.0,
+            **_grouped(counts),
+            "collapsed": collapsed(counts),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "running": self._running}
+
+
+sampler = StackSampler()
+
+
+# ----------------------------
+# Deterministic profile of one call
+# ----------------------------
+def _builtin_category(func: str) -> Optional[str]:
+    # cProfile names C functions like "<method 'search' of 're.Pattern' objects>"
+    if any(s in func for s in ("re.Pattern", "_sre", "_json", "json.")):
+        return "json_regex"
+    if "sqlite3" in func:
+        return "orm_db"
+    if any(s in func for s in ("acquire", "sleep", "select", "poll", "recv", "send", "wait", "connect")):
+        return "wait_io"
+    return None
+
+
+def profile_call(fn: Callable[..., Any], *args: Any, top: int = 25) -> Tuple[Any, Dict[str, Any]]:
+    """Runs fn(*args) under cProfile; returns (result, grouped report)."""
+    prof = cProfile.Profile()
+    started = time.perf_counter()
+    prof.enable()
+    try:
+        result = fn(*args)
+    finally:
+        prof.disable()
+    total_ms = (time.perf_counter() - started) * 1000.0
+
+    modules = {
+        getattr(m, "__file__", None): name for name, m in list(sys.modules.items()) if getattr(m, "__file__", None)
+    }
+    stats = pstats.Stats(prof).stats  # (file, line, func) -> (cc, nc, tottime, cumtime, callers)
+
+    nodes: Counter = Counter()
+    tools: Counter = Counter()
+    categories: Counter = Counter()
+    routing = 0.0
+    rows = []
+    for (filename, line, func), (_, ncalls, tottime, cumtime, callers) in stats.items():
+        module = modules.get(filename, "?")
+        if filename == "~":
+            cat = _builtin_category(func) or "other"
+        else:
+            cat = category(module, func) or "other"
+        categories[cat] += tottime
+
+        comp = component([(module, func)])
+        if comp.startswith("node:"):
+            nodes[comp[5:]] += cumtime
+        elif comp.startswith("tool:"):
+            tools[comp[5:]] += cumtime
+        elif comp == "routing":
+            # decide_route calls decide_node on the fast path: count that time once
+            routing += cumtime - sum(c[3] for caller, c in callers.items() if caller[2] in _ROUTING_FUNCS)
+        rows.append((tottime, cumtime, ncalls, f"{module}:{func}:{line}" if filename != "~" else func, cat))
+
+    rows.sort(reverse=True)
+
+    def ms(seconds: float) -> float:
+        return round(seconds * 1000.0, 3)
+
+    return result, {
+        "total_ms": round(total_ms, 3),
+        "nodes_ms": {k: ms(v) for k, v in nodes.most_common()},
+        "routing_ms": ms(routing),
+        "tools_ms": {k: ms(v) for k, v in tools.most_common()},
+        "self_ms_by_category": {k: ms(v) for k, v in categories.most_common()},
+        "top_self": [
+            {"function": name, "calls": n, "self_ms": ms(tt), "cum_ms": ms(ct), "category": cat}
+            for tt, ct, n, name, cat in rows[:top]
+        ],
+    }
+
+
+def profiler_stats() -> Dict[str, Any]:
+    return sampler.stats()
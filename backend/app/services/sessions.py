@@ -0,0 +1,120 @@
+import copy
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+# ----------------------------
+# Server-side draft sessions
+# ----------------------------
+# Drafts live in a bounded in-memory LRU. With SESSION_SPILL_PATH set, entries evicted
+# from memory are written to SQLite and promoted back on the next access.
+
+
+def _escape(key: str) -> str:
+    # RFC 6901 JSON pointer escaping
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+# Bookkeeping keys the client never sees, and never gets to set (they are trusted on reuse)
+SERVER_ONLY_KEYS = {"_suggest_fp"}
+
+
+def client_draft(draft: Dict[str, Any]) -> Dict[str, Any]:
+    """The draft without server-only keys: what goes out to, or is accepted from, a client."""
+    return {k: v for k, v in (draft or {}).items() if k not in SERVER_ONLY_KEYS}
+
+
+def draft_patch(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """JSON-patch style delta (top-level keys) that turns `old` into `new`."""
+    ops: List[Dict[str, Any]] = []
+    for k, v in new.items():
+        if k in SERVER_ONLY_KEYS:
+            continue
+        if k not in old:
+            ops.append({"op": "add", "path": f"/{_escape(k)}", "value": v})
+        elif old[k] != v:
+            ops.append({"op": "replace", "path": f"/{_escape(k)}", "value": v})
+    for k in old:
+        if k not in new and k not in SERVER_ONLY_KEYS:
+            ops.append({"op": "remove", "path": f"/{_escape(k)}"})
+    return ops
+
+
+class DraftSessionStore:
+    def __init__(self, max_entries: int, spill_path: str = "", spill_ttl_s: float = 7 * 86400.0):
+        self.max_entries = max_entries
+        self.spill_ttl_s = spill_ttl_s
+        self._items: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._spill: Optional[sqlite3.Connection] = None
+        if spill_path:
+            self._spill = sqlite3.connect(spill_path, check_same_thread=False, isolation_level=None)
+            self._spill.execute("PRAGMA journal_mode=WAL")
+            self._spill.execute(
+                "CREATE TABLE IF NOT EXISTS draft_sessions "
+                "(id TEXT PRIMARY KEY, draft TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def create(self, draft: Optional[Dict[str, Any]] = None) -> str:
+        session_id = secrets.token_urlsafe(16)
+        self.put(session_id, draft or {})
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a copy of the session draft (graph nodes mutate drafts in place)."""
+        with self._lock:
+            draft = self._items.get(session_id)
+            if draft is not None:
+                self._items.move_to_end(session_id)
+                return copy.deepcopy(draft)
+
+            if self._spill is None:
+                return None
+            row = self._spill.execute(
+                "SELECT draft FROM draft_sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.spill_ttl_s),
+            ).fetchone()
+            if row is None:
+                return None
+            self._spill.execute("DELETE FROM draft_sessions WHERE id = ?", (session_id,))
+            draft = json.loads(row[0])
+            self._store(session_id, draft)
+            return copy.deepcopy(draft)
+
+    def put(self, session_id: str, draft: Dict[str, Any]) -> None:
+        with self._lock:
+            self._store(session_id, copy.deepcopy(draft))
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._items.pop(session_id, None) is not None
+            if self._spill is not None:
+                spilled = self._spill.execute("DELETE FROM draft_sessions WHERE id = ?", (session_id,)).rowcount
+                found = found or spilled > 0
+            return found
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _store(self, session_id: str, draft: Dict[str, Any]) -> None:
+        # caller holds self._lock
+        self._items[session_id] = draft
+        self._items.move_to_end(session_id)
+        while len(self._items) > self.max_entries:
+            old_id, old_draft = self._items.popitem(last=False)
+            if self._spill is not None:
+                now = time.time()
+                self._spill.execute(
+                    "INSERT OR REPLACE INTO draft_sessions (id, draft, updated_at) VALUES (?, ?, ?)",
+                    (old_id, json.dumps(old_draft, ensure_ascii=False, default=str), now),
+                )
+                self._spill.execute("DELETE FROM draft_sessions WHERE updated_at < ?", (now - self.spill_ttl_s,))
+
+
+sessions = DraftSessionStore(settings.SESSION_MAX_ENTRIES, settings.SESSION_SPILL_PATH)
@@ -0,0 +1,485 @@
+"""
+Offline latency/throughput benchmark for the chat agent (no Groq account needed).
+
+get_llm is swapped for the fake models in bench/fake_groq.py, then a fixed, seeded set
+of rep conversations (draft -> optional refinement -> "log it" -> optional correction)
+is replayed against:
+
+    graph     agent_app.invoke() from a thread pool (orchestration only, no DB writes)
+    inproc    the FastAPI app through httpx's ASGI transport (lifespan included)
+    uvicorn   the FastAPI app served by a local uvicorn process, over TCP
+
+Reports p50/p95/p99 latency per turn kind, turns and HTTP requests per second, and LLM
+calls per turn. Runs use a throwaway DB and LLM cache, so results from different
+commits are comparable; save one with --out and diff against it with --compare.
+
+    cd backend
+    python -m bench.bench_agent --mode all --out /tmp/before.json
+    python -m bench.bench_agent --mode all --compare /tmp/before.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+FIRST = ["Asha", "Vikram", "Priya", "Rahul", "Meera", "Arjun", "Neha", "Karan", "Sunita", "Rohan",
+         "Anita", "Deepak", "Kavya", "Sanjay", "Lakshmi", "Imran", "Farah", "Joseph", "Maria", "Nikhil"]
+LAST = ["Sharma", "Iyer", "Reddy", "Kapoor", "Nair", "Gupta", "Patel", "Singh", "Menon", "Joshi",
+        "Khan", "Das", "Rao", "Verma", "Pillai"]
+TOPICS = ["dosing in elderly patients", "renal safety data", "the phase III results", "switching from generics",
+          "insurance coverage", "drug interactions with statins", "the new titration schedule", "adherence issues"]
+PRODUCTS = ["CardioPlus", "GlucoFine", "NeuroCalm", "OncoShield", "PulmoEase", "DermaClear"]
+TURN_KINDS = ("draft", "edit", "log")
+
+Turn = Tuple[str, str]  # (kind, message)
+
+
+# ----------------------------
+# Workload
+# ----------------------------
+def conversations(n: int, seed: int, refine_share: float, edit_share: float) -> List[List[Turn]]:
+    """The same seed always yields the same conversations."""
+    rng = random.Random(seed)
+    out: List[List[Turn]] = []
+    for _ in range(n):
+        name = f"Dr. {rng.choice(FIRST)} {rng.choice(LAST)}"
+        product, other = rng.sample(PRODUCTS, 2)
+        hour, minute = rng.randint(9, 17), rng.choice(["00", "15", "30", "45"])
+        turns: List[Turn] = [(
+            "draft",
+            f"Met {name} today at {hour % 12 or 12}:{minute} {'pm' if hour >= 12 else 'am'} in the clinic. "
+            f"Discussed {rng.choice(TOPICS)} for {product}; overall {rng.choice(['positive', 'neutral'])}. "
+            f"{rng.choice(['Shared the brochure.', 'Left the reprint.', 'She asked good questions.', ''])}",
+        )]
+        if rng.random() < refine_share:
+            turns.append((
+                "draft",
+                f"Also gave {rng.randint(2, 10)} samples of {product} and agreed on a follow-up "
+                f"{rng.choice(['next week', 'in two weeks', 'after the conference'])}.",
+            ))
+        turns.append(("log", rng.choice(["log it", "save this", "submit please", "ok log it"])))
+        if rng.random() < edit_share:
+            if rng.random() < 0.5:
+                turns.append(("edit", rng.choice(["sorry, sentiment was negative", "correction: time was 4pm"])))
+            else:
+                turns.append(("edit", f"actually {name} discussed {other}, not {product} - please update that"))
+        out.append(turns)
+    return out
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100.0
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def _summary(ms: List[float]) -> Dict[str, float]:
+    ms = sorted(ms)
+    return {
+        "n": len(ms),
+        "p50": round(_pct(ms, 50), 1),
+        "p95": round(_pct(ms, 95), 1),
+        "p99": round(_pct(ms, 99), 1),
+        "mean": round(sum(ms) / len(ms), 1) if ms else 0.0,
+        "max": round(ms[-1], 1) if ms else 0.0,
+    }
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {k: [] for k in TURN_KINDS}
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0  # 4xx answers, e.g. logging a draft whose extraction came back malformed
+
+    def add(self, kind: str, ms: float, requests: int) -> None:
+        with self._lock:
+            self.latencies[kind].append(ms)
+            self.requests += requests
+
+    def error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def report(self, wall_s: float, llm_before: Dict[str, Any], llm_after: Dict[str, Any],
+               fast_before: Dict[str, Any], fast_after: Dict[str, Any]) -> Dict[str, Any]:
+        every = [ms for kind in TURN_KINDS for ms in self.latencies[kind]]
+        turns = len(every)
+        calls = {p: n - llm_before["calls"].get(p, 0) for p, n in llm_after["calls"].items()}
+        malformed = {k: n - llm_before["malformed"].get(k, 0) for k, n in llm_after["malformed"].items()}
+        fp_turns = fast_after["turns"] - fast_before["turns"]
+        return {
+            "turns": turns,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "wall_s": round(wall_s, 3),
+            "turns_per_s": round(turns / wall_s, 2) if wall_s else 0.0,
+            "requests_per_s": round(self.requests / wall_s, 2) if wall_s else 0.0,
+            "latency_ms": {"all": _summary(every), **{k: _summary(v) for k, v in self.latencies.items() if v}},
+            "llm_calls_per_turn": round(sum(calls.values()) / turns, 3) if turns else 0.0,
+            "llm_calls": calls,
+            "malformed_replies": {k: v for k, v in malformed.items() if v},
+            "fast_path_hit_rate": round((fast_after["fast_path"] - fast_before["fast_path"]) / fp_turns, 3)
+            if fp_turns else 0.0,
+        }
+
+
+# ----------------------------
+# Drivers
+# ----------------------------
+def _state_in(message: str, draft: Dict[str, Any]) -> Dict[str, Any]:
+    # mirrors routes_agent._chat_state_in
+    from app.core.config import settings
+
+    return {
+        "message": message,
+        "mode": "draft",
+        "draft": draft,
+        "extracted": {},
+        "tool_used": "",
+        "assistant_message": "",
+        "deadline": time.monotonic() + settings.CHAT_LATENCY_BUDGET_MS / 1000.0,
+        "degraded": [],
+        "speculative": None,
+    }
+
+
+def run_graph(convs: List[List[Turn]], concurrency: int, rec: Recorder) -> float:
+    from app.agent.graph import get_agent_app
+
+    agent_app = get_agent_app()
+
+    def one(conv: List[Turn]) -> None:
+        draft: Dict[str, Any] = {}
+        for kind, message in conv:
+            started = time.perf_counter()
+            try:
+                out = agent_app.invoke(_state_in(message, draft))
+            except Exception:
+                rec.error()
+                return
+            rec.add(kind, (time.perf_counter() - started) * 1000.0, 0)
+            draft = out.get("draft") or {}
+            draft.pop("_edit_payload", None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, convs))
+    return time.perf_counter() - started
+
+
+async def run_http(client: Any, convs: List[List[Turn]], concurrency: int, rec: Recorder) -> float:
+    pending = iter(convs)
+
+    def ok(r: Any) -> bool:
+        if r.status_code >= 500:
+            raise RuntimeError(f"HTTP {r.status_code}")
+        if r.status_code >= 400:
+            rec.reject()
+        return r.status_code < 400
+
+    async def one(conv: List[Turn]) -> None:
+        draft: Dict[str, Any] = {}
+        for kind, message in conv:
+            started = time.perf_counter()
+            requests = 1
+            r = await client.post("/agent/chat", json={"message": message, "draft": draft})
+            if ok(r):
+                draft = r.json()["updated_draft"]
+            if kind == "log":
+                # the UI logs through the tool endpoint once the agent says "Ready to log"
+                requests += 1
+                ok(await client.post("/agent/tools/log", json=draft))
+            rec.add(kind, (time.perf_counter() - started) * 1000.0, requests)
+
+    async def worker() -> None:
+        for conv in pending:
+            try:
+                await one(conv)
+            except Exception:
+                rec.error()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+def _fast_path_stats() -> Dict[str, Any]:
+    from app.agent.fastpath import fast_path_stats
+
+    return fast_path_stats()
+
+
+def bench_graph(args, fake, convs, warm) -> Dict[str, Any]:
+    from app.db.migrations import upgrade
+    from app.db.models import Base
+    from app.db.session import engine
+
+    Base.metadata.create_all(bind=engine)
+    upgrade(engine)
+    run_graph(warm, args.concurrency, Recorder())
+
+    rec = Recorder()
+    llm0, fp0 = fake.snapshot(), _fast_path_stats()
+    wall = run_graph(convs, args.concurrency, rec)
+    return rec.report(wall, llm0, fake.snapshot(), fp0, _fast_path_stats())
+
+
+async def bench_inproc(args, fake, convs, warm) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+            await run_http(client, warm, args.concurrency, Recorder())
+            rec = Recorder()
+            llm0, fp0 = fake.snapshot(), _fast_path_stats()
+            wall = await run_http(client, convs, args.concurrency, rec)
+            return rec.report(wall, llm0, fake.snapshot(), fp0, _fast_path_stats())
+
+
+async def bench_uvicorn(args, convs, warm) -> Dict[str, Any]:
+    import httpx
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    cmd = [sys.executable, "-m", "bench.bench_agent", "--serve", str(port), *_fake_argv(args)]
+    server = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120.0, limits=limits) as client:
+            for _ in range(300):
+                if server.poll() is not None:
+                    raise SystemExit("uvicorn exited during startup")
+                try:
+                    if (await client.get("/agent/stats")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise SystemExit("uvicorn did not come up")
+
+            async def snapshots():
+                fake = (await client.get("/__bench/fake-llm")).json()
+                fp = (await client.get("/agent/stats")).json()["fast_path"]
+                return fake, fp
+
+            await run_http(client, warm, args.concurrency, Recorder())
+            rec = Recorder()
+            llm0, fp0 = await snapshots()
+            wall = await run_http(client, convs, args.concurrency, rec)
+            llm1, fp1 = await snapshots()
+            return rec.report(wall, llm0, llm1, fp0, fp1)
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def serve(args) -> None:
+    import uvicorn
+
+    from bench.fake_groq import install
+
+    fake = install(_latencies(args), args.malformed, args.seed)
+    from app.main import app
+
+    app.add_api_route("/__bench/fake-llm", fake.snapshot, methods=["GET"])
+    uvicorn.run(app, host="127.0.0.1", port=args.serve, log_level="warning", access_log=False)
+
+
+# ----------------------------
+# Setup, reporting, comparison
+# ----------------------------
+def _latencies(args) -> Dict[str, str]:
+    return {"extract": args.extract_latency, "extract_fast": args.fast_latency, "tools": args.tools_latency}
+
+
+def _fake_argv(args) -> List[str]:
+    return [
+        "--extract-latency", args.extract_latency, "--fast-latency", args.fast_latency,
+        "--tools-latency", args.tools_latency, "--malformed", str(args.malformed), "--seed", str(args.seed),
+    ]
+
+
+def _workload_argv(args) -> List[str]:
+    argv = [
+        "--conversations", str(args.conversations), "--warmup", str(args.warmup),
+        "--concurrency", str(args.concurrency), "--refine-share", str(args.refine_share),
+        "--edit-share", str(args.edit_share), *_fake_argv(args),
+    ]
+    if args.cascade:
+        argv.append("--cascade")
+    if args.speculative:
+        argv.append("--speculative")
+    if args.no_llm_cache:
+        argv.append("--no-llm-cache")
+    return argv
+
+
+def _configure_env(tmp: str, args) -> None:
+    # Must run before anything imports app.core.config
+    os.environ["DB_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["LLM_CACHE_PATH"] = os.path.join(tmp, "llm_cache.db")
+    os.environ["LLM_DEFAULT_RPM"] = "1000000000"   # the fake is not rate limited
+    os.environ["LLM_DEFAULT_TPM"] = "1000000000"
+    os.environ["LLM_RATE_LIMITS"] = "{}"
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    if args.cascade:
+        os.environ["EXTRACT_CASCADE"] = "true"
+    if args.speculative:
+        os.environ["SPECULATIVE_SUGGESTIONS"] = "true"
+    if args.no_llm_cache:
+        os.environ["LLM_CACHE_PURPOSES"] = "[]"
+
+
+def _git_commit() -> Dict[str, Any]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": sha, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": None}
+
+
+def _print_mode(mode: str, r: Dict[str, Any]) -> None:
+    print(f"\n[{mode}]  turns: {r['turns']}  errors: {r['errors']}  rejected: {r['rejected']}  wall: {r['wall_s']}s  "
+          f"turns/s: {r['turns_per_s']}  req/s: {r['requests_per_s']}")
+    print(f"  LLM calls/turn: {r['llm_calls_per_turn']}  {r['llm_calls']}  "
+          f"fast path: {r['fast_path_hit_rate']:.0%}  malformed: {r['malformed_replies'] or '-'}")
+    print(f"  {'turn':<6}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, s in r["latency_ms"].items():
+        print(f"  {kind:<6}{s['n']:>6}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}{s['max']:>10}")
+
+
+_COMPARED = [
+    ("p50 ms", lambda r: r["latency_ms"]["all"]["p50"]),
+    ("p95 ms", lambda r: r["latency_ms"]["all"]["p95"]),
+    ("p99 ms", lambda r: r["latency_ms"]["all"]["p99"]),
+    ("turns/s", lambda r: r["turns_per_s"]),
+    ("LLM calls/turn", lambda r: r["llm_calls_per_turn"]),
+]
+
+
+def _print_compare(base: Dict[str, Any], now: Dict[str, Any]) -> None:
+    b, n = base["meta"], now["meta"]
+    print(f"\ncompare: {b['commit']}{'+' if b.get('dirty') else ''} -> {n['commit']}{'+' if n.get('dirty') else ''}")
+    if b.get("workload") != n.get("workload"):
+        print("  warning: workload/fake settings differ, numbers are not like for like")
+    for mode, r in now["modes"].items():
+        old = base["modes"].get(mode)
+        if not old:
+            continue
+        print(f"  [{mode}]")
+        for label, get in _COMPARED:
+            x, y = get(old), get(r)
+            delta = f"{(y - x) / x * 100:+.1f}%" if x else "n/a"
+            print(f"    {label:<15}{x:>10}{y:>10}  {delta}")
+
+
+def run_mode(args) -> Dict[str, Any]:
+    convs = conversations(args.conversations, args.seed, args.refine_share, args.edit_share)
+    warm = conversations(args.warmup, args.seed + 1, args.refine_share, args.edit_share)
+    with tempfile.TemporaryDirectory() as tmp:
+        _configure_env(tmp, args)
+        from bench.fake_groq import install
+
+        fake = install(_latencies(args), args.malformed, args.seed)
+        if args.mode == "graph":
+            return bench_graph(args, fake, convs, warm)
+        if args.mode == "inproc":
+            return asyncio.run(bench_inproc(args, fake, convs, warm))
+        return asyncio.run(bench_uvicorn(args, convs, warm))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["graph", "inproc", "uvicorn", "all"], default="all")
+    ap.add_argument("--conversations", type=int, default=100)
+    ap.add_argument("--warmup", type=int, default=5, help="conversations run before measuring")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--refine-share", type=float, default=0.5, help="conversations with a second draft turn")
+    ap.add_argument("--edit-share", type=float, default=0.3, help="conversations with a correction after logging")
+    ap.add_argument("--extract-latency", default="lognormal:900:0.35")
+    ap.add_argument("--fast-latency", default="lognormal:300:0.35", help="extract_fast (cascade) latency")
+    ap.add_argument("--tools-latency", default="lognormal:350:0.35")
+    ap.add_argument("--malformed", type=float, default=0.05, help="share of malformed LLM replies")
+    ap.add_argument("--cascade", action="store_true", help="run with EXTRACT_CASCADE on")
+    ap.add_argument("--speculative", action="store_true", help="run with SPECULATIVE_SUGGESTIONS on")
+    ap.add_argument("--no-llm-cache", action="store_true")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", help="results JSON from an earlier run")
+    ap.add_argument("--serve", type=int, help=argparse.SUPPRESS)  # internal: uvicorn child process
+    args = ap.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    if args.mode == "all":
+        # one process (and one throwaway DB + LLM cache) per mode, so modes don't warm each other
+        results: Dict[str, Any] = {}
+        for mode in ("graph", "inproc", "uvicorn"):
+            with tempfile.NamedTemporaryFile(suffix=".json") as out:
+                subprocess.run(
+                    [sys.executable, "-m", "bench.bench_agent", "--mode", mode, "--out", out.name, *_workload_argv(args)],
+                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True,
+                )
+                results[mode] = json.load(open(out.name))["modes"][mode]
+    else:
+        results = {args.mode: run_mode(args)}
+        _print_mode(args.mode, results[args.mode])
+
+    workload = {
+        k: getattr(args, k) for k in (
+            "conversations", "concurrency", "refine_share", "edit_share", "extract_latency",
+            "fast_latency", "tools_latency", "malformed", "cascade", "speculative", "no_llm_cache", "seed",
+        )
+    }
+    report = {
+        "meta": {
+            **_git_commit(),
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "workload": workload,
+        },
+        "modes": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        if args.mode == "all":
+            print(f"\nwrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            _print_compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
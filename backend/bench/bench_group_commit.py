@@ -0,0 +1,89 @@
+"""
+Concurrent interaction logging on one SQLite file: a session + commit per request
+(what /agent/tools/log did before) vs the group-commit writer.
+
+    cd backend
+    python -m bench.bench_group_commit --threads 32 --writes 100
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.agent.tools import _write_log_interactions, tool_log_interaction, write_log_interaction
+from app.db.models import Base
+from app.db.writer import GroupCommitWriter
+
+
+def _factory(path: str):
+    engine = create_engine(f"sqlite:///{path}", future=True, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+
+def _draft(i: int):
+    return {"hcp_name": f"Dr. Bench {i % 50}", "date": "2024-05-01", "sentiment": "neutral", "summary": "bench"}
+
+
+def _drive(threads: int, writes: int, one_write) -> tuple:
+    errors = 0
+
+    def worker(t: int) -> int:
+        failed = 0
+        for i in range(writes):
+            try:
+                one_write(_draft(t * writes + i))
+            except OperationalError:
+                failed += 1  # "database is locked"
+        return failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        errors = sum(pool.map(worker, range(threads)))
+    return time.perf_counter() - started, errors
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--writes", type=int, default=100, help="writes per thread")
+    ap.add_argument("--window-ms", type=float, default=3.0)
+    ap.add_argument("--dir", default=None, help="where to put the DB files (use a real disk, not tmpfs)")
+    args = ap.parse_args()
+    total = args.threads * args.writes
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        engine, Session = _factory(os.path.join(tmp, "direct.db"))
+
+        def direct(draft):
+            db = Session()
+            try:
+                tool_log_interaction(db, draft)
+            finally:
+                db.close()
+
+        direct_s, direct_err = _drive(args.threads, args.writes, direct)
+        engine.dispose()
+
+        engine, Session = _factory(os.path.join(tmp, "group.db"))
+        writer = GroupCommitWriter(Session, args.window_ms, 256)
+        writer.register_many(write_log_interaction, _write_log_interactions)
+        grouped_s, grouped_err = _drive(args.threads, args.writes, lambda d: writer.run(write_log_interaction, d))
+        stats = writer.stats()
+        writer.close()
+        engine.dispose()
+
+    print(f"threads: {args.threads}  writes: {total}")
+    print(f"per-request commit: {direct_s:7.3f}s  {total / direct_s:8.0f} writes/s  locked errors: {direct_err}")
+    print(f"group commit:       {grouped_s:7.3f}s  {total / grouped_s:8.0f} writes/s  locked errors: {grouped_err}"
+          f"  avg batch: {stats['avg_batch']}")
+    print(f"speedup: {direct_s / grouped_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+HCP name resolution at territory-master scale: the old lower(name) scan vs the
+name_norm index + in-process resolver.
+
+    cd backend
+    python -m bench.bench_hcp_resolve --hcps 500000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.db import models
+from app.db.models import Base
+from app.services.hcp_index import HCPNameIndex
+
+_SYLLABLES = ["a", "an", "ar", "sha", "vi", "ne", "ra", "pri", "ya", "ju", "ka", "ro", "mee", "san",
+              "ni", "ki", "dee", "po", "su", "lak", "mi", "di", "khi", "ri", "tu", "me", "ver", "ma", "ye",
+              "red", "dy", "nai", "gup", "ta", "pa", "tel", "sin", "gh", "kap", "oor", "jo", "shi", "bo", "se"]
+
+
+def _word(rnd: random.Random, parts: int) -> str:
+    return "".join(rnd.choice(_SYLLABLES) for _ in range(parts)).capitalize()
+
+
+def _names(n: int, rnd: random.Random):
+    # ~3k first names x ~40k surnames, a third with a middle name; realistic token vocabulary
+    first = list({_word(rnd, 2) for _ in range(4000)})
+    last = list({_word(rnd, 3) for _ in range(60000)})
+    seen, out = set(), []
+    while len(out) < n:
+        parts = [rnd.choice(first), rnd.choice(last)]
+        if rnd.random() < 0.33:
+            parts.insert(1, rnd.choice(first))
+        name = "Dr. " + " ".join(parts)
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            out.append(name)
+    return out
+
+
+def _timed(fn, queries):
+    started = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hcps", type=int, default=500000)
+    ap.add_argument("--queries", type=int, default=2000)
+    args = ap.parse_args()
+    rnd = random.Random(11)
+    names = _names(args.hcps, rnd)
+    sample = rnd.sample(names, args.queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'hcps.db')}", future=True)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(insert(models.HCP), [{"name": n, "specialty": "", "city": ""} for n in names])
+        db = sessionmaker(bind=engine, future=True)()
+
+        index = HCPNameIndex()
+        started = time.perf_counter()
+        index.refresh(db)
+        load_s = time.perf_counter() - started
+
+        exact = [n.replace("Dr. ", "dr ") for n in sample]
+        prefix = [n.rsplit(" ", 1)[0].replace("Dr. ", "Dr ") for n in sample if n.count(" ") == 3]
+        typo = [n[:-3] + n[-2] + n[-3] + n[-1] for n in sample]  # transposed letters in the last name
+        miss = [f"Dr. Nobody {i}" for i in range(args.queries)]
+
+        lower_scan = _timed(
+            lambda q: db.query(models.HCP).filter(func.lower(models.HCP.name) == q.lower()).first(),
+            sample[:50],
+        )
+        indexed = _timed(lambda q: db.query(models.HCP).filter(models.HCP.name_norm == models.normalize_hcp_name(q)).first(), sample)
+
+        print(f"hcps: {args.hcps}  index load: {load_s:.2f}s  entries: {index.stats()['entries']}")
+        print(f"old lower(name) scan:      {lower_scan:10.1f} us/lookup")
+        print(f"name_norm index (SQL):     {indexed:10.1f} us/lookup")
+        print(f"resolver exact:            {_timed(lambda q: index.match(db, q, refresh=False), exact):10.1f} us/lookup")
+        print(f"resolver prefix-ish:       {_timed(lambda q: index.match(db, q, refresh=False), prefix):10.1f} us/lookup")
+        print(f"resolver fuzzy (typo):     {_timed(lambda q: index.match(db, q, refresh=False), typo):10.1f} us/lookup")
+        print(f"resolver miss:             {_timed(lambda q: index.match(db, q, refresh=False), miss):10.1f} us/lookup")
+        print(f"resolve() incl. db.get:    {_timed(lambda q: index.resolve(db, q), exact):10.1f} us/lookup")
+        print(f"typo hit rate: {sum(1 for q, n in zip(typo, sample) if (index.match(db, q, refresh=False) or (0, ''))[1] == models.normalize_hcp_name(n)) / len(typo):.2%}")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Latest-interaction lookups and history paging at 1M interactions, with and without
+ix_interactions_hcp_id_created_at.
+
+    cd backend
+    python -m bench.bench_interactions_index --rows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, desc, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.db import models
+from app.db.models import Base
+
+HOT_HCP = 1
+
+
+def _populate(engine, rows: int, hcps: int, hot_share: float) -> None:
+    rnd = random.Random(5)
+    start = datetime(2023, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.HCP), [{"name": f"Dr. Bench {i}", "specialty": "", "city": ""} for i in range(hcps)])
+        batch = []
+        for i in range(rows):
+            hcp_id = HOT_HCP if rnd.random() < hot_share else rnd.randint(2, hcps)
+            # coarse timestamps so (created_at) ties are common, like CURRENT_TIMESTAMP under load
+            created = start + timedelta(seconds=i // 4)
+            batch.append({"hcp_id": hcp_id, "created_at": created, "summary": "bench", "sentiment": "neutral"})
+            if len(batch) == 20000:
+                conn.execute(insert(models.Interaction), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.Interaction), batch)
+
+
+def _latest(db, hcp_id):
+    return (
+        db.query(models.Interaction)
+        .filter(models.Interaction.hcp_id == hcp_id)
+        .order_by(desc(models.Interaction.created_at), desc(models.Interaction.id))
+        .first()
+    )
+
+
+def _timed(fn, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1000.0
+
+
+def _plan(db, hcp_id, label):
+    # label keeps the statement text unique (the driver caches prepared statements)
+    sql = ("EXPLAIN QUERY PLAN SELECT id FROM interactions WHERE hcp_id = :h "
+           f"ORDER BY created_at DESC, id DESC LIMIT 1 -- {label}")
+    return " | ".join(r[-1] for r in db.execute(text(sql), {"h": hcp_id}))
+
+
+def _walk_pages(db, hcp_id, limit):
+    before, pages, seen = None, 0, 0
+    while True:
+        rows = crud.list_interactions_for_hcp(db, hcp_id, limit=limit, before=before)
+        if not rows:
+            return pages, seen
+        pages += 1
+        seen += len(rows)
+        before = (rows[-1].created_at, rows[-1].id)
+
+
+def _walk_offsets(db, hcp_id, limit):
+    offset, pages = 0, 0
+    while True:
+        rows = (
+            db.query(models.Interaction)
+            .filter(models.Interaction.hcp_id == hcp_id)
+            .order_by(desc(models.Interaction.created_at), desc(models.Interaction.id))
+            .offset(offset).limit(limit).all()
+        )
+        if not rows:
+            return pages
+        pages += 1
+        offset += limit
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1000000)
+    ap.add_argument("--hcps", type=int, default=5000)
+    ap.add_argument("--hot-share", type=float, default=0.05, help="share of rows on one busy HCP")
+    ap.add_argument("--page", type=int, default=100)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", future=True)
+        Base.metadata.create_all(bind=engine)
+        started = time.perf_counter()
+        _populate(engine, args.rows, args.hcps, args.hot_share)
+        db = sessionmaker(bind=engine, future=True)()
+        hot_rows = db.query(models.Interaction).filter(models.Interaction.hcp_id == HOT_HCP).count()
+        print(f"rows: {args.rows}  hot HCP rows: {hot_rows}  populate: {time.perf_counter() - started:.1f}s")
+
+        for label in ("composite index", "hcp_id index only"):
+            if label == "hcp_id index only":
+                db.execute(text("DROP INDEX ix_interactions_hcp_id_created_at"))
+                db.commit()
+            print(f"\n[{label}]  plan: {_plan(db, HOT_HCP, label)}")
+            print(f"latest (busy HCP):   {_timed(lambda: _latest(db, HOT_HCP), 200):8.3f} ms")
+            print(f"latest (typical):    {_timed(lambda: _latest(db, 2), 200):8.3f} ms")
+            started = time.perf_counter()
+            pages, seen = _walk_pages(db, HOT_HCP, args.page)
+            print(f"keyset walk:         {time.perf_counter() - started:8.3f} s  ({pages} pages, {seen} rows)")
+            if label == "composite index":
+                assert seen == hot_rows, (seen, hot_rows)
+                started = time.perf_counter()
+                pages = _walk_offsets(db, HOT_HCP, args.page)
+                print(f"offset walk:         {time.perf_counter() - started:8.3f} s  ({pages} pages)")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
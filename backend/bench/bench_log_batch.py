@@ -0,0 +1,73 @@
+"""
+Per-row vs batched interaction logging on a throwaway SQLite DB.
+
+    cd backend
+    python -m bench.bench_log_batch --n 10000 --hcps 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.agent.tools import tool_log_interaction, tool_log_interactions_batch
+from app.db.models import Base
+
+
+def _drafts(n: int, hcps: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [
+        {
+            "hcp_name": f"Dr. Bench {rnd.randrange(hcps)}",
+            "interaction_type": "Meeting",
+            "date": "2024-05-01",
+            "time": "10:30",
+            "topics_discussed": "efficacy data, dosing schedule",
+            "sentiment": rnd.choice(["positive", "neutral", "negative"]),
+            "summary": "Discussed latest trial results.",
+        }
+        for _ in range(n)
+    ]
+
+
+def _session(path: str):
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=10000)
+    ap.add_argument("--hcps", type=int, default=500)
+    args = ap.parse_args()
+    drafts = _drafts(args.n, args.hcps)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, db = _session(os.path.join(tmp, "per_row.db"))
+        started = time.perf_counter()
+        for d in drafts:
+            tool_log_interaction(db, dict(d))
+        per_row = time.perf_counter() - started
+        db.close()
+        engine.dispose()
+
+        engine, db = _session(os.path.join(tmp, "batch.db"))
+        started = time.perf_counter()
+        out = tool_log_interactions_batch(db, drafts)
+        batch = time.perf_counter() - started
+        db.close()
+        engine.dispose()
+
+    assert out["logged"] == args.n, out["failed"]
+    print(f"interactions: {args.n}  hcps: {args.hcps}")
+    print(f"per-row: {per_row:8.3f}s  {args.n / per_row:10.0f} rows/s")
+    print(f"batch:   {batch:8.3f}s  {args.n / batch:10.0f} rows/s")
+    print(f"speedup: {per_row / batch:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
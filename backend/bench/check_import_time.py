@@ -0,0 +1,77 @@
+"""
+Import-time profile of `app.main` (what every worker spawn pays before serving).
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter, prints the
+slowest modules by cumulative time, and exits non-zero if the total is over budget
+or if a module that should only load lazily (LLM client, LangGraph) was imported.
+
+    cd backend
+    python -m bench.check_import_time --budget-ms 2000
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, Tuple
+
+# Imported on first use (get_llm / build_graph), never by `import app.main`
+LAZY_MODULES = ("langchain_groq", "groq", "httpx", "langgraph", "langchain_core")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def profile(module: str, runs: int) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) for the fastest of `runs` cold imports."""
+    best: List[Tuple[str, int, int, int]] = []
+    best_total = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        if proc.returncode != 0:
+            sys.exit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+        rows = []
+        for line in proc.stderr.splitlines():
+            m = _LINE_RE.match(line)
+            if m:
+                rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+        total = next((cum for name, _, cum, _ in rows if name == module), 0)
+        if best_total is None or total < best_total:
+            best, best_total = rows, total
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="app.main")
+    ap.add_argument("--budget-ms", type=float, default=2000.0)
+    ap.add_argument("--runs", type=int, default=3, help="report the fastest run (filters disk-cache noise)")
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args()
+
+    rows = profile(args.module, args.runs)
+    total_ms = next((cum for name, _, cum, _ in rows if name == args.module), 0) / 1000.0
+
+    print(f"import {args.module}: {total_ms:.0f} ms total, {len(rows)} modules")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    top_level = sorted((r for r in rows if r[3] <= 1), key=lambda r: r[2], reverse=True)
+    for name, self_us, cum_us, _ in top_level[: args.top]:
+        print(f"{cum_us / 1000.0:>14.1f} {self_us / 1000.0:>9.1f}  {name}")
+
+    eager = sorted({name for name, _, _, _ in rows if name.split(".")[0] in LAZY_MODULES})
+    failed = False
+    if eager:
+        roots = sorted({n.split(".")[0] for n in eager})
+        print(f"\nFAIL: imported eagerly (should load on first use): {', '.join(roots)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: {total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print(f"\nOK: within the {args.budget_ms:.0f} ms budget, no eager LLM/graph imports")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Connection reuse of the pooled LLM clients (groq_client.get_llm), against a local stub
+of the Groq chat completions endpoint that counts the TCP connections it accepts.
+
+N sequential calls through invoke_llm / ainvoke_llm should each share one keep-alive
+connection, and concurrent calls should open no more connections than the concurrency.
+For contrast, the same calls with a fresh httpx.Client each open one connection per call.
+Exits non-zero if the pooled clients open more connections than that.
+
+    cd backend
+    python -m bench.check_llm_pool --calls 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_REPLY = json.dumps({"_ai_suggestions": ["Send brochure"], "_compliance": {"status": "ok", "issues": []}})
+
+
+class _StubGroq(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def counts(self):
+        with self.lock:
+            return self.connections, self.requests
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def setup(self) -> None:
+        super().setup()  # once per accepted connection
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self) -> None:
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": _REPLY}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _messages(i: int):
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    # distinct prompts, so nothing is coalesced
+    return [SystemMessage(content="stub"), HumanMessage(content=f"call {i}")]
+
+
+def _phase(server: _StubGroq, label: str, calls: int, run) -> int:
+    before, _ = server.counts()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    after, _ = server.counts()
+    opened = after - before
+    print(f"{label:<34} calls: {calls:5d}  connections: {opened:5d}  {elapsed / calls * 1000:7.2f} ms/call")
+    return opened
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    args = ap.parse_args()
+
+    server = _StubGroq()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # before app.core.config is imported: point the real clients at the stub, no cache/hedging
+    os.environ.update({
+        "GROQ_API_KEY": "stub",
+        "GROQ_API_BASE": server.base_url,
+        "LLM_CACHE_PURPOSES": "[]",
+        "LLM_HEDGE": "false",
+        "LLM_STRUCTURED_OUTPUT": "",
+    })
+    import httpx
+
+    from app.services import groq_client
+
+    n, c = args.calls, args.concurrency
+
+    def sync_pooled() -> None:
+        for i in range(n):
+            groq_client.invoke_llm("tools", _messages(i))
+
+    def async_pooled() -> None:
+        async def run() -> None:
+            for i in range(n):
+                await groq_client.ainvoke_llm("tools", _messages(n + i))
+
+        asyncio.run(run())
+
+    def async_concurrent() -> None:
+        async def run() -> None:
+            gate = asyncio.Semaphore(c)
+
+            async def one(i: int) -> None:
+                async with gate:
+                    await groq_client.ainvoke_llm("tools", _messages(2 * n + i))
+
+            await asyncio.gather(*(one(i) for i in range(n)))
+
+        asyncio.run(run())
+
+    def fresh_clients() -> None:
+        payload = {"model": "stub", "messages": [{"role": "user", "content": "hi"}]}
+        for _ in range(n):
+            with httpx.Client() as client:
+                client.post(f"{server.base_url}/openai/v1/chat/completions", json=payload).raise_for_status()
+
+    failures = []
+    if _phase(server, "pooled sync (invoke_llm)", n, sync_pooled) > 1:
+        failures.append("sync calls did not share one connection")
+    # asyncio.run() per phase: a new loop cannot reuse the previous loop's sockets, so the
+    # async client gets one connection per phase (a worker keeps one loop for its lifetime)
+    if _phase(server, "pooled async (ainvoke_llm)", n, async_pooled) > 1:
+        failures.append("async calls did not share one connection")
+    if _phase(server, f"pooled async, concurrency {c}", n, async_concurrent) > c:
+        failures.append(f"concurrent async calls opened more than {c} connections")
+    _phase(server, "fresh httpx.Client per call", n, fresh_clients)
+
+    connections, requests = server.counts()
+    print(f"stub totals: {requests} requests over {connections} connections")
+    server.shutdown()
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("OK: pooled clients reuse their keep-alive connections")
+
+
+if __name__ == "__main__":
+    main()
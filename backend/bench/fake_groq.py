@@ -0,0 +1,250 @@
+"""
+Local stand-in for Groq, used by the offline agent benchmarks.
+
+install() replaces groq_client.get_llm with one FakeGroq chat model per purpose. Each
+model sleeps for a latency drawn from its distribution, then answers with canned JSON
+built from the prompt (same keys the real prompts ask for). A share of replies can be
+malformed on purpose, to exercise merge_json_safely / _safe_json_load:
+
+    fenced      ```json ... ```
+    prose       text before and after the object
+    two_objects two JSON objects back to back
+    trailing    trailing comma (invalid JSON)
+    truncated   reply cut off mid-object
+    empty       empty string
+
+Latency specs: "fixed:MS", "uniform:LO:HI", "lognormal:MEDIAN_MS:SIGMA".
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+MALFORMED_KINDS = ("fenced", "prose", "two_objects", "trailing", "truncated", "empty")
+
+PRODUCTS = ("CardioPlus", "GlucoFine", "NeuroCalm", "OncoShield", "PulmoEase", "DermaClear")
+
+_HCP_RE = re.compile(r"\b(?:Dr\.?|Doctor)\s+([A-Z][\w'-]+(?:\s+[A-Z][\w'-]+)?)")
+_TIME_RE = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b", re.IGNORECASE)
+_SENTIMENT_RE = re.compile(r"\b(positive|neutral|negative)\b", re.IGNORECASE)
+_TOPICS_RE = re.compile(r"\b[Dd]iscussed\s+([^.;]+)")
+_SAMPLES_RE = re.compile(r"\b(\d+\s+samples?\s+of\s+\w+)")
+_FOLLOW_RE = re.compile(r"\b(follow[- ]up[^.;]*)")
+_MESSAGE_RE = re.compile(r"User message:\n(.*?)\n\nCurrent draft JSON:", re.DOTALL)
+
+
+def latency_sampler(spec: str) -> Callable[[random.Random], float]:
+    """Parses a latency spec into rng -> seconds."""
+    kind, _, rest = spec.partition(":")
+    args = [float(a) for a in rest.split(":") if a]
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0] / 1000.0
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000.0
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(args[0])
+        return lambda rng: rng.lognormvariate(mu, args[1]) / 1000.0
+    raise ValueError(f"bad latency spec {spec!r} (fixed:MS | uniform:LO:HI | lognormal:MEDIAN_MS:SIGMA)")
+
+
+# ----------------------------
+# Canned replies
+# ----------------------------
+def _extract_reply(human: str, rng: random.Random, with_confidence: bool) -> Dict[str, Any]:
+    m = _MESSAGE_RE.search(human)
+    message = m.group(1) if m else human
+    low = message.lower()
+
+    out: Dict[str, Any] = {}
+    if re.search(r"\b(sorry|actually|change|update|correction)\b", low):
+        out["action"] = "edit"
+    elif re.search(r"\b(log|save|submit)\b", low):
+        out["action"] = "log"
+    else:
+        out["action"] = "draft"
+
+    fields: Dict[str, Any] = {}
+    if (m := _HCP_RE.search(message)):
+        out["hcp_name"] = "Dr. " + m.group(1)
+    if "today" in low:
+        fields["date"] = "today"
+    if (m := _TIME_RE.search(message)):
+        fields["time"] = f"{m.group(1)}:{m.group(2) or '00'} {m.group(3).upper()}"
+    if (m := _SENTIMENT_RE.search(message)):
+        fields["sentiment"] = m.group(1).lower()
+    products = [p for p in PRODUCTS if p.lower() in low]
+    if products:
+        fields["products_discussed"] = ", ".join(products)
+    if (m := _TOPICS_RE.search(message)):
+        fields["topics_discussed"] = m.group(1).strip()
+    if (m := _SAMPLES_RE.search(message)):
+        fields["samples_distributed"] = m.group(1)
+    if (m := _FOLLOW_RE.search(message)):
+        fields["follow_ups"] = m.group(1).strip()
+    if out["action"] == "draft" and len(message) > 60:
+        fields["interaction_type"] = "Meeting"
+        fields["summary"] = message[:160]
+
+    out.update(fields)
+    if out["action"] == "edit":
+        out["fields_to_update"] = {k: v for k, v in fields.items() if k not in ("date", "time")}
+    if with_confidence:
+        out["confidence"] = round(rng.uniform(0.55, 0.98), 2)
+    return out
+
+
+def _tools_reply(human: str, with_compliance: bool) -> Dict[str, Any]:
+    try:
+        draft = json.loads(human).get("draft") or {}
+    except ValueError:
+        draft = {}
+    product = (draft.get("products_discussed") or "the product").split(",")[0]
+    out: Dict[str, Any] = {
+        "_ai_suggestions": [
+            f"Send the {product} clinical summary",
+            f"Schedule a follow-up on {product} in 2 weeks",
+            "Confirm preferred contact channel",
+        ]
+    }
+    if with_compliance:
+        issues = ["Samples need a signed receipt"] if draft.get("samples_distributed") else []
+        out["_compliance"] = {"status": "review" if issues else "ok", "issues": issues}
+    return out
+
+
+def malform(text: str, kind: str) -> str:
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "prose":
+        return f"Sure! Here is the JSON you asked for:\n{text}\nLet me know if anything is missing."
+    if kind == "two_objects":
+        return f'{text}\n{{"note": "second object"}}'
+    if kind == "trailing":
+        return text[:-1] + ",}"
+    if kind == "truncated":
+        return text[: max(1, len(text) * 2 // 3)]
+    return ""
+
+
+# ----------------------------
+# Fake chat model
+# ----------------------------
+class FakeStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.malformed: Dict[str, int] = {}
+        self.sleep_s = 0.0
+
+    def record(self, purpose: str, kind: Optional[str], sleep_s: float) -> None:
+        with self._lock:
+            self.calls[purpose] = self.calls.get(purpose, 0) + 1
+            if kind:
+                self.malformed[kind] = self.malformed.get(kind, 0) + 1
+            self.sleep_s += sleep_s
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "malformed": dict(self.malformed),
+                "llm_time_s": round(self.sleep_s, 3),
+            }
+
+
+class FakeGroq(BaseChatModel):
+    purpose: str = "extract"
+    latency: Any = None          # rng -> seconds
+    malformed_rate: float = 0.0
+    seed: int = 0
+    stats: Any = None            # FakeStats
+    rng: Any = None
+
+    def model_post_init(self, __context: Any) -> None:
+        self.rng = random.Random(f"{self.seed}:{self.purpose}")
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq"
+
+    def _plan(self, messages: List[Any]):
+        # rng draws happen under one lock so a seed gives the same sequence of replies
+        with self.stats._lock:
+            sleep_s = self.latency(self.rng) if self.latency else 0.0
+            kind = self.rng.choice(MALFORMED_KINDS) if self.rng.random() < self.malformed_rate else None
+            conf_draw = random.Random(self.rng.random())
+        system = str(messages[0].content) if messages else ""
+        human = str(messages[-1].content) if messages else ""
+        if self.purpose.startswith("extract"):
+            prompt = str(messages[-2].content) if len(messages) > 2 else human
+            with_conf = len(messages) > 2 and "confidence" in human
+            data = _extract_reply(prompt if with_conf else human, conf_draw, with_conf)
+        else:
+            data = _tools_reply(human, "_compliance" in system)
+        text = json.dumps(data, ensure_ascii=False)
+        if kind:
+            text = malform(text, kind)
+        self.stats.record(self.purpose, kind, sleep_s)
+        return sleep_s, text
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        sleep_s, text = self._plan(messages)
+        time.sleep(sleep_s)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        sleep_s, text = self._plan(messages)
+        await asyncio.sleep(sleep_s)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        # first token after ~30% of the latency, the rest spread evenly (SSE endpoint)
+        sleep_s, text = self._plan(messages)
+        await asyncio.sleep(sleep_s * 0.3)
+        pieces = [text[i:i + 8] for i in range(0, len(text), 8)] or [""]
+        for piece in pieces:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(sleep_s * 0.7 / len(pieces))
+
+
+def install(latency: Dict[str, str], malformed_rate: float = 0.0, seed: int = 0) -> FakeStats:
+    """
+    Points groq_client.get_llm at fake models. `latency` maps purpose ("extract",
+    "extract_fast", "tools") to a latency spec; missing purposes use "extract"'s.
+    """
+    from app.services import groq_client
+
+    stats = FakeStats()
+    models: Dict[str, FakeGroq] = {}
+    lock = threading.Lock()
+
+    def fake_get_llm(purpose: str = "extract"):
+        llm = models.get(purpose)
+        if llm is None:
+            with lock:
+                llm = models.get(purpose)
+                if llm is None:
+                    spec = latency.get(purpose) or latency["extract"]
+                    llm = models[purpose] = FakeGroq(
+                        purpose=purpose,
+                        latency=latency_sampler(spec),
+                        malformed_rate=malformed_rate,
+                        seed=seed,
+                        stats=stats,
+                    )
+        return llm
+
+    groq_client.get_llm = fake_get_llm
+    return stats